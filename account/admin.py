@@ -1,6 +1,6 @@
 from django.contrib import admin
 from account.models import (CopiedTrader, CopyRequest, Currency, PaymentGateway, Plan, PlanCategory, Trader, TraderApplication, TraderBenefit, User, Withdraw, PasswordHistory, Activity, Deposit, KYCVerification, Notification, AdminNotification, Trade, AddressVerification, UserPaymentMethod, UserPlan,
-BannedIp, EmailTemplate, EmailTemplateCategory, Config)
+BannedIp, EmailTemplate, EmailTemplateCategory, Config, PnlRollup, DailySequence, TelegramMessage, QueuedEmail, AdminNotificationRead, NotificationJob, Wallet, LedgerEntry, BalanceSnapshot)
 
 # Register your models here.
 
@@ -28,4 +28,13 @@ admin.site.register(UserPlan)
 admin.site.register(UserPaymentMethod)
 admin.site.register(AddressVerification)
 admin.site.register(TraderBenefit)
-admin.site.register(AdminNotification)
\ No newline at end of file
+admin.site.register(AdminNotification)
+admin.site.register(PnlRollup)
+admin.site.register(DailySequence)
+admin.site.register(TelegramMessage)
+admin.site.register(QueuedEmail)
+admin.site.register(AdminNotificationRead)
+admin.site.register(NotificationJob)
+admin.site.register(Wallet)
+admin.site.register(LedgerEntry)
+admin.site.register(BalanceSnapshot)
\ No newline at end of file
@@ -0,0 +1,195 @@
+"""
+OHLC candles for the market charts, built from the prices the server already
+fetches so browsers never call CoinGecko's market_chart themselves.
+
+The ingest_candles worker feeds ticks (symbol, time, price) into every
+resolution at once: a tick updates its 1m, 1h and 1d candle, so the coarse
+series are the downsampled fine one without a separate rollup pass.
+
+Candles are stored as CandleBlock rows, one per symbol, resolution and fixed
+run of slots (a day of minutes, 30 days of hours, a year of days). A block's
+data is the open, high, low and close columns as little-endian float64
+arrays, zlib-compressed; empty slots are NaN. Blocks past the resolution's
+retention are deleted by prune().
+"""
+import math
+import random
+import sys
+import zlib
+from array import array
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import CandleBlock
+
+# resolution: (seconds per candle, candles per block)
+RESOLUTIONS = {
+    '1m': (60, 1440),
+    '1h': (3600, 720),
+    '1d': (86400, 366),
+}
+COLUMNS = 4  # open, high, low, close
+MAX_POINTS = 1500  # per chart; decides the resolution for a span of days
+
+
+def block_start(resolution, ts):
+    """Epoch seconds of the start of the block holding `ts`."""
+    step, slots = RESOLUTIONS[resolution]
+    span = step * slots
+    return int(ts // span * span)
+
+
+def to_datetime(ts):
+    return datetime.fromtimestamp(ts, tz=dt_timezone.utc)
+
+
+def empty(resolution):
+    return array('d', [math.nan]) * (RESOLUTIONS[resolution][1] * COLUMNS)
+
+
+def pack(values):
+    if sys.byteorder == 'big':
+        values = array('d', values)
+        values.byteswap()
+    return zlib.compress(values.tobytes())
+
+
+def unpack(data):
+    values = array('d')
+    values.frombytes(zlib.decompress(bytes(data)))
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+
+def apply_tick(values, slots, slot, price):
+    o, h, l, c = slot, slots + slot, 2 * slots + slot, 3 * slots + slot
+    if math.isnan(values[o]):
+        values[o] = values[h] = values[l] = values[c] = price
+    else:
+        values[h] = max(values[h], price)
+        values[l] = min(values[l], price)
+        values[c] = price
+
+
+def ingest(ticks):
+    """
+    Add ticks, an iterable of (symbol, aware datetime, price), to the 1m, 1h
+    and 1d candles. Each affected block is read and written once however
+    many ticks land in it. Returns the number of ticks ingested.
+    """
+    updates = defaultdict(list)
+    count = 0
+    for symbol, at, price in ticks:
+        ts = at.timestamp()
+        for resolution, (step, slots) in RESOLUTIONS.items():
+            start = block_start(resolution, ts)
+            updates[(symbol.upper(), resolution, start)].append((ts, int((ts - start) // step), float(price)))
+        count += 1
+    if not updates:
+        return 0
+
+    with transaction.atomic():
+        by_resolution = defaultdict(lambda: (set(), set()))
+        for symbol, resolution, start in updates:
+            symbols, starts = by_resolution[resolution]
+            symbols.add(symbol)
+            starts.add(to_datetime(start))
+
+        blocks = {}
+        for resolution, (symbols, starts) in by_resolution.items():
+            for block in CandleBlock.objects.select_for_update().filter(
+                resolution=resolution, symbol__in=symbols, start__in=starts,
+            ):
+                blocks[(block.symbol, block.resolution, int(block.start.timestamp()))] = block
+
+        created, changed = [], []
+        now = datetime.now(dt_timezone.utc)
+        for key, points in updates.items():
+            symbol, resolution, start = key
+            slots = RESOLUTIONS[resolution][1]
+            block = blocks.get(key)
+            values = unpack(block.data) if block else empty(resolution)
+            for ts, slot, price in sorted(points):
+                apply_tick(values, slots, slot, price)
+
+            if block is None:
+                created.append(CandleBlock(symbol=symbol, resolution=resolution, start=to_datetime(start), data=pack(values)))
+            else:
+                block.data = pack(values)
+                # bulk_update skips auto_now, and the candle ETags are made of updated_on
+                block.updated_on = now
+                changed.append(block)
+
+        CandleBlock.objects.bulk_create(created)
+        CandleBlock.objects.bulk_update(changed, ['data', 'updated_on'])
+    return count
+
+
+def resolution_for(days):
+    """The finest resolution that keeps `days` of history and fits in MAX_POINTS candles."""
+    for resolution, (step, slots) in RESOLUTIONS.items():
+        retention = settings.CANDLE_RETENTION.get(resolution)
+        if (retention is None or days <= retention) and days * 86400 / step <= MAX_POINTS:
+            return resolution
+    return '1d'
+
+
+def blocks_for(symbol, resolution, since, until):
+    return CandleBlock.objects.filter(
+        symbol=symbol.upper(),
+        resolution=resolution,
+        start__gte=to_datetime(block_start(resolution, since.timestamp())),
+        start__lte=until,
+    ).order_by('start')
+
+
+def candles(blocks, since, until):
+    """[[time in ms, open, high, low, close], ...] from `blocks`, between since and until."""
+    since, until = since.timestamp(), until.timestamp()
+    rows = []
+    for block in blocks:
+        step, slots = RESOLUTIONS[block.resolution]
+        start = int(block.start.timestamp())
+        values = unpack(block.data)
+        for slot in range(slots):
+            t = start + slot * step
+            if t < since or t > until or math.isnan(values[slot]):
+                continue
+            rows.append([
+                t * 1000,
+                values[slot],
+                values[slots + slot],
+                values[2 * slots + slot],
+                values[3 * slots + slot],
+            ])
+    return rows
+
+
+def prune(now=None):
+    """Delete blocks that end before their resolution's retention window. Returns the number deleted."""
+    now = now or datetime.now(dt_timezone.utc)
+    deleted = 0
+    for resolution, (step, slots) in RESOLUTIONS.items():
+        retention = settings.CANDLE_RETENTION.get(resolution)
+        if retention is None:
+            continue
+        cutoff = now - timedelta(days=retention) - timedelta(seconds=step * slots)
+        deleted += CandleBlock.objects.filter(resolution=resolution, start__lt=cutoff).delete()[0]
+    return deleted
+
+
+def synthetic_ticks(symbol, start, end, step=timedelta(seconds=15), price=100.0, volatility=0.001, seed=None):
+    """
+    A reproducible random walk of (symbol, time, price) ticks from start to
+    end, for tests and for filling a development database without a feed.
+    """
+    rng = random.Random(seed)
+    at = start
+    while at < end:
+        yield symbol, at, round(price, 8)
+        price *= math.exp(rng.gauss(0, volatility))
+        at += step
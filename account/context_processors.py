@@ -1,16 +1,47 @@
-from .models import Config, Notification
+from django.conf import settings
+from django.utils.functional import SimpleLazyObject
+
+from .utils import get_config, get_fragment_versions, get_notification_feed, get_unread_notification_count
+
+def lazy_value(request, name, load):
+    """
+    A proxy for load(request) that runs it the first time a template touches
+    the value, and then shares the result with every other render in the
+    request. Pages that never use it issue no queries for it.
+    """
+    def evaluate():
+        values = request.__dict__.setdefault('_lazy_context', {})
+        if name not in values:
+            values[name] = load(request)
+        return values[name]
+
+    return SimpleLazyObject(evaluate)
+
+def load_notifications(request):
+    return get_notification_feed(request.user) if request.user.is_authenticated else []
+
+def load_unread_notifications(request):
+    return get_unread_notification_count(request.user) if request.user.is_authenticated else 0
+
+def load_config(request):
+    return get_config()
+
+def load_fragments(request):
+    return {'timeout': settings.FRAGMENT_CACHE_TIMEOUT, **get_fragment_versions()}
 
 def notifications_processor(request):
-    if request.user.is_authenticated:
-        notifications = Notification.objects.filter(user=request.user).order_by('-created_on')[:20]
-    else:
-        notifications = []
     return {
-        'notifications': notifications
+        'notifications': lazy_value(request, 'notifications', load_notifications),
+        'notifications_unread': lazy_value(request, 'notifications_unread', load_unread_notifications),
     }
 
 def global_config(request):
-    config = Config.objects.first()
     return {
-        'config': config
-    }
\ No newline at end of file
+        'config': lazy_value(request, 'config', load_config),
+    }
+
+def fragment_cache(request):
+    # {% cache fragments.timeout name key fragments.<group> %}
+    return {
+        'fragments': lazy_value(request, 'fragments', load_fragments),
+    }
@@ -0,0 +1,76 @@
+"""
+A user's deposits and withdrawals as one list, built by the database.
+
+ledger() returns a lazy UNION queryset of dicts with the same columns for
+both kinds, newest first, so pages can be cut with Paginator or slicing and
+long exports streamed with .iterator() without loading either table into
+Python. Columns:
+
+    txn_pk      the Deposit or Withdraw id
+    txn_type    'Deposit' or 'Withdrawal'
+    txn_date    date_created or date
+    txn_id      transaction_no
+    txn_amount  amount
+    txn_status  status
+    txn_method  'Bitcoin (BTC)' for crypto, else the gateway
+    txn_ref     ref
+    txn_asset   the currency code, else the gateway
+    txn_equivalent  equivalent, the amount in txn_asset
+    txn_total   grand_total for deposits, amount for withdrawals
+"""
+from django.db.models import Case, CharField, F, FloatField, Value, When
+from django.db.models.functions import Coalesce, Concat, NullIf, Upper
+
+from .models import Deposit, Withdraw
+
+KINDS = ('deposit', 'withdrawal')
+COLUMNS = ('txn_pk', 'txn_type', 'txn_date', 'txn_id', 'txn_amount', 'txn_status', 'txn_method', 'txn_ref',
+           'txn_asset', 'txn_equivalent', 'txn_total')
+
+
+def deposit_rows(user):
+    return Deposit.objects.filter(user=user).annotate(
+        txn_pk=F('pk'),
+        txn_type=Value('Deposit', output_field=CharField()),
+        txn_date=F('date_created'),
+        txn_id=F('transaction_no'),
+        txn_amount=Coalesce('amount', 0.0, output_field=FloatField()),
+        txn_status=F('status'),
+        txn_method=Case(
+            When(currency__isnull=False, then=Concat('currency__currency', Value(' ('), Coalesce('network', Value('')), Value(')'))),
+            default=Coalesce('gateway__name', Value('')),
+            output_field=CharField(),
+        ),
+        txn_ref=F('ref'),
+        txn_asset=Coalesce('currency__abbr', 'gateway__name', Value(''), output_field=CharField()),
+        txn_equivalent=F('equivalent'),
+        txn_total=Coalesce('grand_total', 0.0, output_field=FloatField()),
+    )
+
+
+def withdrawal_rows(user):
+    return Withdraw.objects.filter(user=user).annotate(
+        txn_pk=F('pk'),
+        txn_type=Value('Withdrawal', output_field=CharField()),
+        txn_date=F('date'),
+        txn_id=F('transaction_no'),
+        txn_amount=F('amount'),
+        txn_status=F('status'),
+        txn_method=Coalesce(NullIf('gateway', Value('')), Upper('currency'), Value('Bank Transfer'), output_field=CharField()),
+        txn_ref=F('ref'),
+        txn_asset=Coalesce(NullIf('currency', Value('')), NullIf('gateway', Value('')), Value(''), output_field=CharField()),
+        txn_equivalent=F('equivalent'),
+        txn_total=F('amount'),
+    )
+
+
+def ledger(user, kinds=KINDS):
+    """`user`'s transactions of the given kinds ('deposit', 'withdrawal'), newest first."""
+    parts = []
+    if 'deposit' in kinds:
+        parts.append(deposit_rows(user).values(*COLUMNS))
+    if 'withdrawal' in kinds:
+        parts.append(withdrawal_rows(user).values(*COLUMNS))
+
+    rows = parts[0].union(*parts[1:], all=True) if len(parts) > 1 else parts[0]
+    return rows.order_by('-txn_date', '-txn_pk')
@@ -0,0 +1,99 @@
+"""
+Delivery of the mail queued by account.utils.queue_mail().
+
+Views only write QueuedEmail rows, one per recipient; the send_queued_mail
+worker sends each claimed batch over a single backend connection.
+"""
+import smtplib
+from datetime import timedelta
+
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import connection as db_connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from account.models import QueuedEmail
+
+MAX_ATTEMPTS = 6
+BACKOFF_BASE = 60  # seconds, doubled after every failed attempt
+BACKOFF_MAX = 6 * 3600
+CLAIM_TIMEOUT = timedelta(minutes=10)  # a crashed worker's batch is retried after this
+
+# The server rejected the address itself; retrying will not help
+PERMANENT_ERRORS = (smtplib.SMTPRecipientsRefused,)
+
+
+def backoff(attempts):
+    return timedelta(seconds=min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX))
+
+
+def build_message(email, connection):
+    message = EmailMultiAlternatives(
+        subject=email.subject,
+        body=email.body,
+        from_email=email.from_email,
+        to=[email.to],
+        connection=connection,
+    )
+    if email.html_body:
+        message.attach_alternative(email.html_body, "text/html")
+    return message
+
+
+def claim_batch(batch_size):
+    now = timezone.now()
+    with transaction.atomic():
+        due = QueuedEmail.objects.filter(status='pending', next_attempt_at__lte=now).order_by('pk')
+        if db_connection.features.has_select_for_update_skip_locked:
+            due = due.select_for_update(skip_locked=True)
+
+        emails = list(due[:batch_size])
+        QueuedEmail.objects.filter(pk__in=[e.pk for e in emails]).update(next_attempt_at=now + CLAIM_TIMEOUT)
+    return emails
+
+
+def send_queued_mail(connection=None, batch_size=100):
+    """
+    Send due emails and return how many went out.
+
+    The whole batch shares one connection from get_connection(), reopened only
+    after a failed send. A failed recipient is retried with exponential
+    backoff and dead-lettered after MAX_ATTEMPTS or a permanent refusal,
+    without holding back the rest of the batch.
+    """
+    emails = claim_batch(batch_size)
+    if not emails:
+        return 0
+
+    connection = connection or get_connection()
+    sent_ids = []
+    try:
+        for email in emails:
+            try:
+                connection.open()  # no-op while the connection is up
+                connection.send_messages([build_message(email, connection)])
+            except Exception as e:
+                email.attempts += 1
+                email.last_error = f"{type(e).__name__}: {e}"
+                if isinstance(e, PERMANENT_ERRORS):
+                    email.status = 'dead'
+                else:
+                    # The connection may be unusable; the next email reopens it
+                    connection.close()
+                    if email.attempts >= MAX_ATTEMPTS:
+                        email.status = 'dead'
+                    else:
+                        email.next_attempt_at = timezone.now() + backoff(email.attempts)
+                email.save(update_fields=['attempts', 'status', 'last_error', 'next_attempt_at'])
+            else:
+                sent_ids.append(email.pk)
+    finally:
+        connection.close()
+        # One write for everything sent; a crash before it resends those after CLAIM_TIMEOUT
+        QueuedEmail.objects.filter(pk__in=sent_ids).update(
+            status='sent',
+            sent_on=timezone.now(),
+            attempts=F('attempts') + 1,
+        )
+
+    return len(sent_ids)
@@ -0,0 +1,62 @@
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.template import Context, Template
+from django.test import RequestFactory
+
+from account.context_processors import notifications_processor
+from account.management.commands._bench import bench_database, timed
+from account.models import Notification, User
+
+
+def legacy_notifications_processor(request):
+    """The previous behaviour: query the feed on every render."""
+    if request.user.is_authenticated:
+        notifications = Notification.objects.filter(user=request.user).order_by('-created_on')[:20]
+    else:
+        notifications = []
+    return {'notifications': notifications}
+
+
+class Command(BaseCommand):
+    help = "Cost per render of the notification context processor: uncached, cached, and on a page that never shows it."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--renders', type=int, default=1000)
+        parser.add_argument('--notifications', type=int, default=500, help="Notifications owned by the benchmark user.")
+
+    def handle(self, *args, **options):
+        with bench_database():
+            user = User.objects.create_user(username='bench', password='bench', first_name='B', last_name='B')
+            Notification.objects.bulk_create([
+                Notification(user=user, title=f"Notification {n}", media_type='text', text='N')
+                for n in range(options['notifications'])
+            ])
+            cache.clear()
+
+            request = RequestFactory().get('/')
+            request.user = user
+            menu = Template("{% for n in notifications %}{{ n.title }}{% endfor %}")
+            plain = Template("<p>{{ request.path }}</p>")
+
+            for label, processor, template in (
+                ("query on every render", legacy_notifications_processor, menu),
+                ("cached feed", notifications_processor, menu),
+                ("page without the menu", notifications_processor, plain),
+            ):
+                self.report(label, processor, template, request, options['renders'])
+
+    def report(self, label, processor, template, request, renders):
+        def render_all():
+            for _ in range(renders):
+                template.render(Context(processor(request)))
+
+        queries = []
+        with connection.execute_wrapper(lambda execute, *args: queries.append(1) or execute(*args)):
+            render_all()
+
+        elapsed = timed(render_all, repeat=3)
+        self.stdout.write(
+            f"{label:<24} {elapsed * 1000 / renders:8.1f} us/render, "
+            f"{len(queries) / renders:.2f} queries/render"
+        )
@@ -0,0 +1,112 @@
+import random
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, reset_queries
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from account.management.commands._bench import bench_database, timed
+from account.models import Currency, Deposit, PaymentGateway, User
+from utils.pagination import keyset_page
+
+
+class Command(BaseCommand):
+    help = "Seed a throwaway database with deposits and compare the old and keyset-paginated manager deposit list queries."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--deposits', type=int, default=1_000_000)
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument('--skip-old', action='store_true', help="Skip loading every deposit the way the old view did.")
+
+    def handle(self, *args, **options):
+        with bench_database():
+            self.seed(options['deposits'], options['users'])
+            repeat = options['repeat']
+
+            self.stdout.write(self.style.MIGRATE_HEADING("\n== old: every deposit, five stat queries, N+1 per row =="))
+            self.report('five stat queries', self.old_stats, repeat)
+            if not options['skip_old']:
+                self.report('4k rows + related', self.old_rows, 1)
+
+            self.stdout.write(self.style.MIGRATE_HEADING("\n== new: keyset pages, one aggregate =="))
+            self.report('stats aggregate', self.new_stats, repeat)
+            self.report('first page', lambda: self.page(), repeat)
+            self.report('page 10,000 deep', lambda: self.page(after=self.deep_cursor), repeat)
+            self.report('pending, first page', lambda: self.page(status__in=['pending']), repeat)
+            self.report('pending, deep page', lambda: self.page(after=self.deep_cursor, status__in=['pending']), repeat)
+            self.report('search "bench42"', lambda: self.page(user__username__icontains='bench42'), repeat)
+
+    def seed(self, deposits, users):
+        self.stdout.write(f"Seeding {deposits} deposits for {users} users...")
+        User.objects.bulk_create(
+            User(username=f'bench{i}', display_name=f'bench{i}', email=f'bench{i}@example.com')
+            for i in range(users)
+        )
+        user_ids = list(User.objects.values_list('pk', flat=True))
+        currency = Currency.objects.create(abbr='BTC', currency='Bitcoin', address='bc1q')
+        gateway = PaymentGateway.objects.create(name='PayPal', email='pay@example.com')
+
+        now = timezone.now()
+        rng = random.Random(0)
+        batch = []
+        for n in range(deposits):
+            crypto = rng.random() < 0.7
+            batch.append(Deposit(
+                user_id=rng.choice(user_ids),
+                amount=rng.randint(10, 5000),
+                grand_total=rng.randint(10, 5000),
+                currency=currency if crypto else None,
+                gateway=None if crypto else gateway,
+                status=rng.choices(['pending', 'success', 'expired', 'cancelled'], [1, 80, 15, 4])[0],
+                date_created=now - timedelta(minutes=rng.randint(0, 60 * 24 * 365 * 3)),
+            ))
+            if len(batch) == 10_000:
+                Deposit.objects.bulk_create(batch)
+                batch = []
+        Deposit.objects.bulk_create(batch)
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+        deep = Deposit.objects.order_by('-date_created', '-pk')[500_000 if deposits > 500_000 else deposits // 2]
+        self.deep_cursor = f"{deep.date_created.isoformat()}_{deep.pk}"
+
+    def old_stats(self):
+        deposits = Deposit.objects.all()
+        today = timezone.now().date()
+        deposits.count()
+        deposits.filter(date_created__date=today).aggregate(total=Sum('grand_total'))
+        deposits.filter(status='pending').count()
+        deposits.filter(status='completed', date_created__date=today).count()
+        deposits.filter(status='failed', date_created__date=today).count()
+
+    def old_rows(self):
+        # what rendering the old template did, for the first 4k of every row: user/currency/gateway one query each
+        for deposit in Deposit.objects.all()[:4000]:
+            deposit.user, deposit.currency, deposit.gateway
+
+    def new_stats(self):
+        today = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+        Deposit.objects.aggregate(
+            total_deposits=Count('pk'),
+            total_amount_today=Coalesce(Sum('grand_total', filter=Q(date_created__gte=today)), 0.0),
+            pending_count=Count('pk', filter=Q(status='pending')),
+            completed_today=Count('pk', filter=Q(status='success', date_created__gte=today)),
+            failed_today=Count('pk', filter=Q(status__in=Deposit.FAILED_STATUSES, date_created__gte=today)),
+        )
+
+    def page(self, after=None, **filters):
+        deposits = Deposit.objects.select_related('user', 'currency', 'gateway').filter(**filters)
+        for deposit in keyset_page(deposits, 'date_created', after=after):
+            deposit.user, deposit.currency, deposit.gateway
+
+    def report(self, name, func, repeat):
+        reset_queries()
+        with CaptureQueriesContext(connection) as queries:
+            func()
+        ms = timed(func, repeat)
+        self.stdout.write(f"{name:<22} {ms:10.1f} ms  {len(queries):>6} queries")
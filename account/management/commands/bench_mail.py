@@ -0,0 +1,73 @@
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.mail import send_mail
+from django.core.mail.backends.filebased import EmailBackend as FileBackend
+from django.core.mail.backends.locmem import EmailBackend as LocMemBackend
+from django.core.management.base import BaseCommand
+
+from account.mail import send_queued_mail
+from account.management.commands._bench import bench_database
+from account.utils import queue_mail
+
+
+def counting_backend(base, connect_latency):
+    """`base` that sleeps on every new connection, standing in for an SMTP/TLS handshake."""
+    class Backend(base):
+        opened = 0
+
+        def open(self):
+            if getattr(self, 'stream', None) is None and not getattr(self, '_is_open', False):
+                Backend.opened += 1
+                time.sleep(connect_latency)
+                self._is_open = True
+            return super().open()
+
+        def close(self):
+            self._is_open = False
+            return super().close()
+
+    return Backend
+
+
+class Command(BaseCommand):
+    help = "Compare sending mail one connection per message with the queue worker, using the file or locmem backend."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--emails', type=int, default=2000)
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--backend', choices=['file', 'locmem'], default='file')
+        parser.add_argument('--connect-latency', type=float, default=20, help="Milliseconds added to every connection open.")
+
+    def handle(self, *args, **options):
+        emails = options['emails']
+        base = FileBackend if options['backend'] == 'file' else LocMemBackend
+
+        with tempfile.TemporaryDirectory() as file_path, bench_database():
+            Backend = counting_backend(base, options['connect_latency'] / 1000)
+            connection = lambda: Backend(file_path=file_path)
+
+            started = time.perf_counter()
+            for i in range(emails):
+                send_mail("Subject", "Body", settings.DEFAULT_FROM_EMAIL, [f"user{i}@example.com"], connection=connection())
+            self.report("send_mail in the request", emails, started, Backend)
+
+            Backend.opened = 0
+            started = time.perf_counter()
+            for i in range(emails):
+                queue_mail("Subject", "Body", settings.DEFAULT_FROM_EMAIL, [f"user{i}@example.com"])
+            self.report("queue_mail in the request", emails, started, Backend)
+
+            started = time.perf_counter()
+            worker_connection = connection()
+            while send_queued_mail(worker_connection, batch_size=options['batch_size']):
+                pass
+            self.report("send_queued_mail worker", emails, started, Backend)
+
+    def report(self, label, emails, started, Backend):
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"{label:<26} {elapsed * 1000 / emails:7.3f} ms/email {emails / elapsed:8.0f} emails/s, "
+            f"{Backend.opened} connections opened"
+        )
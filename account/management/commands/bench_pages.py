@@ -0,0 +1,48 @@
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.test.utils import override_settings, setup_test_environment
+from django.urls import reverse
+
+from account.management.commands._bench import bench_database
+from account.models import Config
+
+PAGES = ['interface_home', 'interface_about', 'interface_crypto_trading', 'interface_terms_of_service']
+
+
+class Command(BaseCommand):
+    help = "Anonymous requests per second on the marketing pages: rendered every time, from the page cache, and revalidated with a 304."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+
+        with bench_database():
+            Config.objects.create(platform_name='Norvia')
+            urls = [reverse(name) for name in PAGES]
+            client = Client()
+
+            cache.clear()
+            with override_settings(PAGE_CACHE_TIMEOUT=0):  # nothing is kept, so every request renders
+                self.report("rendered", client, urls, options['requests'])
+
+            cache.clear()
+            self.report("page cache", client, urls, options['requests'])
+
+            etags = {url: client.get(url)['ETag'] for url in urls}
+            self.report("page cache, 304", client, urls, options['requests'], etags)
+
+    def report(self, label, client, urls, requests, etags=None):
+        started = time.perf_counter()
+        for n in range(requests):
+            url = urls[n % len(urls)]
+            headers = {'If-None-Match': etags[url]} if etags else {}
+            response = client.get(url, headers=headers)
+            assert response.status_code == (304 if etags else 200), response.status_code
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(f"{label:<16} {requests / elapsed:8.0f} req/s  {elapsed * 1000 / requests:6.2f} ms/request")
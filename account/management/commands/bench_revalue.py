@@ -0,0 +1,63 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from account.management.commands._bench import bench_database
+from account.models import Trade, User
+from account.utils import revalue_open_trades
+
+SYMBOLS = ['BTC', 'ETH', 'BNB', 'SOL', 'XRP', 'ADA', 'DOGE', 'TRX', 'LTC', 'DOT']
+
+
+class Command(BaseCommand):
+    help = "Seed a throwaway database with open trades and time revalue_open_trades over them."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--trades', type=int, default=500_000)
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--chunk-size', type=int, default=50000)
+
+    def handle(self, *args, **options):
+        with bench_database():
+            self.seed(options['trades'], options['users'])
+
+            rng = random.Random(1)
+            for run in range(3):
+                prices = {s: 100 * (1 + rng.uniform(-0.1, 0.1)) for s in SYMBOLS}
+                started = time.perf_counter()
+                count = revalue_open_trades(prices, chunk_size=options['chunk_size'])
+                elapsed = time.perf_counter() - started
+                self.stdout.write(f"run {run + 1}: revalued {count} trades in {elapsed:.2f}s ({count / elapsed:,.0f}/s)")
+
+    def seed(self, trades, users):
+        self.stdout.write(f"Seeding {trades} open trades for {users} users...")
+        User.objects.bulk_create(
+            User(username=f'bench{i}', display_name=f'bench{i}', email=f'bench{i}@example.com')
+            for i in range(users)
+        )
+        user_ids = list(User.objects.values_list('pk', flat=True))
+
+        rng = random.Random(0)
+        batch = []
+        for _ in range(trades):
+            leverage = rng.choice([None, None, 2, 5, 10])
+            batch.append(Trade(
+                user_id=rng.choice(user_ids),
+                trade_type=rng.choice(['buy', 'sell']),
+                mode='leverage' if leverage else 'spot',
+                leverage=leverage,
+                symbol=rng.choice(SYMBOLS).lower(),
+                size=rng.uniform(0.01, 10),
+                entry_price=100,
+                current_price=100,
+            ))
+            if len(batch) == 10_000:
+                Trade.objects.bulk_create(batch)
+                batch = []
+        Trade.objects.bulk_create(batch)
+
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute('ANALYZE')
@@ -0,0 +1,75 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import override_settings, setup_test_environment
+from django.urls import reverse
+
+from account.management.commands._bench import bench_database
+from account.models import Config
+
+ENGINES = [
+    'django.contrib.sessions.backends.db',
+    'account.session_backend',
+]
+
+
+class Command(BaseCommand):
+    help = "Load-test the session engines with failed sign-ins, which write the session on every request."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=20)
+        parser.add_argument('--requests', type=int, default=50, help="Failed sign-ins per client.")
+        parser.add_argument('--threads', type=int, default=4)
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+
+        with bench_database():
+            Config.objects.create(platform_name='Norvia')
+
+            for engine in ENGINES:
+                # A fast hasher keeps the password check from drowning out the session cost
+                with override_settings(SESSION_ENGINE=engine, PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher']):
+                    self.run_engine(engine, options)
+
+    def run_engine(self, engine, options):
+        counts = {'writes': 0}
+        lock = threading.Lock()
+
+        def count(execute, sql, params, many, context):
+            if '"django_session"' in sql and sql.startswith(('UPDATE', 'INSERT')):
+                with lock:
+                    counts['writes'] += 1
+            return execute(sql, params, many, context)
+
+        def worker(clients):
+            try:
+                with connection.execute_wrapper(count):
+                    for _ in range(clients):
+                        client = Client()
+                        for _ in range(options['requests']):
+                            client.post(reverse('sign_in'), {'username': 'nobody', 'password': 'wrong'})
+            finally:
+                connections.close_all()
+
+        per_thread = options['clients'] // options['threads']
+        threads = [threading.Thread(target=worker, args=(per_thread,)) for _ in range(options['threads'])]
+
+        # Don't let this thread's connection hold a lock the workers wait on
+        connection.close()
+
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        total = per_thread * options['threads'] * options['requests']
+        self.stdout.write(
+            f"{engine:<38} {total / elapsed:7.0f} req/s, "
+            f"{counts['writes']:5d} session writes for {total} requests"
+        )
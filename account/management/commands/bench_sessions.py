@@ -0,0 +1,67 @@
+from django.conf import settings
+from django.contrib.auth.models import Group
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings, setup_test_environment
+from django.urls import reverse
+from django.utils.deprecation import MiddlewareMixin
+
+from account.management.commands._bench import bench_database
+from account.models import Config, User
+from account.utils import get_config
+
+MIDDLEWARE_PATH = 'account.middleware.dynamic_timeout.DynamicSessionTimeoutMiddleware'
+
+
+class AlwaysRefreshMiddleware(MiddlewareMixin):
+    """The previous behaviour: set_expiry() on every authenticated request."""
+    def process_request(self, request):
+        if request.user.is_authenticated:
+            config = get_config()
+            request.session.set_expiry(config.session_timeout_minutes if config else 7200)
+
+
+class Command(BaseCommand):
+    help = "Count django_session writes per N authenticated requests with and without expiry hysteresis."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+
+        with bench_database():
+            Config.objects.create(platform_name='Norvia')
+            user = User.objects.create_user(username='bench', password='bench', first_name='B', last_name='B')
+            user.groups.add(Group.objects.create(name='trader'))
+
+            legacy = [
+                f"{__name__}.AlwaysRefreshMiddleware" if m == MIDDLEWARE_PATH else m
+                for m in settings.MIDDLEWARE
+            ]
+            with override_settings(MIDDLEWARE=legacy):
+                self.report("set_expiry on every request", user, options['requests'])
+            self.report("refresh below threshold", user, options['requests'])
+
+    def report(self, label, user, requests):
+        client = Client()
+        client.force_login(user)
+        url = reverse('referrals')
+
+        counts = {'queries': 0, 'writes': 0}
+
+        def count(execute, sql, params, many, context):
+            counts['queries'] += 1
+            if '"django_session"' in sql and sql.startswith(('UPDATE', 'INSERT')):
+                counts['writes'] += 1
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count):
+            for _ in range(requests):
+                client.get(url)
+
+        self.stdout.write(
+            f"{label:<30} {counts['writes']:5d} session writes, "
+            f"{counts['queries'] / requests:.1f} queries/request"
+        )
@@ -0,0 +1,87 @@
+import copy
+
+from django.conf import settings
+from django.contrib.auth.models import Group
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.test.utils import override_settings, setup_test_environment
+from django.urls import reverse
+
+from account.management.commands._bench import bench_database, timed
+from account.models import Config, Currency, Plan, PlanCategory, Trader, User, UserPaymentMethod
+
+PAGES = {
+    'account/dashboard.html': 'home',
+    'account/account_settings.html': 'settings',
+    'account/crypto_market.html': 'crypto_market',
+    'account/copy_trader.html': 'copy_trader',
+    'account/planning.html': 'planning',
+    'account/deposit.html': 'deposit',
+}
+
+
+def uncached_loaders():
+    templates = copy.deepcopy(settings.TEMPLATES)
+    templates[0]['OPTIONS']['loaders'] = [
+        'django.template.loaders.filesystem.Loader',
+        'django.template.loaders.app_directories.Loader',
+    ]
+    return templates
+
+
+class Command(BaseCommand):
+    help = "Time per request of the heavy account pages: re-parsing templates, with the cached loader, and with fragment caching."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20, help="Requests per page; the best is reported.")
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+
+        with bench_database():
+            self.seed()
+            client = Client()
+            client.force_login(User.objects.get(username='bench'))
+
+            results = {}
+            cases = (
+                ("parse per hit", override_settings(TEMPLATES=uncached_loaders(), FRAGMENT_CACHE_TIMEOUT=0)),
+                ("cached loader", override_settings(FRAGMENT_CACHE_TIMEOUT=0)),
+                ("+ fragments", override_settings()),
+            )
+            for label, case in cases:
+                cache.clear()
+                with case:
+                    for template, name in PAGES.items():
+                        url = reverse(name)
+                        response = client.get(url)
+                        assert response.status_code == 200, (url, response.status_code)
+                        results[template, label] = timed(lambda: client.get(url), repeat=options['repeat'])
+
+            self.stdout.write(f"{'template':<32}" + ''.join(f"{label:>16}" for label, _ in cases))
+            for template in PAGES:
+                self.stdout.write(f"{template:<32}" + ''.join(f"{results[template, label]:13.2f} ms" for label, _ in cases))
+
+    def seed(self):
+        Config.objects.create(platform_name='Norvia')
+        user = User.objects.create_user(username='bench', password='bench', first_name='B', last_name='B')
+        user.groups.add(Group.objects.create(name='trader'))
+
+        Trader.objects.bulk_create([
+            Trader(full_name=f"Trader {n}", username=f"trader{n}", win=n, lose=n // 2, win_rate=60, copier=n * 100, created_by=user)
+            for n in range(10)
+        ])
+        for name in ('Trading', 'Signals', 'Mining', 'Staking'):
+            category = PlanCategory.objects.create(name=name)
+            Plan.objects.bulk_create([
+                Plan(category=category, tier=tier, price=100, features="\n".join(f"Feature {n}" for n in range(8)), has_currency_select=name == 'Mining')
+                for tier in ('Bronze', 'Silver', 'Gold')
+            ])
+        currency_type = ContentType.objects.get_for_model(Currency)
+        for n in range(8):
+            currency = Currency.objects.create(abbr=f"C{n}", currency=f"Coin {n}", address='addr')
+            UserPaymentMethod.objects.create(
+                user=user, payment_content_type=currency_type, payment_object_id=currency.pk, method_type='currency', active=True,
+            )
@@ -0,0 +1,93 @@
+import random
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from account.management.commands._bench import bench_database, timed
+from account.models import Trade, User
+
+
+class Command(BaseCommand):
+    help = "Seed a throwaway database with trades and compare query plans and timings with and without the Trade indexes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--trades', type=int, default=1_000_000)
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        with bench_database():
+            self.seed(options['trades'], options['users'])
+
+            indexes = Trade._meta.indexes
+            with connection.schema_editor() as editor:
+                for index in indexes:
+                    editor.remove_index(Trade, index)
+            self.report('without indexes', options['repeat'])
+
+            with connection.schema_editor() as editor:
+                for index in indexes:
+                    editor.add_index(Trade, index)
+            self.report('with indexes', options['repeat'])
+
+    def seed(self, trades, users):
+        self.stdout.write(f"Seeding {trades} trades for {users} users...")
+        User.objects.bulk_create(
+            User(username=f'bench{i}', display_name=f'bench{i}', email=f'bench{i}@example.com')
+            for i in range(users)
+        )
+        self.user_ids = list(User.objects.values_list('pk', flat=True))
+
+        now = timezone.now()
+        rng = random.Random(0)
+        batch = []
+        for _ in range(trades):
+            opened_at = now - timedelta(minutes=rng.randint(0, 60 * 24 * 30))
+            duration = rng.choice([1, 5, 15, 60])
+            is_open = rng.random() < 0.05
+            batch.append(Trade(
+                user_id=rng.choice(self.user_ids),
+                trade_type=rng.choice(['buy', 'sell']),
+                symbol='BTC',
+                size=1,
+                entry_price=100,
+                current_price=100,
+                duration=duration,
+                opened_at=opened_at,
+                expires_at=opened_at + timedelta(minutes=duration),
+                closed_at=None if is_open else opened_at + timedelta(minutes=duration),
+                status='open' if is_open else 'closed',
+                asset=rng.choice(['crypto', 'stock']),
+            ))
+            if len(batch) == 10_000:
+                Trade.objects.bulk_create(batch)
+                batch = []
+        Trade.objects.bulk_create(batch)
+
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute('ANALYZE')
+
+    def queries(self):
+        now = timezone.now()
+        user_id = self.user_ids[len(self.user_ids) // 2]
+        return {
+            'expiry sweep': Trade.objects.filter(status='open', expires_at__lte=now).values_list('pk', flat=True),
+            'crypto_market open': Trade.objects.filter(user_id=user_id, status='open', asset='crypto').order_by('-opened_at'),
+            'crypto_market closed': Trade.objects.filter(user_id=user_id, status='closed', asset='crypto').order_by('-opened_at'),
+            'home open trades': Trade.objects.filter(user_id=user_id, status='open'),
+            '24h pnl window': Trade.objects.filter(
+                user_id=user_id, status='closed',
+                closed_at__gte=now - timedelta(hours=48), closed_at__lte=now,
+            ),
+        }
+
+    def report(self, label, repeat):
+        self.stdout.write(self.style.MIGRATE_HEADING(f"\n== {label} =="))
+        for name, qs in self.queries().items():
+            ms = timed(lambda: list(qs.all()), repeat)
+            self.stdout.write(f"{name:<22} {ms:9.2f} ms")
+            for line in qs.explain().splitlines():
+                self.stdout.write(f"    {line}")
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from account.utils import close_expired_trades
+
+
+class Command(BaseCommand):
+    help = "Close every open trade whose duration has elapsed. Safe to run in several processes at once."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Trades closed per transaction.")
+        parser.add_argument('--loop', action='store_true', help="Keep sweeping instead of exiting after one pass.")
+        parser.add_argument('--interval', type=float, default=5, help="Seconds between sweeps with --loop.")
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.monotonic()
+            closed = close_expired_trades(batch_size=options['batch_size'])
+
+            if closed or not options['loop']:
+                elapsed = time.monotonic() - started
+                self.stdout.write(f"Closed {closed} expired trades in {elapsed:.2f}s")
+
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
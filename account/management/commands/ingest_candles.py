@@ -0,0 +1,49 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from account.candles import ingest, prune, synthetic_ticks
+from account.pricing import PricingError, get_markets, get_quotes
+
+
+class Command(BaseCommand):
+    help = "Record market prices as chart candles, one tick per symbol per pass, and drop candles past their retention."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--symbols', help="Comma-separated tickers. Defaults to settings.CANDLE_SYMBOLS, or the top CANDLE_MARKETS coins.")
+        parser.add_argument('--loop', action='store_true', help="Keep recording instead of exiting after one pass.")
+        parser.add_argument('--interval', type=float, default=15, help="Seconds between passes with --loop. Quotes are cached for PRICING_TTL, so going below it records repeats.")
+        parser.add_argument('--synthetic-days', type=float, help="Instead of reading prices, fill the last N days with a random walk per symbol (development only).")
+
+    def handle(self, *args, **options):
+        symbols = [s.upper() for s in (options['symbols'] or '').split(',') if s] or settings.CANDLE_SYMBOLS
+
+        if options['synthetic_days']:
+            now = timezone.now()
+            for index, symbol in enumerate(symbols or ['BTC', 'ETH']):
+                count = ingest(synthetic_ticks(symbol, now - timedelta(days=options['synthetic_days']), now, step=timedelta(minutes=1), seed=index))
+                self.stdout.write(f"Ingested {count} synthetic ticks for {symbol}")
+            prune()
+            return
+
+        while True:
+            started = time.monotonic()
+            try:
+                quotes = get_quotes(symbols).values() if symbols else get_markets(settings.CANDLE_MARKETS)
+            except PricingError as e:
+                self.stderr.write(f"Skipped a pass: {e}")
+                quotes = []
+
+            now = timezone.now()
+            count = ingest((q['symbol'], now, q['price']) for q in quotes if q['price'])
+            pruned = prune(now)
+
+            elapsed = time.monotonic() - started
+            self.stdout.write(f"Ingested {count} ticks, pruned {pruned} blocks in {elapsed:.2f}s")
+
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
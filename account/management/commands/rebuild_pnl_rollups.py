@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from account.models import PnlRollup, Trade
+
+
+class Command(BaseCommand):
+    help = "Regenerate PnlRollup from every closed trade. Stop the close_expired_trades worker while it runs."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000, help="Rows fetched and inserted per round trip.")
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        closed = Trade.objects.filter(status='closed')
+
+        with transaction.atomic():
+            PnlRollup.objects.all().delete()
+
+            for resolution in PnlRollup.TRUNC:
+                created = 0
+                batch = []
+                for g in PnlRollup.grouped(closed, resolution).iterator(chunk_size=chunk_size):
+                    batch.append(PnlRollup(
+                        user_id=g['user_id'],
+                        asset=g['asset'],
+                        resolution=resolution,
+                        bucket=g['bucket'],
+                        pnl=g['total_pnl'],
+                        trades=g['total_trades'],
+                    ))
+                    if len(batch) == chunk_size:
+                        PnlRollup.objects.bulk_create(batch)
+                        created += len(batch)
+                        batch = []
+
+                PnlRollup.objects.bulk_create(batch)
+                created += len(batch)
+                self.stdout.write(f"{resolution}: {created} buckets")
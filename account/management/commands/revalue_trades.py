@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from account.pricing import PricingError
+from account.utils import revalue_open_trades
+
+
+class Command(BaseCommand):
+    help = "Mark every open trade to the latest cached prices (current_price, pnl, pnl_percent)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=50000, help="Id range updated per transaction.")
+        parser.add_argument('--loop', action='store_true', help="Keep revaluing instead of exiting after one pass.")
+        parser.add_argument('--interval', type=float, default=15, help="Seconds between passes with --loop; prices are cached for PRICING_TTL.")
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.monotonic()
+            try:
+                revalued = revalue_open_trades(chunk_size=options['chunk_size'])
+            except PricingError as e:
+                self.stderr.write(f"Skipped a pass: {e}")
+            else:
+                elapsed = time.monotonic() - started
+                self.stdout.write(f"Revalued {revalued} open trades in {elapsed:.2f}s")
+
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from account.utils import run_notification_jobs
+
+
+class Command(BaseCommand):
+    help = "Fan out queued admin notifications to their KYC segments. Safe to run in several processes at once."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Notifications created per transaction.")
+        parser.add_argument('--loop', action='store_true', help="Keep polling for jobs instead of exiting after one pass.")
+        parser.add_argument('--interval', type=float, default=5, help="Seconds between passes with --loop.")
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.monotonic()
+            finished = run_notification_jobs(chunk_size=options['chunk_size'])
+
+            if finished or not options['loop']:
+                elapsed = time.monotonic() - started
+                self.stdout.write(f"Finished {finished} notification jobs in {elapsed:.2f}s")
+
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,32 @@
+import time
+
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+
+from account.mail import send_queued_mail
+
+
+class Command(BaseCommand):
+    help = "Send queued email in batches over one connection. Safe to run in several processes at once."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help="Emails claimed and sent per connection.")
+        parser.add_argument('--loop', action='store_true', help="Keep draining instead of exiting after one pass.")
+        parser.add_argument('--interval', type=float, default=2, help="Seconds between passes with --loop.")
+
+    def handle(self, *args, **options):
+        connection = get_connection()
+
+        while True:
+            started = time.monotonic()
+            sent = send_queued_mail(connection, batch_size=options['batch_size'])
+
+            if sent or not options['loop']:
+                elapsed = time.monotonic() - started
+                self.stdout.write(f"Sent {sent} emails in {elapsed:.2f}s")
+
+            if not options['loop']:
+                break
+            # Go straight on while there is a backlog
+            if sent < options['batch_size']:
+                time.sleep(options['interval'])
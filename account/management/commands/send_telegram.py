@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from account.telegram import get_transport, send_outbox
+
+
+class Command(BaseCommand):
+    help = "Deliver queued Telegram admin alerts. Safe to run in several processes at once."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help="Messages claimed per pass.")
+        parser.add_argument('--loop', action='store_true', help="Keep draining instead of exiting after one pass.")
+        parser.add_argument('--interval', type=float, default=2, help="Seconds between passes with --loop. Alerts queued in between are sent as one message per chat.")
+
+    def handle(self, *args, **options):
+        # One transport for the life of the worker so its HTTP connection is reused
+        transport = get_transport()
+
+        while True:
+            started = time.monotonic()
+            sent = send_outbox(transport, batch_size=options['batch_size'])
+
+            if sent or not options['loop']:
+                elapsed = time.monotonic() - started
+                self.stdout.write(f"Sent {sent} Telegram messages in {elapsed:.2f}s")
+
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
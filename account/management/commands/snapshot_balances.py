@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from account.wallets import take_snapshots
+
+
+class Command(BaseCommand):
+    help = "Snapshot the balance of every wallet that has changed since its last snapshot."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Wallets snapshotted per query.")
+        parser.add_argument('--loop', action='store_true', help="Keep snapshotting instead of exiting after one pass.")
+        parser.add_argument('--interval', type=float, default=3600, help="Seconds between passes with --loop.")
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.monotonic()
+            taken = take_snapshots(batch_size=options['batch_size'])
+
+            elapsed = time.monotonic() - started
+            self.stdout.write(f"Took {taken} balance snapshots in {elapsed:.2f}s")
+
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -1,14 +1,35 @@
+import time
+
+from django.conf import settings
 from django.utils.deprecation import MiddlewareMixin
 
-from account.models import Config
+from account.utils import get_config
+
+SESSION_REFRESHED_KEY = '_session_refreshed'
 
 class DynamicSessionTimeoutMiddleware(MiddlewareMixin):
+    """
+    Sliding session expiry from Config.session_timeout_minutes.
+
+    The expiry is only pushed back once less than
+    SESSION_REFRESH_THRESHOLD of the timeout is left, so the session row
+    is rewritten about once per (1 - threshold) * timeout instead of on
+    every request.
+    """
     def process_request(self, request):
         if request.user.is_authenticated:
             try:
-                config = Config.objects.first()
+                config = get_config()
                 timeout = config.session_timeout_minutes if config else 7200
             except:
                 timeout = 7200
 
-            request.session.set_expiry(timeout)
+            session = request.session
+            now = int(time.time())
+            refreshed = session.get(SESSION_REFRESHED_KEY, 0)
+            threshold = getattr(settings, 'SESSION_REFRESH_THRESHOLD', 0.5)
+
+            remaining = refreshed + timeout - now
+            if session.get('_session_expiry') != timeout or remaining < timeout * threshold:
+                session.set_expiry(timeout)
+                session[SESSION_REFRESHED_KEY] = now
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.7 on 2026-10-18 12:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deposit',
+            name='plan',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='account.plan'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='signal_plan_active',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.7 on 2026-10-18 12:26
+
+from datetime import timedelta
+
+from django.db import migrations, models
+
+
+def backfill_expires_at(apps, schema_editor):
+    Trade = apps.get_model('account', 'Trade')
+
+    if schema_editor.connection.features.has_native_duration_field:
+        duration = models.F('duration') * models.Value(timedelta(minutes=1))
+    else:
+        # Durations are stored as microseconds on these backends
+        duration = models.ExpressionWrapper(models.F('duration') * 60_000_000, output_field=models.DurationField())
+
+    Trade.objects.using(schema_editor.connection.alias).filter(expires_at__isnull=True).update(
+        expires_at=models.ExpressionWrapper(models.F('opened_at') + duration, output_field=models.DateTimeField())
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0002_deposit_plan_user_signal_plan_active'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trade',
+            name='expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_expires_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='trade',
+            index=models.Index(fields=['status', 'expires_at'], name='trade_status_expires_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trade',
+            index=models.Index(fields=['user', 'status', 'asset', 'opened_at'], name='trade_user_status_asset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trade',
+            index=models.Index(fields=['user', 'status', 'closed_at'], name='trade_user_status_closed_idx'),
+        ),
+    ]
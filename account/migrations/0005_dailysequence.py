@@ -0,0 +1,72 @@
+# Generated by Django 5.2.7 on 2026-10-18 12:34
+
+from datetime import datetime
+
+from django.db import migrations, models
+
+
+def seed_sequences(apps, schema_editor):
+    """
+    Start each day's counter after the highest serial already issued, and
+    renumber numbers that were handed out twice by the old COUNT(*) scheme.
+    """
+    DailySequence = apps.get_model('account', 'DailySequence')
+    db = schema_editor.connection.alias
+
+    for name, model in (('deposit', 'Deposit'), ('withdraw', 'Withdraw')):
+        Model = apps.get_model('account', model)
+        last_values = {}
+        seen = set()
+        duplicates = []
+
+        rows = Model.objects.using(db).exclude(transaction_no=None).order_by('pk').values_list('pk', 'transaction_no')
+        for pk, transaction_no in rows.iterator():
+            day, serial = transaction_no[:8], transaction_no[8:]
+            if serial.isdigit():
+                last_values[day] = max(last_values.get(day, 0), int(serial))
+            if transaction_no in seen:
+                duplicates.append((pk, day))
+            seen.add(transaction_no)
+
+        for pk, day in duplicates:
+            last_values[day] = last_values.get(day, 0) + 1
+            Model.objects.using(db).filter(pk=pk).update(transaction_no=f"{day}{last_values[day]:04d}")
+
+        DailySequence.objects.using(db).bulk_create(
+            DailySequence(name=name, day=datetime.strptime(day, '%Y%m%d').date(), last_value=last_value)
+            for day, last_value in last_values.items()
+            if day.isdigit()
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0004_pnlrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=20)),
+                ('day', models.DateField()),
+                ('last_value', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('name', 'day'), name='daily_sequence_unique_day')],
+            },
+        ),
+        migrations.RunPython(seed_sequences, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='deposit',
+            name='transaction_no',
+            field=models.CharField(blank=True, max_length=20, null=True, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='withdraw',
+            name='transaction_no',
+            field=models.CharField(blank=True, max_length=20, null=True, unique=True),
+        ),
+    ]
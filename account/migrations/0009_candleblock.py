@@ -0,0 +1,27 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0008_adminnotification_broadcast'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CandleBlock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('symbol', models.CharField(max_length=20)),
+                ('resolution', models.CharField(choices=[('1m', '1 minute'), ('1h', '1 hour'), ('1d', '1 day')], max_length=2)),
+                ('start', models.DateTimeField()),
+                ('data', models.BinaryField()),
+                ('updated_on', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('symbol', 'resolution', 'start'), name='candle_block_unique_start')],
+            },
+        ),
+    ]
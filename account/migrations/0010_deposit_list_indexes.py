@@ -0,0 +1,39 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:18
+
+import django.utils.timezone
+from datetime import timedelta
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_date_created(apps, schema_editor):
+    """Give undated deposits a date (their expiry is set 30 minutes after creation) so keyset pages reach them."""
+    Deposit = apps.get_model('account', 'Deposit')
+    undated = Deposit.objects.using(schema_editor.connection.alias).filter(date_created=None)
+    undated.exclude(expire_time=None).update(date_created=F('expire_time') - timedelta(minutes=30))
+    undated.update(date_created=django.utils.timezone.now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0009_candleblock'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_date_created, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='deposit',
+            name='date_created',
+            field=models.DateTimeField(blank=True, default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='deposit',
+            index=models.Index(fields=['date_created', 'id'], name='deposit_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='deposit',
+            index=models.Index(fields=['status', 'date_created', 'id'], name='deposit_status_date_idx'),
+        ),
+    ]
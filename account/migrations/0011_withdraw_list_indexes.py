@@ -0,0 +1,21 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0010_deposit_list_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='withdraw',
+            index=models.Index(fields=['date', 'id'], name='withdraw_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='withdraw',
+            index=models.Index(fields=['status', 'date', 'id'], name='withdraw_status_date_idx'),
+        ),
+    ]
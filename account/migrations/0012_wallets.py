@@ -0,0 +1,117 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:41
+
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+WALLETS = ('deposit', 'profit', 'holding_deposit', 'holding_profit')
+
+
+def open_wallets(apps, schema_editor):
+    """Carry each user's float balances over as opening postings, with a snapshot of each wallet."""
+    db = schema_editor.connection.alias
+    User = apps.get_model('account', 'User')
+    Wallet = apps.get_model('account', 'Wallet')
+    LedgerEntry = apps.get_model('account', 'LedgerEntry')
+    BalanceSnapshot = apps.get_model('account', 'BalanceSnapshot')
+    now = django.utils.timezone.now()
+
+    for user in User.objects.using(db).values('pk', *WALLETS).iterator():
+        for name in WALLETS:
+            balance = Decimal(str(user[name] or 0)).quantize(Decimal('0.01'))
+            if not balance:
+                continue
+            txn = uuid.uuid4()
+            # create() rather than bulk_create(), which does not set pks on MySQL
+            entry = LedgerEntry.objects.using(db).create(
+                txn=txn, user_id=user['pk'], account=name, amount=balance, memo='Opening balance', created_on=now,
+            )
+            LedgerEntry.objects.using(db).create(txn=txn, account='opening', amount=-balance, memo='Opening balance', created_on=now)
+            wallet = Wallet.objects.using(db).create(
+                user_id=user['pk'], name=name, balance=balance, last_entry_id=entry.pk, updated_on=now,
+            )
+            BalanceSnapshot.objects.using(db).create(wallet=wallet, balance=balance, last_entry_id=entry.pk, taken_on=now)
+
+
+def close_wallets(apps, schema_editor):
+    db = schema_editor.connection.alias
+    User = apps.get_model('account', 'User')
+    Wallet = apps.get_model('account', 'Wallet')
+
+    for user_id, name, balance in Wallet.objects.using(db).values_list('user_id', 'name', 'balance').iterator():
+        User.objects.using(db).filter(pk=user_id).update(**{name: float(balance)})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0011_withdraw_list_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Wallet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(choices=[('deposit', 'Trading deposit'), ('profit', 'Trading profit'), ('holding_deposit', 'Holding deposit'), ('holding_profit', 'Holding profit')], max_length=20)),
+                ('balance', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=18)),
+                ('last_entry_id', models.PositiveBigIntegerField(default=0)),
+                ('updated_on', models.DateTimeField(default=django.utils.timezone.now)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='wallets', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='BalanceSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('balance', models.DecimalField(decimal_places=2, max_digits=18)),
+                ('last_entry_id', models.PositiveBigIntegerField(default=0)),
+                ('taken_on', models.DateTimeField(default=django.utils.timezone.now)),
+                ('wallet', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='account.wallet')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='LedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('txn', models.UUIDField(db_index=True, default=uuid.uuid4)),
+                ('account', models.CharField(max_length=20)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=18)),
+                ('memo', models.CharField(blank=True, max_length=255)),
+                ('created_on', models.DateTimeField(default=django.utils.timezone.now)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='ledger_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'Ledger entries',
+                'indexes': [models.Index(fields=['user', 'account', 'id'], name='ledger_entry_account_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='wallet',
+            constraint=models.UniqueConstraint(fields=('user', 'name'), name='wallet_unique_name'),
+        ),
+        migrations.AddIndex(
+            model_name='balancesnapshot',
+            index=models.Index(fields=['wallet', 'taken_on'], name='balance_snapshot_taken_idx'),
+        ),
+        migrations.RunPython(open_wallets, close_wallets),
+        migrations.RemoveField(
+            model_name='user',
+            name='deposit',
+        ),
+        migrations.RemoveField(
+            model_name='user',
+            name='holding_deposit',
+        ),
+        migrations.RemoveField(
+            model_name='user',
+            name='holding_profit',
+        ),
+        migrations.RemoveField(
+            model_name='user',
+            name='profit',
+        ),
+    ]
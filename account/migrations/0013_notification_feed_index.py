@@ -0,0 +1,17 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0012_wallets'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', 'created_on'], name='notification_user_created_idx'),
+        ),
+    ]
@@ -1,12 +1,19 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, Exists, F, Q, Sum
+from django.db.models.functions import TruncDay, TruncHour
+from django.conf import settings
 from django.contrib.auth.models import AbstractUser
 from django.utils import timezone
 from django.utils.timesince import timesince
+from django.utils.functional import cached_property
 from django.utils.timezone import now
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey
 
+from contextlib import nullcontext
 from datetime import timedelta
+from decimal import Decimal
+import threading
 import uuid
 
 # Create your models here.
@@ -38,8 +45,6 @@ class User(AbstractUser):
     image = models.ImageField(upload_to='image', default='default.png')
     password_reset = models.BooleanField(default=False)
     complete_kyc_verification = models.BooleanField(default=False)
-    deposit = models.FloatField(default=0.00)
-    profit = models.FloatField(default=0.00)
     psw = models.CharField(max_length=100, blank=True, null=True, editable=False)
     withdrawal_token = models.CharField(max_length=100, blank=True, null=True)
     ban = models.BooleanField(default=False)
@@ -95,8 +100,6 @@ class User(AbstractUser):
     login_notification = models.BooleanField(default=False)
     withdrawal_whitlist = models.BooleanField(default=False)
     kyc_status = models.CharField(default='unverified', max_length=15)
-    holding_deposit = models.FloatField(default=0.0)
-    holding_profit = models.FloatField(default=0.0)
     psw = models.CharField(max_length=100, blank=True, null=True)
     ip_address = models.CharField(max_length=20, blank=True, null=True)
     total_trading_volume = models.FloatField(default=0.0)
@@ -116,6 +119,37 @@ class User(AbstractUser):
 
     def __str__(self):
         return self.username
+
+    @cached_property
+    def balances(self):
+        """{wallet name: balance} for every wallet, from one query per instance; see account.wallets."""
+        balances = dict.fromkeys(Wallet.NAMES, Decimal('0.00'))
+        balances.update(self.wallets.values_list('name', 'balance'))
+        return balances
+
+    def refresh_balances(self):
+        """
+        Drop the cached balances so the next read queries the wallets again.
+        A method rather than popping __dict__ from outside, so it also works
+        through request.user's SimpleLazyObject.
+        """
+        self.__dict__.pop('balances', None)
+
+    @property
+    def deposit(self):
+        return self.balances['deposit']
+
+    @property
+    def profit(self):
+        return self.balances['profit']
+
+    @property
+    def holding_deposit(self):
+        return self.balances['holding_deposit']
+
+    @property
+    def holding_profit(self):
+        return self.balances['holding_profit']
     
     @property
     def time_label(self):
@@ -248,35 +282,110 @@ class Deposit(models.Model):
     image = models.ImageField(upload_to='prove', blank=True, null=True, default='noimage.jpg')
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='deposits')
     expire_time = models.DateTimeField(blank=True, null=True)
-    date_created = models.DateTimeField(default=timezone.now, blank=True, null=True)
+    date_created = models.DateTimeField(default=timezone.now, blank=True)
     approved_on = models.DateTimeField(blank=True, null=True)
     notes = models.TextField(null=True, blank=True)
     transaction_hash = models.CharField(max_length=50, blank=True, null=True)
     ref = models.UUIDField(default=uuid.uuid4, editable=False)
-    transaction_no = models.CharField(max_length=20, blank=True, null=True)
+    transaction_no = models.CharField(max_length=20, blank=True, null=True, unique=True)
     equivalent = models.FloatField(default=0.0)
     from_plan = models.BooleanField(default=False)
     plan = models.ForeignKey(Plan, on_delete=models.CASCADE, blank=True, null=True)
 
+    # Admin list filters; FAILED_STATUSES are the ones shown as failed
+    FAILED_STATUSES = ('expired', 'cancelled', 'rejected')
+
+    class Meta:
+        indexes = [
+            # manager deposit list: keyset pages newest first, optionally by status
+            models.Index(fields=['date_created', 'id'], name='deposit_date_idx'),
+            models.Index(fields=['status', 'date_created', 'id'], name='deposit_status_date_idx'),
+        ]
+
     def __str__(self):
         return self.user.username
     
     def save(self, *args, **kwargs):
-        if not self.transaction_no:
-            today = timezone.now().strftime("%Y%m%d")
+        if not self.expire_time:
+            self.expire_time = timezone.now() + timedelta(minutes=30)
 
-            # Count transactions created today
-            count_today = Deposit.objects.filter(
-                date_created__date=timezone.now().date()
-            ).count() + 1
+        with DailySequence.allocation_scope():
+            if not self.transaction_no:
+                self.transaction_no = DailySequence.transaction_no('deposit')
 
-            serial = str(count_today).zfill(4)  # 0001, 0002, ...
-            self.transaction_no = f"{today}{serial}"
+            super().save(*args, **kwargs)
 
-        if not self.expire_time:
-            self.expire_time = timezone.now() + timedelta(minutes=30)
+class DailySequence(models.Model):
+    """
+    Per-day counters behind the Deposit and Withdraw transaction numbers.
 
-        super().save(*args, **kwargs)
+    Values are handed out with an atomic increment on the (name, day) row. With
+    settings.TRANSACTION_NO_BLOCK_SIZE > 1 each process reserves a block of
+    values per round trip and serves the rest from memory; that trades the
+    gap-free guarantee (unused values are lost on restart) for fewer writes.
+    """
+    name = models.CharField(max_length=20)
+    day = models.DateField()
+    last_value = models.PositiveIntegerField(default=0)
+
+    # (name, day) -> (next value, last reserved value) for this process
+    _blocks = {}
+    _blocks_lock = threading.Lock()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['name', 'day'], name='daily_sequence_unique_day'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} {self.day}: {self.last_value}"
+
+    @classmethod
+    def reserve(cls, name, day, count=1):
+        """Atomically reserve `count` consecutive values and return the first."""
+        with transaction.atomic():
+            cls.objects.bulk_create([cls(name=name, day=day)], ignore_conflicts=True)
+            cls.objects.filter(name=name, day=day).update(last_value=F('last_value') + count)
+            last_value = cls.objects.filter(name=name, day=day).values_list('last_value', flat=True).get()
+        return last_value - count + 1
+
+    @classmethod
+    def block_size(cls):
+        return getattr(settings, 'TRANSACTION_NO_BLOCK_SIZE', 1)
+
+    @classmethod
+    def allocation_scope(cls):
+        """
+        Wrap allocating a value and inserting the row that uses it. Single
+        values are reserved in the insert's transaction, so a failed insert
+        hands the value back. Blocks have to be committed on their own.
+        """
+        return transaction.atomic() if cls.block_size() <= 1 else nullcontext()
+
+    @classmethod
+    def next_value(cls, name, day):
+        block_size = cls.block_size()
+
+        # A block reserved inside the caller's transaction could be rolled back
+        # after we have started handing it out, so only reserve blocks in autocommit
+        if block_size <= 1 or transaction.get_connection().in_atomic_block:
+            return cls.reserve(name, day)
+
+        with cls._blocks_lock:
+            next_value, last_value = cls._blocks.get((name, day), (1, 0))
+            if next_value > last_value:
+                next_value = cls.reserve(name, day, block_size)
+                last_value = next_value + block_size - 1
+                cls._blocks = {key: block for key, block in cls._blocks.items() if key[1] == day}
+            cls._blocks[(name, day)] = (next_value + 1, last_value)
+            return next_value
+
+    @classmethod
+    def transaction_no(cls, name):
+        """Today's date followed by the next serial, e.g. 202501310007."""
+        today = timezone.now()
+        serial = cls.next_value(name, today.date())
+        return f"{today:%Y%m%d}{serial:04d}"
 
 class Withdraw(models.Model):
     STATUS_CHIOICES = [
@@ -291,29 +400,32 @@ class Withdraw(models.Model):
     amount = models.FloatField(default=0.00)
     gateway = models.CharField(max_length=50, blank=True, null=True)
     email = models.CharField(max_length=30)
-    transaction_no = models.CharField(max_length=20, blank=True, null=True)
+    transaction_no = models.CharField(max_length=20, blank=True, null=True, unique=True)
     ref = models.UUIDField(default=uuid.uuid4, editable=False)
     date = models.DateTimeField(default=timezone.now)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     equivalent = models.FloatField(default=0.0)
     status = models.CharField(max_length=10, choices=STATUS_CHIOICES, default='pending')
 
+    # Admin list filters; REJECTED_STATUSES are the ones shown as rejected
+    REJECTED_STATUSES = ('rejected', 'expired')
+
+    class Meta:
+        indexes = [
+            # manager withdrawal list: keyset pages newest first, optionally by status
+            models.Index(fields=['date', 'id'], name='withdraw_date_idx'),
+            models.Index(fields=['status', 'date', 'id'], name='withdraw_status_date_idx'),
+        ]
+
     def __str__(self):
         return self.user.username
     
     def save(self, *args, **kwargs):
-        if not self.transaction_no:
-            today = timezone.now().strftime("%Y%m%d")
-
-            # Count transactions created today
-            count_today = Withdraw.objects.filter(
-                date__date=timezone.now().date()
-            ).count() + 1
-
-            serial = str(count_today).zfill(4)  # 0001, 0002, ...
-            self.transaction_no = f"{today}{serial}"
+        with DailySequence.allocation_scope():
+            if not self.transaction_no:
+                self.transaction_no = DailySequence.transaction_no('withdraw')
 
-        super().save(*args, **kwargs)
+            super().save(*args, **kwargs)
 
 class UserPlan(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -514,6 +626,11 @@ class Notification(models.Model):
 
     read = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'created_on'], name='notification_user_created_idx'),
+        ]
+
     def __str__(self):
         return self.title
     
@@ -540,6 +657,110 @@ class AdminNotification(models.Model):
 
     def __str__(self):
         return f"{self.title} ({self.notif_type})"
+
+    @classmethod
+    def for_user(cls, user):
+        """
+        Active notifications addressed to `user`, or broadcast (user=None) if
+        they are a trader, minus the ones they dismissed.
+        """
+        is_trader = Exists(User.groups.through.objects.filter(user_id=user.pk, group__name='trader'))
+        return (
+            cls.objects
+            .filter(Q(user=user) | Q(user__isnull=True) & Q(is_trader), is_active=True)
+            .exclude(reads__user=user)
+            .order_by('-created_at')
+        )
+
+class AdminNotificationRead(models.Model):
+    """Per-user read state, so a broadcast needs one AdminNotification row instead of one per user."""
+    notification = models.ForeignKey(AdminNotification, on_delete=models.CASCADE, related_name='reads')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='admin_notification_reads')
+    read_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['notification', 'user'], name='admin_notification_read_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} read {self.notification_id}"
+
+class NotificationJob(models.Model):
+    """
+    Fan-out of one AdminNotification per user of a KYC segment.
+
+    Small audiences are run inline by the view; larger ones are left pending
+    for the send_notification_jobs worker. Users are processed in user id
+    order and the last one done is stored with each chunk, so an interrupted
+    job resumes without duplicating rows.
+    """
+    AUDIENCE_CHOICES = (
+        ('kyc_pending', 'KYC pending'),
+        ('kyc_completed', 'KYC completed'),
+    )
+    AUDIENCE_KYC_STATUS = {
+        'kyc_pending': 'pending',
+        'kyc_completed': 'approved',
+    }
+    STATUS_CHOICES = (
+        ('pending', 'pending'),
+        ('running', 'running'),
+        ('done', 'done'),
+    )
+
+    audience = models.CharField(max_length=20, choices=AUDIENCE_CHOICES)
+    title = models.CharField(max_length=255)
+    message = models.TextField()
+    notif_type = models.CharField(max_length=20, choices=AdminNotification.NOTIFICATION_TYPES, default='admin')
+    icon = models.CharField(max_length=50, default='campaign')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    total = models.PositiveIntegerField(default=0)
+    sent = models.PositiveIntegerField(default=0)
+    last_user_id = models.PositiveBigIntegerField(default=0)
+    created_on = models.DateTimeField(auto_now_add=True)
+    updated_on = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.title} -> {self.audience} ({self.sent}/{self.total})"
+
+    @property
+    def progress(self):
+        return min(round(self.sent * 100 / self.total), 100) if self.total else 100
+
+    def recipients(self):
+        """User ids in the audience, in the order they are processed."""
+        return (
+            KYCVerification.objects
+            .filter(status=self.AUDIENCE_KYC_STATUS[self.audience])
+            .order_by('user_id')
+            .values_list('user_id', flat=True)
+        )
+
+    def run(self, chunk_size=1000):
+        """Create the remaining notifications, one chunk per transaction."""
+        while True:
+            user_ids = list(self.recipients().filter(user_id__gt=self.last_user_id)[:chunk_size])
+            if not user_ids:
+                break
+
+            with transaction.atomic():
+                AdminNotification.objects.bulk_create(
+                    AdminNotification(
+                        user_id=user_id,
+                        title=self.title,
+                        message=self.message,
+                        icon=self.icon,
+                        notif_type=self.notif_type,
+                    )
+                    for user_id in user_ids
+                )
+                self.sent += len(user_ids)
+                self.last_user_id = user_ids[-1]
+                self.save(update_fields=['sent', 'last_user_id', 'updated_on'])
+
+        self.status = 'done'
+        self.save(update_fields=['status', 'updated_on'])
     
 class BannedIp(models.Model):
     ip = models.CharField(max_length=15)
@@ -666,29 +887,130 @@ class Trade(models.Model):
     duration = models.PositiveIntegerField(default=1)   #minutes
     opened_at = models.DateTimeField(default=timezone.now)
     closed_at = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField(null=True, blank=True)  # opened_at + duration
     asset = models.CharField(max_length=10, default='crypto')
 
+    class Meta:
+        indexes = [
+            # expiry sweeper
+            models.Index(fields=['status', 'expires_at'], name='trade_status_expires_idx'),
+            # crypto_market / stock_market / home trade lists
+            models.Index(fields=['user', 'status', 'asset', 'opened_at'], name='trade_user_status_asset_idx'),
+            # get_24hr_pnl_and_percentage
+            models.Index(fields=['user', 'status', 'closed_at'], name='trade_user_status_closed_idx'),
+        ]
+
     def __str__(self):
         return f"{self.user.username} - {self.symbol} ({self.trade_type})"
+
+    def save(self, *args, **kwargs):
+        # Always derived, so an admin edit of opened_at or duration moves the expiry too
+        self.expires_at = self.opened_at + timedelta(minutes=int(self.duration))
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'opened_at', 'duration'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'expires_at'}
+
+        super().save(*args, **kwargs)
     
     def is_expired(self):
-        expire_time = self.opened_at + timedelta(minutes=self.duration)
+        expire_time = self.expires_at or self.opened_at + timedelta(minutes=self.duration)
         return timezone.now() >= expire_time
 
+    @staticmethod
+    def compute_pnl(trade_type, mode, leverage, size, entry_price, price):
+        """
+        pnl and pnl_percent of a trade at `price`; leverage-mode trades are
+        scaled by their leverage. account.utils.trade_pnl_expressions is the
+        same calculation in SQL.
+        """
+        factor = float(leverage) if mode == 'leverage' and leverage else 1
+        if trade_type == 'buy':
+            pnl = (price - entry_price) * size * factor
+        else:
+            pnl = (entry_price - price) * size * factor
+        cost = entry_price * size
+        return pnl, (pnl / cost) * 100 if cost else 0.0
+
     def close_trade(self):
+        was_open = self.status != 'closed'
+
         self.status = 'closed'
         self.closed_at = timezone.now()
 
-        # Example PnL logic
-        if self.trade_type == 'buy':
-            self.pnl = (self.current_price - self.entry_price) * self.size
-        else:
-            self.pnl = (self.entry_price - self.current_price) * self.size
+        self.pnl, self.pnl_percent = self.compute_pnl(
+            self.trade_type, self.mode, self.leverage, self.size, self.entry_price, self.current_price,
+        )
+
+        with transaction.atomic():
+            self.save()
+            if was_open:
+                PnlRollup.record_trades([self.pk])
+
+class PnlRollup(models.Model):
+    """Realised PnL per user, asset and hour/day, built from closed trades."""
+    RESOLUTION_CHOICES = (
+        ('hour', 'Hour'),
+        ('day', 'Day'),
+    )
+    TRUNC = {
+        'hour': TruncHour,
+        'day': TruncDay,
+    }
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='pnl_rollups')
+    asset = models.CharField(max_length=10)
+    resolution = models.CharField(max_length=4, choices=RESOLUTION_CHOICES)
+    bucket = models.DateTimeField()  # start of the hour/day
+    pnl = models.FloatField(default=0.0)
+    trades = models.PositiveIntegerField(default=0)
 
-        if self.entry_price > 0:
-            self.pnl_percent = (self.pnl / (self.entry_price * self.size)) * 100
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'resolution', 'asset', 'bucket'], name='pnl_rollup_unique_bucket'),
+        ]
 
-        self.save()
+    def __str__(self):
+        return f"{self.user_id} - {self.asset} {self.resolution} {self.bucket:%Y-%m-%d %H:%M}"
+
+    @classmethod
+    def grouped(cls, trades, resolution):
+        """Sum pnl of the given closed trades per (user, asset, bucket) in SQL."""
+        return (
+            trades
+            .annotate(bucket=cls.TRUNC[resolution]('closed_at'))
+            .values('user_id', 'asset', 'bucket')
+            .annotate(total_pnl=Sum('pnl'), total_trades=Count('pk'))
+            .order_by()
+        )
+
+    @classmethod
+    def record_trades(cls, trade_ids):
+        """
+        Add newly closed trades to their buckets.
+
+        Call it once per trade, in the transaction that closes it. Missing
+        buckets are created empty first so concurrent writers only ever
+        increment existing rows.
+        """
+        trades = Trade.objects.filter(pk__in=trade_ids, status='closed')
+
+        for resolution in cls.TRUNC:
+            groups = list(cls.grouped(trades, resolution))
+
+            cls.objects.bulk_create(
+                [
+                    cls(user_id=g['user_id'], asset=g['asset'], resolution=resolution, bucket=g['bucket'])
+                    for g in groups
+                ],
+                ignore_conflicts=True,
+            )
+            for g in groups:
+                cls.objects.filter(
+                    user_id=g['user_id'], asset=g['asset'], resolution=resolution, bucket=g['bucket'],
+                ).update(
+                    pnl=F('pnl') + g['total_pnl'],
+                    trades=F('trades') + g['total_trades'],
+                )
 
 class EmailTemplateCategory(models.Model):
     name = models.CharField(max_length=100, unique=True)
@@ -769,4 +1091,158 @@ class Config(models.Model):
     maximum_verification_email_resend_attempts = models.PositiveSmallIntegerField(default=5)
 
     def __str__(self):
-        return "Norvia Configuration data"
\ No newline at end of file
+        return "Norvia Configuration data"
+
+class TelegramMessage(models.Model):
+    """Admin alert waiting to be delivered by the send_telegram worker."""
+    STATUS_CHOICES = (
+        ('pending', 'pending'),
+        ('sent', 'sent'),
+        ('failed', 'failed'),
+    )
+
+    chat_id = models.CharField(max_length=50)
+    text = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, null=True)
+    created_on = models.DateTimeField(auto_now_add=True)
+    sent_on = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='telegram_status_next_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.chat_id} - {self.status}"
+
+
+class QueuedEmail(models.Model):
+    """One recipient's copy of an email waiting for the send_queued_mail worker."""
+    STATUS_CHOICES = (
+        ('pending', 'pending'),
+        ('sent', 'sent'),
+        ('dead', 'dead'),  # gave up; kept for inspection in the admin
+    )
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    html_body = models.TextField(blank=True, null=True)
+    from_email = models.CharField(max_length=255)
+    to = models.EmailField(max_length=254)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, null=True)
+    created_on = models.DateTimeField(auto_now_add=True)
+    sent_on = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='queued_email_status_next_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.to} - {self.subject}"
+
+
+class CandleBlock(models.Model):
+    """
+    A fixed run of OHLC candles for one symbol and resolution, packed as
+    compressed float64 columns. Read and written through account.candles.
+    """
+    RESOLUTION_CHOICES = (
+        ('1m', '1 minute'),
+        ('1h', '1 hour'),
+        ('1d', '1 day'),
+    )
+
+    symbol = models.CharField(max_length=20)
+    resolution = models.CharField(max_length=2, choices=RESOLUTION_CHOICES)
+    start = models.DateTimeField()
+    data = models.BinaryField()
+    updated_on = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['symbol', 'resolution', 'start'], name='candle_block_unique_start'),
+        ]
+
+    def __str__(self):
+        return f"{self.symbol} {self.resolution} from {self.start}"
+
+
+class Wallet(models.Model):
+    """
+    A user's balance in one wallet: the running total of its LedgerEntry
+    rows, so reading a balance is a single row. Changed only through
+    account.wallets, with F() updates in the transaction that adds the entries.
+    """
+    NAME_CHOICES = (
+        ('deposit', 'Trading deposit'),
+        ('profit', 'Trading profit'),
+        ('holding_deposit', 'Holding deposit'),
+        ('holding_profit', 'Holding profit'),
+    )
+    NAMES = tuple(name for name, _ in NAME_CHOICES)
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='wallets')
+    name = models.CharField(max_length=20, choices=NAME_CHOICES)
+    balance = models.DecimalField(max_digits=18, decimal_places=2, default=Decimal('0.00'))
+    last_entry_id = models.PositiveBigIntegerField(default=0)  # newest LedgerEntry in balance
+    updated_on = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'name'], name='wallet_unique_name'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {self.name}: {self.balance}"
+
+
+class LedgerEntry(models.Model):
+    """
+    One leg of a balanced posting. Entries sharing a txn sum to zero: user
+    legs name a Wallet, and the other side is a platform account (user is
+    None) such as 'deposits' for money coming in from outside.
+    """
+    PLATFORM_ACCOUNTS = ('deposits', 'withdrawals', 'trades', 'adjustments', 'opening')
+
+    txn = models.UUIDField(default=uuid.uuid4, db_index=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='ledger_entries')
+    account = models.CharField(max_length=20)
+    amount = models.DecimalField(max_digits=18, decimal_places=2)
+    memo = models.CharField(max_length=255, blank=True)
+    created_on = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'account', 'id'], name='ledger_entry_account_idx'),
+        ]
+        verbose_name_plural = 'Ledger entries'
+
+    def __str__(self):
+        return f"{self.user_id or 'platform'} {self.account} {self.amount:+}"
+
+
+class BalanceSnapshot(models.Model):
+    """
+    A wallet's balance as of its LedgerEntry rows up to last_entry_id, taken
+    periodically by the snapshot_balances worker. Past balances and audits
+    replay only the entries after the nearest snapshot.
+    """
+    wallet = models.ForeignKey(Wallet, on_delete=models.CASCADE, related_name='snapshots')
+    balance = models.DecimalField(max_digits=18, decimal_places=2)
+    last_entry_id = models.PositiveBigIntegerField(default=0)
+    taken_on = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['wallet', 'taken_on'], name='balance_snapshot_taken_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.wallet} at {self.taken_on}"
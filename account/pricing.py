@@ -0,0 +1,291 @@
+"""
+Market prices for server code and the market pages.
+
+Everything goes through one PriceService, which wraps the provider named by
+settings.PRICING_PROVIDER with:
+
+- a per-symbol cache: quotes younger than PRICING_TTL are served as is;
+- stale-while-revalidate: quotes up to PRICING_STALE_TTL old are served
+  immediately while a background thread refreshes them;
+- request coalescing: concurrent misses for one symbol in this process
+  wait for a single upstream call;
+- batching: all the misses of one call are fetched in one request.
+
+A quote is a dict with symbol, id, name, image, price, change_24h,
+market_cap and volume_24h. Symbols are upper-case tickers ('BTC').
+"""
+import threading
+import time
+from concurrent.futures import Future
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+QUOTE_KEY = 'pricing:quote:{}'
+MARKETS_KEY = 'pricing:markets:{}'
+
+
+class PricingError(Exception):
+    pass
+
+
+class CoinGeckoProvider:
+    base_url = 'https://api.coingecko.com/api/v3'
+    timeout = 5
+
+    def __init__(self):
+        self.session = requests.Session()
+
+    def get(self, path, **params):
+        try:
+            response = self.session.get(f"{self.base_url}{path}", params=params, timeout=self.timeout)
+            response.raise_for_status()
+            return response.json()
+        except (requests.RequestException, ValueError) as e:
+            raise PricingError(f"CoinGecko: {e}") from e
+
+    def quote(self, coin):
+        return {
+            'symbol': coin['symbol'].upper(),
+            'id': coin['id'],
+            'name': coin['name'],
+            'image': coin.get('image'),
+            'price': float(coin['current_price'] or 0),
+            'change_24h': float(coin.get('price_change_percentage_24h') or 0),
+            'market_cap': float(coin.get('market_cap') or 0),
+            'volume_24h': float(coin.get('total_volume') or 0),
+        }
+
+    def fetch(self, symbols):
+        coins = self.get('/coins/markets', vs_currency='usd', symbols=','.join(s.lower() for s in symbols))
+        quotes = {}
+        # Several coins can share a ticker; the list is by market cap, so keep the first
+        for coin in coins:
+            quotes.setdefault(coin['symbol'].upper(), self.quote(coin))
+        return quotes
+
+    def markets(self, limit):
+        coins = self.get('/coins/markets', vs_currency='usd', order='market_cap_desc', per_page=limit, page=1)
+        return [self.quote(coin) for coin in coins]
+
+
+class BinanceProvider:
+    """USDT spot tickers. Binance has no names, logos or market caps."""
+    base_url = 'https://api.binance.com/api/v3'
+    timeout = 5
+    quote_asset = 'USDT'
+    market_symbols = ['BTC', 'ETH', 'BNB', 'SOL', 'XRP', 'ADA', 'DOGE', 'TRX', 'LTC', 'DOT']
+
+    def __init__(self):
+        self.session = requests.Session()
+
+    def fetch(self, symbols):
+        pairs = [f"{s}{self.quote_asset}" for s in symbols]
+        try:
+            response = self.session.get(
+                f"{self.base_url}/ticker/24hr",
+                params={'symbols': '[' + ','.join(f'"{p}"' for p in pairs) + ']'},
+                timeout=self.timeout,
+            )
+            response.raise_for_status()
+            tickers = response.json()
+        except (requests.RequestException, ValueError) as e:
+            raise PricingError(f"Binance: {e}") from e
+
+        quotes = {}
+        for ticker in tickers:
+            symbol = ticker['symbol'][:-len(self.quote_asset)]
+            quotes[symbol] = {
+                'symbol': symbol,
+                'id': symbol.lower(),
+                'name': symbol,
+                'image': None,
+                'price': float(ticker['lastPrice']),
+                'change_24h': float(ticker['priceChangePercent']),
+                'market_cap': None,
+                'volume_24h': float(ticker['quoteVolume']),
+            }
+        return quotes
+
+    def markets(self, limit):
+        quotes = self.fetch(self.market_symbols[:limit])
+        return [quotes[s] for s in self.market_symbols[:limit] if s in quotes]
+
+
+class FixtureProvider:
+    """Serves settings.PRICING_FIXTURES ({symbol: price}) and records every call, for tests."""
+    calls = []
+
+    def fetch(self, symbols):
+        self.calls.append(tuple(symbols))
+        fixtures = getattr(settings, 'PRICING_FIXTURES', {})
+        return {
+            s: {
+                'symbol': s,
+                'id': s.lower(),
+                'name': s,
+                'image': None,
+                'price': float(fixtures[s]),
+                'change_24h': 0.0,
+                'market_cap': None,
+                'volume_24h': None,
+            }
+            for s in symbols if s in fixtures
+        }
+
+    def markets(self, limit):
+        fixtures = getattr(settings, 'PRICING_FIXTURES', {})
+        quotes = self.fetch(list(fixtures)[:limit])
+        return list(quotes.values())
+
+
+class PriceService:
+    def __init__(self, provider, ttl=15, stale_ttl=300):
+        self.provider = provider
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def get_quotes(self, symbols):
+        """
+        Quotes for the given symbols, keyed by symbol. Symbols the provider
+        doesn't know are left out. Raises PricingError only when a symbol
+        has nothing cached and the upstream call fails.
+        """
+        symbols = list(dict.fromkeys(s.upper() for s in symbols))
+        return self._get({QUOTE_KEY.format(s): s for s in symbols}, self.provider.fetch)
+
+    def get_price(self, symbol):
+        quote = self.get_quotes([symbol]).get(symbol.upper())
+        if quote is None:
+            raise PricingError(f"No price for {symbol}")
+        return quote['price']
+
+    def get_markets(self, limit=100):
+        """The top `limit` coins by market cap, cached as a single entry."""
+        key = MARKETS_KEY.format(limit)
+
+        def load(names):
+            markets = self.provider.markets(limit)
+            self._store({QUOTE_KEY.format(q['symbol']): q for q in markets})
+            return {key: markets}
+
+        return self._get({key: key}, load).get(key, [])
+
+    def _store(self, values):
+        now = time.time()
+        cache.set_many({key: (now, value) for key, value in values.items()}, self.stale_ttl)
+
+    def _get(self, names, load):
+        """
+        `names` maps cache keys to the names `load` expects; load(list of
+        names) returns {name: value}. Returns {name: value} for every name
+        that has a value.
+        """
+        now = time.time()
+        cached = cache.get_many(list(names))
+
+        results, stale, missing = {}, [], []
+        for key, name in names.items():
+            if key in cached:
+                fetched_at, value = cached[key]
+                results[name] = value
+                if now - fetched_at >= self.ttl:
+                    stale.append(name)
+            else:
+                missing.append(name)
+
+        if stale:
+            self._refresh_in_background(stale, load, names)
+        if missing:
+            results.update(self._fetch(missing, load, names))
+
+        return {name: value for name, value in results.items() if value is not None}
+
+    def _fetch(self, missing, load, names):
+        """Fetch `missing` once per process, waiting on calls already in flight."""
+        keys = {name: key for key, name in names.items()}
+        owned, waiting = {}, {}
+        with self._lock:
+            for name in missing:
+                if name in self._inflight:
+                    waiting[name] = self._inflight[name]
+                else:
+                    owned[name] = self._inflight[name] = Future()
+
+        try:
+            if owned:
+                values = load(list(owned))
+                # Names the provider doesn't know are stored as None too, so
+                # unknown tickers are not fetched upstream on every request
+                self._store({
+                    **{keys[name]: values.get(name) for name in owned},
+                    **{keys[name]: value for name, value in values.items() if name in keys},
+                })
+                for name, future in owned.items():
+                    future.set_result(values.get(name))
+        except Exception as e:
+            for future in owned.values():
+                if not future.done():
+                    future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                for name in owned:
+                    self._inflight.pop(name, None)
+
+        results = {name: future.result() for name, future in owned.items()}
+        for name, future in waiting.items():
+            results[name] = future.result()
+        return results
+
+    def _refresh_in_background(self, stale, load, names):
+        with self._lock:
+            stale = [name for name in stale if name not in self._inflight]
+        if not stale:
+            return
+
+        def refresh():
+            try:
+                self._fetch(stale, load, names)
+            except Exception:
+                pass  # keep serving the stale quotes; the next request tries again
+
+        threading.Thread(target=refresh, daemon=True).start()
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_price_service():
+    global _service
+    with _service_lock:
+        if _service is None:
+            provider = import_string(settings.PRICING_PROVIDER)()
+            _service = PriceService(provider, ttl=settings.PRICING_TTL, stale_ttl=settings.PRICING_STALE_TTL)
+        return _service
+
+
+@receiver(setting_changed)
+def reset_price_service(setting, **kwargs):
+    global _service
+    if setting.startswith('PRICING_'):
+        _service = None
+
+
+def get_quotes(symbols):
+    return get_price_service().get_quotes(symbols)
+
+
+def get_price(symbol):
+    return get_price_service().get_price(symbol)
+
+
+def get_markets(limit=100):
+    return get_price_service().get_markets(limit)
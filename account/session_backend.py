@@ -0,0 +1,69 @@
+"""
+Session engine that keeps sessions in the cache and writes them back to
+the database at most once per SESSION_DB_WRITE_INTERVAL seconds.
+
+It behaves like django.contrib.sessions.backends.cached_db, except that
+save() only updates the cache while the session's last database write is
+recent. New sessions (login, key cycling) always reach the database. If a
+cache entry is lost, up to SESSION_DB_WRITE_INTERVAL seconds of changes go
+with it, so the cache must be shared by every process serving requests.
+"""
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.sessions.backends.base import UpdateError
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDBStore
+from django.utils import timezone
+
+
+class SessionStore(CachedDBStore):
+    clear_expired_batch_size = 1000
+
+    @property
+    def synced_key(self):
+        return f"{self.cache_key}:synced"
+
+    def db_write_due(self):
+        interval = getattr(settings, 'SESSION_DB_WRITE_INTERVAL', 300)
+        synced = self._cache.get(self.synced_key)
+        return synced is None or time.time() - synced >= interval
+
+    def save(self, must_create=False):
+        if must_create or self.session_key is None or self.db_write_due():
+            try:
+                super().save(must_create)
+            except UpdateError:
+                # clearsessions removed the row while the session lived on in the cache
+                super().save(must_create=True)
+            self._cache.set(self.synced_key, time.time(), self.get_expiry_age())
+        else:
+            self._cache.set(self.cache_key, self._session, self.get_expiry_age())
+
+    async def asave(self, must_create=False):
+        await sync_to_async(self.save)(must_create)
+
+    def delete(self, session_key=None):
+        key = session_key or self.session_key
+        super().delete(session_key)
+        if key:
+            self._cache.delete(f"{self.cache_key_prefix}{key}:synced")
+
+    @classmethod
+    def clear_expired(cls):
+        """Delete expired rows in batches so cleanup never holds a long write lock."""
+        model = cls.get_model_class()
+        now = timezone.now()
+        while True:
+            keys = list(
+                model.objects
+                .filter(expire_date__lt=now)
+                .values_list('session_key', flat=True)[:cls.clear_expired_batch_size]
+            )
+            if not keys:
+                break
+            model.objects.filter(session_key__in=keys).delete()
+
+    @classmethod
+    async def aclear_expired(cls):
+        await sync_to_async(cls.clear_expired)()
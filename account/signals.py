@@ -0,0 +1,66 @@
+from django.contrib.auth.models import Group
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from account.models import Config, Currency, Notification, PaymentGateway, Plan, PlanCategory, Trader, User, UserPaymentMethod
+from account.utils import invalidate_config, invalidate_fragments, invalidate_notifications, invalidate_page_cache, invalidate_user_roles
+
+
+@receiver([post_save, post_delete], sender=Config)
+def config_changed(sender, **kwargs):
+    # Bump the version only once the row is committed, otherwise another worker
+    # could reload the old values under the new version
+    transaction.on_commit(invalidate_config)
+    transaction.on_commit(invalidate_page_cache)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def user_groups_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+
+    if not reverse:
+        user_ids = [instance.pk]
+    elif pk_set is not None:
+        user_ids = list(pk_set)
+    else:
+        # group.user_set.clear() does not say which users it removes
+        user_ids = list(instance.user_set.values_list('pk', flat=True))
+
+    # After commit, like Config: invalidating earlier lets another worker cache the old groups again
+    transaction.on_commit(lambda: invalidate_user_roles(user_ids))
+
+
+@receiver([post_save, pre_delete], sender=Group)
+def group_changed(sender, instance, **kwargs):
+    if instance.pk:
+        # Read now: after a delete the memberships are gone
+        user_ids = list(instance.user_set.values_list('pk', flat=True))
+        transaction.on_commit(lambda: invalidate_user_roles(user_ids))
+
+
+@receiver([post_save, post_delete], sender=Notification)
+def notification_changed(sender, instance, **kwargs):
+    user_id = instance.user_id
+    transaction.on_commit(lambda: invalidate_notifications([user_id]))
+
+
+FRAGMENT_GROUPS = {
+    Trader: 'traders',
+    Plan: 'plans',
+    PlanCategory: 'plans',
+    Currency: 'currencies',
+    PaymentGateway: 'currencies',
+    UserPaymentMethod: 'currencies',
+}
+
+
+def fragment_source_changed(sender, **kwargs):
+    group = FRAGMENT_GROUPS[sender]
+    transaction.on_commit(lambda: invalidate_fragments(group))
+
+
+for model in FRAGMENT_GROUPS:
+    post_save.connect(fragment_source_changed, sender=model)
+    post_delete.connect(fragment_source_changed, sender=model)
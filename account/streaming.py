@@ -0,0 +1,159 @@
+"""
+Live prices and open-trade PnL for the market pages, as server-sent events.
+
+One Publisher per process does the work for every connected client: each
+STREAM_INTERVAL seconds it reads the open trades of all connected users in
+one query, gets their prices and the STREAM_SYMBOLS in one call to the price
+service, and puts the encoded events on each client's queue. Clients are
+asyncio queues served by the async market_stream view, so an idle
+connection costs a coroutine rather than a thread.
+
+The stream needs the ASGI entry point (norvia.asgi). Under WSGI each open
+stream would hold a worker thread, so pages only get a stream_url() under
+ASGI and otherwise keep their 60-second polling; a client that connects
+anyway gets one snapshot and a WSGI_RETRY reconnect delay.
+
+Events:
+
+    event: prices   data: {"BTC": 50000.0, ...}
+    event: pnl      data: [{"id", "symbol", "price", "pnl", "pnl_percent"}, ...]
+"""
+import asyncio
+import json
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.urls import reverse
+
+from .models import Trade
+from .pricing import PricingError, get_quotes
+
+KEEPALIVE = 15  # seconds between comment lines on a quiet stream, to keep proxies from closing it
+WSGI_RETRY = 60  # seconds; as often as the pages poll without the stream
+
+
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, sort_keys=True)}\n\n".encode()
+
+
+def retry(interval=None):
+    """How long EventSource waits before reconnecting, by default one publishing round."""
+    return b'retry: %d\n\n' % ((interval or settings.STREAM_INTERVAL) * 1000)
+
+
+def stream_url(request):
+    """The URL pages should open an EventSource on, or None when not served over ASGI."""
+    return reverse('market_stream') if isinstance(request, ASGIRequest) else None
+
+
+def mark_to_market(trades, prices):
+    """
+    Unrealised PnL of open trades, given as Trade.values() rows, at `prices`
+    ({symbol: price}). Trades without a price are left out. Returns
+    {user_id: [update, ...]}.
+    """
+    updates = defaultdict(list)
+    for trade in trades:
+        price = prices.get(trade['symbol'].upper())
+        if price is None:
+            continue
+        pnl, pnl_percent = Trade.compute_pnl(
+            trade['trade_type'], trade['mode'], trade['leverage'], trade['size'], trade['entry_price'], price,
+        )
+        updates[trade['user_id']].append({
+            'id': trade['id'],
+            'symbol': trade['symbol'],
+            'price': price,
+            'pnl': round(pnl, 2),
+            'pnl_percent': round(pnl_percent, 2),
+        })
+    return updates
+
+
+def load_snapshot(user_ids):
+    """Open trades of `user_ids` and the prices they need, in one query and one price lookup."""
+    trades = list(
+        Trade.objects
+        .filter(user_id__in=user_ids, status='open')
+        .values('id', 'user_id', 'symbol', 'trade_type', 'mode', 'leverage', 'size', 'entry_price')
+    )
+    symbols = set(settings.STREAM_SYMBOLS) | {t['symbol'].upper() for t in trades}
+    try:
+        quotes = get_quotes(symbols)
+    except PricingError:
+        quotes = {}
+    return trades, {symbol: quote['price'] for symbol, quote in quotes.items()}
+
+
+class Subscription:
+    def __init__(self, user_id, size=10):
+        self.user_id = user_id
+        self.queue = asyncio.Queue(maxsize=size)
+
+    def put(self, event):
+        # A client that stops reading only misses old events; it never holds up the others
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+    async def get(self):
+        return await self.queue.get()
+
+
+class Publisher:
+    def __init__(self, interval=5):
+        self.interval = interval
+        self.subscriptions = set()
+        self._task = None
+
+    def subscribe(self, user_id):
+        subscription = Subscription(user_id)
+        self.subscriptions.add(subscription)
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self.run())
+        return subscription
+
+    def unsubscribe(self, subscription):
+        self.subscriptions.discard(subscription)
+
+    async def run(self):
+        while self.subscriptions:
+            try:
+                await self.publish()
+            except Exception:
+                pass  # clients keep their connection and get the next round
+            await asyncio.sleep(self.interval)
+
+    async def publish(self):
+        subscriptions = list(self.subscriptions)
+        if not subscriptions:
+            return
+        trades, prices = await sync_to_async(load_snapshot)({s.user_id for s in subscriptions})
+
+        prices_event = sse('prices', prices)
+        pnl_events = {user_id: sse('pnl', updates) for user_id, updates in mark_to_market(trades, prices).items()}
+        for subscription in subscriptions:
+            subscription.put(prices_event)
+            if subscription.user_id in pnl_events:
+                subscription.put(pnl_events[subscription.user_id])
+
+
+_publisher = None
+
+
+def get_publisher():
+    global _publisher
+    if _publisher is None:
+        _publisher = Publisher(interval=settings.STREAM_INTERVAL)
+    return _publisher
+
+
+@receiver(setting_changed)
+def reset_publisher(setting, **kwargs):
+    global _publisher
+    if setting.startswith('STREAM_'):
+        _publisher = None
@@ -0,0 +1,145 @@
+"""
+Delivery of the admin alerts queued by account.utils.telegram().
+
+Views only write TelegramMessage rows; the send_telegram worker drains them
+through the transport named by settings.TELEGRAM_TRANSPORT.
+"""
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from account.models import TelegramMessage
+
+MAX_MESSAGE_LENGTH = 4096  # Telegram's limit for one sendMessage
+MAX_ATTEMPTS = 8
+BACKOFF_BASE = 30  # seconds, doubled after every failed attempt
+BACKOFF_MAX = 3600
+CLAIM_TIMEOUT = timedelta(minutes=5)  # a crashed worker's batch is retried after this
+
+
+class TransportError(Exception):
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class BotApiTransport:
+    """Sends through the Telegram Bot API, reusing one keep-alive session."""
+    timeout = 10
+
+    def __init__(self):
+        self.token = settings.TELEGRAM_BOT_TOKEN
+        self.session = requests.Session()
+
+    def send(self, chat_id, text):
+        url = f"https://api.telegram.org/bot{self.token}/sendMessage"
+        try:
+            response = self.session.post(url, data={'chat_id': chat_id, 'text': text}, timeout=self.timeout)
+        except requests.RequestException as e:
+            raise TransportError(str(e).replace(self.token, '<token>')) from e
+
+        if response.status_code == 429:
+            raise TransportError("Rate limited by Telegram", retry_after=self.retry_after(response))
+        if not response.ok:
+            raise TransportError(f"Telegram returned {response.status_code}: {response.text[:200]}")
+
+    @staticmethod
+    def retry_after(response):
+        """
+        Seconds to wait after a 429, from the API's JSON body or else the
+        Retry-After header. None (use the default backoff) when neither says,
+        e.g. for a proxy's HTML error page.
+        """
+        try:
+            return int(response.json()['parameters']['retry_after'])
+        except (ValueError, TypeError, KeyError):
+            pass
+        try:
+            return int(response.headers['Retry-After'])
+        except (ValueError, KeyError):
+            return None
+
+
+class LocMemTransport:
+    """Collects messages in LocMemTransport.outbox instead of sending them, for tests."""
+    outbox = []
+
+    def send(self, chat_id, text):
+        self.outbox.append((chat_id, text))
+
+
+def get_transport():
+    return import_string(settings.TELEGRAM_TRANSPORT)()
+
+
+def backoff(attempts):
+    return timedelta(seconds=min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX))
+
+
+def coalesce(messages):
+    """Join consecutive messages per chat into as few texts as the length limit allows."""
+    batches = {}
+    for message in messages:
+        chat_batches = batches.setdefault(message.chat_id, [[]])
+        batch = chat_batches[-1]
+        length = sum(len(m.text) + 2 for m in batch) + len(message.text)
+        if batch and length > MAX_MESSAGE_LENGTH:
+            batch = []
+            chat_batches.append(batch)
+        batch.append(message)
+
+    for chat_id, chat_batches in batches.items():
+        for batch in chat_batches:
+            yield chat_id, batch
+
+
+def send_outbox(transport=None, batch_size=100):
+    """
+    Deliver due messages and return how many were sent.
+
+    Messages are claimed by pushing next_attempt_at past CLAIM_TIMEOUT, so the
+    network calls happen outside any transaction and several workers can run.
+    Failures are retried with exponential backoff until MAX_ATTEMPTS.
+    """
+    transport = transport or get_transport()
+    now = timezone.now()
+
+    with transaction.atomic():
+        due = TelegramMessage.objects.filter(status='pending', next_attempt_at__lte=now).order_by('pk')
+        if connection.features.has_select_for_update_skip_locked:
+            due = due.select_for_update(skip_locked=True)
+
+        messages = list(due[:batch_size])
+        TelegramMessage.objects.filter(pk__in=[m.pk for m in messages]).update(next_attempt_at=now + CLAIM_TIMEOUT)
+
+    sent = 0
+    for chat_id, batch in coalesce(messages):
+        try:
+            transport.send(chat_id, "\n\n".join(m.text for m in batch))
+        except Exception as e:
+            # Anything else (a bad payload, a bug) still counts as an attempt, so
+            # the batch is released with backoff instead of waiting out its claim
+            failed_at = timezone.now()
+            retry_after = e.retry_after if isinstance(e, TransportError) else None
+            for message in batch:
+                message.attempts += 1
+                message.last_error = str(e) if isinstance(e, TransportError) else f"{type(e).__name__}: {e}"
+                if message.attempts >= MAX_ATTEMPTS:
+                    message.status = 'failed'
+                else:
+                    delay = max(backoff(message.attempts), timedelta(seconds=retry_after or 0))
+                    message.next_attempt_at = failed_at + delay
+            TelegramMessage.objects.bulk_update(batch, ['attempts', 'last_error', 'status', 'next_attempt_at'])
+        else:
+            for message in batch:
+                message.attempts += 1
+                message.status = 'sent'
+                message.sent_on = timezone.now()
+            TelegramMessage.objects.bulk_update(batch, ['attempts', 'status', 'sent_on'])
+            sent += len(batch)
+
+    return sent
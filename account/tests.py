@@ -1,3 +1,1496 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import json
+import os
+import smtplib
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+import requests
+
+from django.contrib.auth.models import Group
+from django.contrib.sessions.models import Session
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail.backends.locmem import EmailBackend as LocMemBackend
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Sum
+from django.template import Context, Template
+from django.test.utils import CaptureQueriesContext
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
+
+from account import candles, wallets
+from account.candles import ingest, prune, synthetic_ticks
+from account.context_processors import global_config, lazy_value, notifications_processor
+from account.models import AdminNotification, BalanceSnapshot, CandleBlock, Config, Currency, DailySequence, Deposit, KYCVerification, LedgerEntry, Notification, NotificationJob, PaymentGateway, PnlRollup, QueuedEmail, TelegramMessage, Trade, Trader, User, UserPaymentMethod, Wallet, Withdraw
+from account.ledger import ledger
+from account.mail import MAX_ATTEMPTS as MAIL_MAX_ATTEMPTS, send_queued_mail
+from account.middleware.dynamic_timeout import SESSION_REFRESHED_KEY
+from account.pricing import FixtureProvider, PriceService, PricingError
+from account.session_backend import SessionStore
+from account.streaming import Publisher, Subscription, get_publisher, mark_to_market, sse
+from account.telegram import CLAIM_TIMEOUT, MAX_ATTEMPTS, BotApiTransport, LocMemTransport, TransportError, send_outbox
+from account.utils import add_notification, close_expired_trades, get_24hr_pnl_and_percentage, get_config, get_notification_feed, get_pnl_summary, get_unread_notification_count, get_user_roles, queue_mail, revalue_open_trades, run_notification_jobs, telegram
+from utils.staticfiles import PrecompressedStaticFiles
+from utils.testing import in_other_worker, queries_per_template, shared_caches
+
+
+class ConfigCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.config = Config.objects.create(platform_name='Norvia')
+
+    def test_config_is_loaded_once_per_version(self):
+        get_config()
+        with self.assertNumQueries(0):
+            self.assertEqual(get_config().platform_name, 'Norvia')
+
+    @shared_caches()
+    def test_invalidation_reaches_other_workers(self):
+        get_config()
+        Config.objects.filter(pk=self.config.pk).update(platform_name='Renamed')
+
+        in_other_worker("from account.utils import invalidate_config\ninvalidate_config()")
+        with self.assertNumQueries(1):
+            self.assertEqual(get_config().platform_name, 'Renamed')
+
+
+class AllowedUsersTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        Config.objects.create(platform_name='Norvia')
+        self.user = User.objects.create_user(username='alice', password='pass', first_name='A', last_name='B')
+        self.user.groups.add(Group.objects.create(name='trader'))
+        self.client.force_login(self.user)
+
+    def test_roles_resolved_once_per_request(self):
+        request = RequestFactory().get('/')
+        request.user = self.user
+
+        with self.assertNumQueries(1):
+            get_user_roles(request)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_user_roles(request), {'trader'})
+
+    def test_roles_invalidated_when_groups_change(self):
+        request = RequestFactory().get('/')
+        request.user = self.user
+        get_user_roles(request)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.user.groups.add(Group.objects.create(name='admin'))
+
+        # Not before the commit, or another worker could cache the old groups again
+        request = RequestFactory().get('/')
+        request.user = self.user
+        self.assertEqual(get_user_roles(request), {'trader'})
+
+        for callback in callbacks:
+            callback()
+        request = RequestFactory().get('/')
+        request.user = self.user
+        self.assertEqual(get_user_roles(request), {'trader', 'admin'})
+
+    @shared_caches()
+    def test_revoked_role_is_seen_by_other_workers(self):
+        self.assertTemplateUsed(self.client.get(reverse('referrals')), 'account/referrals.html')
+
+        # The worker that handled the revocation invalidates; this one must not keep authorizing
+        User.groups.through.objects.filter(user=self.user).delete()
+        in_other_worker(f"from account.utils import invalidate_user_roles\ninvalidate_user_roles([{self.user.pk}])")
+
+        self.assertTemplateUsed(self.client.get(reverse('referrals')), 'account/404.html')
+
+    def test_protected_view_query_count(self):
+        url = reverse('referrals')
+        self.client.get(url)
+
+        # just the user; the session, roles, config and notifications come
+        # from the cache and the session expiry is not rewritten
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        self.assertTemplateUsed(response, 'account/referrals.html')
+
+    def test_protected_view_rejects_other_roles(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.groups.clear()
+
+        response = self.client.get(reverse('referrals'))
+        self.assertTemplateUsed(response, 'account/404.html')
+
+
+class CloseExpiredTradesTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='bob', password='pass', first_name='B', last_name='C')
+
+    def open_trade(self, minutes_ago, duration, **kwargs):
+        fields = dict(
+            user=self.user, trade_type='buy', symbol='BTC', size=2,
+            entry_price=100, current_price=110, duration=duration,
+            opened_at=timezone.now() - timedelta(minutes=minutes_ago),
+        )
+        fields.update(kwargs)
+        return Trade.objects.create(**fields)
+
+    def test_closes_only_expired_trades(self):
+        expired = self.open_trade(minutes_ago=10, duration=5)
+        running = self.open_trade(minutes_ago=1, duration=5)
+
+        self.assertEqual(close_expired_trades(), 1)
+
+        expired.refresh_from_db()
+        running.refresh_from_db()
+        self.assertEqual(expired.status, 'closed')
+        self.assertIsNotNone(expired.closed_at)
+        self.assertEqual(running.status, 'open')
+
+    def test_edited_duration_moves_the_expiry(self):
+        trade = self.open_trade(minutes_ago=10, duration=60)
+        trade.duration = 5
+        trade.save(update_fields=['duration'])
+
+        self.assertEqual(close_expired_trades(), 1)
+
+        trade = self.open_trade(minutes_ago=10, duration=5)
+        trade.opened_at = timezone.now()
+        trade.save()
+        self.assertEqual(close_expired_trades(), 0)
+
+    def test_pnl_matches_close_trade(self):
+        long = self.open_trade(minutes_ago=10, duration=5)
+        short = self.open_trade(minutes_ago=10, duration=5, trade_type='sell')
+        close_expired_trades(batch_size=1)
+
+        long.refresh_from_db()
+        short.refresh_from_db()
+        self.assertAlmostEqual(long.pnl, 20)
+        self.assertAlmostEqual(long.pnl_percent, 10)
+        self.assertAlmostEqual(short.pnl, -20)
+        self.assertAlmostEqual(short.pnl_percent, -10)
+
+
+class Pnl24hTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='carol', password='pass', first_name='C', last_name='D')
+
+    def closed_trade(self, hours_ago, pnl):
+        closed_at = timezone.now() - timedelta(hours=hours_ago)
+        return Trade.objects.create(
+            user=self.user, trade_type='buy', symbol='BTC', size=1, status='closed',
+            pnl=pnl, opened_at=closed_at, closed_at=closed_at,
+        )
+
+    def test_both_windows_in_one_query(self):
+        self.closed_trade(hours_ago=1, pnl=30)
+        self.closed_trade(hours_ago=30, pnl=20)
+        self.closed_trade(hours_ago=50, pnl=999)
+
+        with self.assertNumQueries(1):
+            pnl, change = get_24hr_pnl_and_percentage(self.user, use_cache=False)
+        self.assertEqual(pnl, 30)
+        self.assertEqual(change, 50)
+
+    def test_cache_follows_latest_closed_trade(self):
+        self.closed_trade(hours_ago=1, pnl=10)
+        self.assertEqual(get_24hr_pnl_and_percentage(self.user)[0], 10)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(get_24hr_pnl_and_percentage(self.user)[0], 10)
+
+        self.closed_trade(hours_ago=0, pnl=5)
+        self.assertEqual(get_24hr_pnl_and_percentage(self.user)[0], 15)
+
+
+class PnlRollupTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='dave', password='pass', first_name='D', last_name='E')
+
+    def open_trade(self, asset='crypto', current_price=110):
+        return Trade.objects.create(
+            user=self.user, trade_type='buy', symbol='BTC', size=1, entry_price=100,
+            current_price=current_price, duration=1, asset=asset,
+            opened_at=timezone.now() - timedelta(minutes=5),
+        )
+
+    def test_closing_trades_updates_rollups(self):
+        self.open_trade().close_trade()
+        self.open_trade(current_price=95)
+        self.open_trade(asset='stock', current_price=130)
+        close_expired_trades()
+
+        summary = get_pnl_summary(self.user)
+        self.assertAlmostEqual(summary['pnl_7d'], 35)
+        self.assertAlmostEqual(summary['pnl_all'], 35)
+        self.assertEqual({a['asset']: a['pnl_all'] for a in summary['assets']}, {'crypto': 5, 'stock': 30})
+        self.assertEqual(PnlRollup.objects.get(resolution='day', asset='crypto').trades, 2)
+
+    def test_closing_twice_counts_once(self):
+        trade = self.open_trade()
+        trade.close_trade()
+        trade.close_trade()
+
+        self.assertEqual(PnlRollup.objects.get(resolution='hour').trades, 1)
+
+    def test_dashboard_and_reports_show_the_summary(self):
+        cache.clear()
+        Config.objects.create(platform_name='Norvia')
+        self.open_trade(asset='stock', current_price=130).close_trade()
+        self.user.groups.add(Group.objects.create(name='trader'), Group.objects.create(name='admin'))
+        self.client.force_login(self.user)
+
+        # 24h, 7d, 30d and all time
+        self.assertContains(self.client.get(reverse('home')), '+$30.00', count=4)
+
+        response = self.client.get(reverse('admin_reports'))
+        self.assertContains(response, 'STOCK')
+        self.assertContains(response, '$30.00', count=6)
+
+    def test_rebuild_matches_incremental(self):
+        for price in (90, 120, 105):
+            self.open_trade(current_price=price)
+        close_expired_trades()
+        incremental = sorted(PnlRollup.objects.values_list('resolution', 'asset', 'bucket', 'pnl', 'trades'))
+
+        call_command('rebuild_pnl_rollups', stdout=StringIO())
+
+        self.assertEqual(sorted(PnlRollup.objects.values_list('resolution', 'asset', 'bucket', 'pnl', 'trades')), incremental)
+
+
+class TransactionNoTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice', password='pass', first_name='A', last_name='B')
+
+    def test_numbers_are_sequential_per_kind(self):
+        today = timezone.now().strftime('%Y%m%d')
+
+        deposits = [Deposit.objects.create(user=self.user, amount=10) for _ in range(3)]
+        withdraw = Withdraw.objects.create(user=self.user, amount=5)
+
+        self.assertEqual([d.transaction_no for d in deposits], [f"{today}{n:04d}" for n in (1, 2, 3)])
+        self.assertEqual(withdraw.transaction_no, f"{today}0001")
+
+    def test_failed_insert_does_not_burn_a_number(self):
+        first = Deposit.objects.create(user=self.user, amount=10)
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Deposit.objects.create(user=None, amount=10)
+
+        second = Deposit.objects.create(user=self.user, amount=10)
+        self.assertEqual(int(second.transaction_no[8:]), int(first.transaction_no[8:]) + 1)
+
+
+class TransactionNoConcurrencyTests(TransactionTestCase):
+    threads = 8
+    per_thread = 10
+
+    def create_deposits(self, user, errors):
+        try:
+            for _ in range(self.per_thread):
+                Deposit.objects.create(user=user, amount=10)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            connection.close()
+
+    def run_threads(self):
+        user = User.objects.create_user(username='alice', password='pass', first_name='A', last_name='B')
+        errors = []
+        threads = [threading.Thread(target=self.create_deposits, args=(user, errors)) for _ in range(self.threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        return sorted(int(no[8:]) for no in Deposit.objects.values_list('transaction_no', flat=True))
+
+    def test_concurrent_deposits_get_unique_gap_free_numbers(self):
+        self.assertEqual(self.run_threads(), list(range(1, self.threads * self.per_thread + 1)))
+
+    @override_settings(TRANSACTION_NO_BLOCK_SIZE=5)
+    def test_concurrent_deposits_with_blocks_are_unique(self):
+        DailySequence._blocks = {}
+        serials = self.run_threads()
+        self.assertEqual(len(set(serials)), self.threads * self.per_thread)
+
+    @override_settings(TRANSACTION_NO_BLOCK_SIZE=10)
+    def test_blocks_reserve_once_per_block(self):
+        # outside a transaction, so a whole block is reserved per round trip
+        DailySequence._blocks = {}
+        today = timezone.now().date()
+
+        values = [DailySequence.next_value('deposit', today) for _ in range(12)]
+
+        self.assertEqual(values, list(range(1, 13)))
+        self.assertEqual(DailySequence.objects.get(name='deposit', day=today).last_value, 20)
+
+
+class FailingTransport:
+    def send(self, chat_id, text):
+        raise TransportError("unreachable")
+
+
+@override_settings(TELEGRAM_CHAT_IDS=['1', '2'], TELEGRAM_TRANSPORT='account.telegram.LocMemTransport')
+class TelegramOutboxTests(TestCase):
+    def setUp(self):
+        LocMemTransport.outbox = []
+
+    def test_telegram_only_queues(self):
+        with self.assertNumQueries(1):
+            telegram("Deposit submitted")
+
+        self.assertEqual(TelegramMessage.objects.filter(status='pending').count(), 2)
+        self.assertEqual(LocMemTransport.outbox, [])
+
+    def test_burst_is_sent_as_one_message_per_chat(self):
+        for n in range(3):
+            telegram(f"alert {n}")
+
+        self.assertEqual(send_outbox(), 6)
+        self.assertEqual(sorted(LocMemTransport.outbox), [
+            ('1', "alert 0\n\nalert 1\n\nalert 2"),
+            ('2', "alert 0\n\nalert 1\n\nalert 2"),
+        ])
+        self.assertFalse(TelegramMessage.objects.exclude(status='sent').exists())
+        self.assertEqual(send_outbox(), 0)
+
+    def test_failures_back_off_then_give_up(self):
+        telegram("alert")
+
+        self.assertEqual(send_outbox(FailingTransport()), 0)
+        message = TelegramMessage.objects.first()
+        self.assertEqual((message.status, message.attempts, message.last_error), ('pending', 1, "unreachable"))
+        self.assertGreater(message.next_attempt_at, timezone.now())
+
+        # not due yet
+        self.assertEqual(send_outbox(), 0)
+
+        TelegramMessage.objects.update(attempts=MAX_ATTEMPTS - 1, next_attempt_at=timezone.now())
+        send_outbox(FailingTransport())
+        self.assertEqual(set(TelegramMessage.objects.values_list('status', flat=True)), {'failed'})
+
+
+    def test_unexpected_errors_count_as_attempts(self):
+        telegram("alert")
+        transport = mock.Mock(**{'send.side_effect': KeyError('result')})
+
+        self.assertEqual(send_outbox(transport), 0)
+
+        message = TelegramMessage.objects.first()
+        self.assertEqual((message.status, message.attempts, message.last_error), ('pending', 1, "KeyError: 'result'"))
+        self.assertLess(message.next_attempt_at, timezone.now() + CLAIM_TIMEOUT)
+
+    def test_rate_limit_delay_from_body_header_or_default(self):
+        transport = BotApiTransport()
+        cases = (
+            (b'{"ok": false, "parameters": {"retry_after": 7}}', {}, 7),
+            (b'<html>Too Many Requests</html>', {'Retry-After': '12'}, 12),
+            (b'<html>Too Many Requests</html>', {}, None),
+        )
+        for body, headers, retry_after in cases:
+            response = requests.Response()
+            response.status_code, response._content = 429, body
+            response.headers.update(headers)
+
+            with self.subTest(body=body, headers=headers), mock.patch.object(transport.session, 'post', return_value=response):
+                with self.assertRaises(TransportError) as raised:
+                    transport.send('1', "alert")
+                self.assertEqual(raised.exception.retry_after, retry_after)
+
+
+class FlakyBackend(LocMemBackend):
+    """Locmem backend that refuses some recipients and drops the connection on others."""
+    refused = set()
+    down = set()
+
+    def send_messages(self, messages):
+        for message in messages:
+            if set(message.to) & self.refused:
+                raise smtplib.SMTPRecipientsRefused({message.to[0]: (550, b"No such user")})
+            if set(message.to) & self.down:
+                raise smtplib.SMTPServerDisconnected("Connection unexpectedly closed")
+        return super().send_messages(messages)
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class MailQueueTests(TestCase):
+    def test_queue_mail_does_not_send(self):
+        with self.assertNumQueries(1):
+            queue_mail("Subject", "Body", None, ['a@example.com', 'b@example.com'])
+
+        self.assertEqual(QueuedEmail.objects.filter(status='pending').count(), 2)
+        self.assertEqual(mail.outbox, [])
+
+    def test_worker_sends_batch(self):
+        for n in range(5):
+            queue_mail("Subject", "Body", None, [f'user{n}@example.com'], html_message="<p>Body</p>")
+        connection = FlakyBackend()
+
+        self.assertEqual(send_queued_mail(connection), 5)
+
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(mail.outbox[0].alternatives[0][1], "text/html")
+        self.assertFalse(QueuedEmail.objects.exclude(status='sent').exists())
+        self.assertEqual(send_queued_mail(connection), 0)
+
+    def test_failures_are_retried_per_recipient_and_dead_lettered(self):
+        queue_mail("Subject", "Body", None, ['ok@example.com', 'gone@example.com', 'flaky@example.com'])
+        FlakyBackend.refused, FlakyBackend.down = {'gone@example.com'}, {'flaky@example.com'}
+        self.addCleanup(setattr, FlakyBackend, 'refused', set())
+        self.addCleanup(setattr, FlakyBackend, 'down', set())
+
+        self.assertEqual(send_queued_mail(FlakyBackend()), 1)
+
+        statuses = dict(QueuedEmail.objects.values_list('to', 'status'))
+        self.assertEqual(statuses, {'ok@example.com': 'sent', 'gone@example.com': 'dead', 'flaky@example.com': 'pending'})
+        flaky = QueuedEmail.objects.get(to='flaky@example.com')
+        self.assertGreater(flaky.next_attempt_at, timezone.now())
+
+        QueuedEmail.objects.filter(pk=flaky.pk).update(attempts=MAIL_MAX_ATTEMPTS - 1, next_attempt_at=timezone.now())
+        send_queued_mail(FlakyBackend())
+        self.assertEqual(QueuedEmail.objects.get(pk=flaky.pk).status, 'dead')
+
+
+class SendNotificationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        Config.objects.create(platform_name='Norvia')
+        trader = Group.objects.create(name='trader')
+        self.users = [
+            User.objects.create_user(username=f'user{n}', password='pass', first_name='A', last_name='B')
+            for n in range(4)
+        ]
+        for n, user in enumerate(self.users):
+            user.groups.add(trader)
+            KYCVerification.objects.create(user=user, first_name='A', last_name='B', status='pending' if n < 3 else 'approved')
+
+        admin = User.objects.create_user(username='admin', password='pass', first_name='A', last_name='B')
+        admin.groups.add(Group.objects.create(name='admin'))
+        self.client.force_login(admin)
+
+    def send(self, recipient_type):
+        return self.client.post(reverse('admin_notifications'), {
+            'notification_title': 'Maintenance',
+            'notification_message': 'Tonight',
+            'recipient_type': recipient_type,
+            'notification_icon': 'campaign',
+            'notification_color': 'info',
+        })
+
+    def test_all_traders_is_one_broadcast_row(self):
+        self.send('all')
+
+        self.assertEqual(AdminNotification.objects.count(), 1)
+        for user in self.users:
+            self.assertEqual(AdminNotification.for_user(user).count(), 1)
+        # Only traders are in the audience, as the form and the sent count say
+        self.assertFalse(AdminNotification.for_user(User.objects.get(username='admin')).exists())
+
+    def test_dismissing_a_broadcast_only_hides_it_for_that_user(self):
+        self.send('all')
+        notification = AdminNotification.objects.get()
+
+        self.client.force_login(self.users[0])
+        self.client.post(reverse('dismiss_notification', args=[notification.pk]))
+
+        self.assertFalse(AdminNotification.for_user(self.users[0]).exists())
+        self.assertTrue(AdminNotification.for_user(self.users[1]).exists())
+
+    def test_small_segment_is_sent_inline(self):
+        self.send('kyc_pending')
+
+        self.assertEqual(
+            sorted(AdminNotification.objects.values_list('user__username', flat=True)),
+            ['user0', 'user1', 'user2'],
+        )
+        self.assertEqual(NotificationJob.objects.get().status, 'done')
+
+    def test_large_segment_is_queued_and_resumes(self):
+        with mock.patch('manager.views.NOTIFICATION_INLINE_LIMIT', 1):
+            self.send('kyc_pending')
+
+        job = NotificationJob.objects.get()
+        self.assertEqual((job.status, job.total), ('pending', 3))
+        self.assertFalse(AdminNotification.objects.exists())
+
+        # a worker that stopped after the first user
+        AdminNotification.objects.create(user=self.users[0], title=job.title, message=job.message)
+        NotificationJob.objects.filter(pk=job.pk).update(sent=1, last_user_id=self.users[0].pk)
+
+        self.assertEqual(run_notification_jobs(chunk_size=1), 1)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.sent, job.progress), ('done', 3, 100))
+        self.assertEqual(AdminNotification.objects.count(), 3)
+        self.assertEqual(run_notification_jobs(), 0)
+        self.assertContains(self.client.get(reverse('admin_notifications')), "3 of 3 users (100%)")
+
+
+class SessionTimeoutTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        Config.objects.create(platform_name='Norvia')
+        self.user = User.objects.create_user(username='alice', password='pass', first_name='A', last_name='B')
+        self.user.groups.add(Group.objects.create(name='trader'))
+        self.client.force_login(self.user)
+
+    def test_expiry_refreshed_only_below_threshold(self):
+        url = reverse('referrals')
+        self.client.get(url)
+        refreshed = self.client.session[SESSION_REFRESHED_KEY]
+
+        with mock.patch('account.middleware.dynamic_timeout.time.time', return_value=refreshed + 3000):
+            self.client.get(url)
+        self.assertEqual(self.client.session[SESSION_REFRESHED_KEY], refreshed)
+
+        # default timeout is 7200s and the threshold half of it
+        with mock.patch('account.middleware.dynamic_timeout.time.time', return_value=refreshed + 4000):
+            self.client.get(url)
+        self.assertEqual(self.client.session[SESSION_REFRESHED_KEY], refreshed + 4000)
+
+
+class SessionBackendTests(TestCase):
+    def setUp(self):
+        self.session = SessionStore()
+        self.session['step'] = 1
+        self.session.create()
+
+    def test_saves_within_interval_only_touch_the_cache(self):
+        for step in range(2, 10):
+            self.session['step'] = step
+            with self.assertNumQueries(0):
+                self.session.save()
+
+        self.assertEqual(SessionStore(self.session.session_key)['step'], 9)
+        self.assertEqual(Session.objects.get().get_decoded()['step'], 1)
+
+    def test_writes_back_once_interval_has_passed(self):
+        self.session['step'] = 2
+        with mock.patch('account.session_backend.time.time', return_value=time.time() + 301):
+            self.session.save()
+
+        self.assertEqual(Session.objects.get().get_decoded()['step'], 2)
+
+    def test_write_back_recreates_a_cleared_row(self):
+        Session.objects.all().delete()
+
+        self.session['step'] = 2
+        with mock.patch('account.session_backend.time.time', return_value=time.time() + 301):
+            self.session.save()
+
+        self.assertEqual(Session.objects.get().get_decoded()['step'], 2)
+
+    def test_clear_expired_in_batches(self):
+        Session.objects.bulk_create(
+            Session(session_key=f'expired{n}', session_data='', expire_date=timezone.now() - timedelta(days=1))
+            for n in range(5)
+        )
+
+        with mock.patch.object(SessionStore, 'clear_expired_batch_size', 2):
+            SessionStore.clear_expired()
+
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), [self.session.session_key])
+
+
+class CountingProvider:
+    """Returns price 100 + the number of calls so far, optionally after a delay."""
+    def __init__(self, delay=0, fail=False, unknown=()):
+        self.calls = []
+        self.delay = delay
+        self.fail = fail
+        self.unknown = unknown
+
+    def fetch(self, symbols):
+        self.calls.append(sorted(symbols))
+        time.sleep(self.delay)
+        if self.fail:
+            raise PricingError("upstream down")
+        return {s: {'symbol': s, 'price': 100.0 + len(self.calls)} for s in symbols if s not in self.unknown}
+
+
+class PriceServiceTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_quotes_are_cached_for_the_ttl(self):
+        provider = CountingProvider()
+        service = PriceService(provider, ttl=60)
+
+        self.assertEqual(service.get_price('btc'), 101.0)
+        self.assertEqual(service.get_price('BTC'), 101.0)
+        self.assertEqual(provider.calls, [['BTC']])
+
+    def test_misses_are_fetched_in_one_batch(self):
+        provider = CountingProvider()
+        service = PriceService(provider, ttl=60)
+        service.get_price('BTC')
+
+        quotes = service.get_quotes(['BTC', 'ETH', 'SOL'])
+
+        self.assertEqual(set(quotes), {'BTC', 'ETH', 'SOL'})
+        self.assertEqual(provider.calls, [['BTC'], ['ETH', 'SOL']])
+
+    def test_unknown_symbols_are_cached_as_misses(self):
+        provider = CountingProvider(unknown={'NOPE'})
+        service = PriceService(provider, ttl=60)
+
+        self.assertEqual(set(service.get_quotes(['BTC', 'NOPE'])), {'BTC'})
+        with self.assertRaises(PricingError):
+            service.get_price('NOPE')
+        self.assertEqual(provider.calls, [['BTC', 'NOPE']])
+
+    def test_concurrent_misses_share_one_upstream_call(self):
+        provider = CountingProvider(delay=0.2)
+        service = PriceService(provider, ttl=60)
+        prices = []
+
+        threads = [threading.Thread(target=lambda: prices.append(service.get_price('BTC'))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(provider.calls, [['BTC']])
+        self.assertEqual(prices, [101.0] * 8)
+
+    def test_stale_quotes_are_served_while_refreshing(self):
+        provider = CountingProvider()
+        service = PriceService(provider, ttl=10, stale_ttl=300)
+        service.get_price('BTC')
+
+        with mock.patch('account.pricing.time.time', return_value=time.time() + 30):
+            self.assertEqual(service.get_price('BTC'), 101.0)
+
+        # the refresh runs in the background
+        for _ in range(100):
+            if service.get_price('BTC') == 102.0:
+                break
+            time.sleep(0.01)
+        self.assertEqual(service.get_price('BTC'), 102.0)
+        self.assertEqual(len(provider.calls), 2)
+
+    def test_stale_quotes_survive_upstream_failure(self):
+        service = PriceService(CountingProvider(), ttl=10)
+        service.get_price('BTC')
+
+        service.provider = CountingProvider(fail=True)
+        with mock.patch('account.pricing.time.time', return_value=time.time() + 30):
+            self.assertEqual(service.get_price('BTC'), 101.0)
+
+        with self.assertRaises(PricingError):
+            service.get_price('ETH')
+
+    @override_settings(PRICING_PROVIDER='account.pricing.FixtureProvider', PRICING_FIXTURES={'BTC': 50000, 'ETH': 2500})
+    def test_market_prices_endpoint(self):
+        FixtureProvider.calls = []
+        Config.objects.create(platform_name='Norvia')
+        user = User.objects.create_user(username='alice', password='pass', first_name='A', last_name='B')
+        self.client.force_login(user)
+
+        response = self.client.get(reverse('market_prices'), {'symbols': 'BTC,DOGE'})
+        self.assertEqual(response.json()['quotes'], [FixtureProvider().fetch(['BTC'])['BTC']])
+
+        response = self.client.get(reverse('market_prices'))
+        self.assertEqual([q['symbol'] for q in response.json()['quotes']], ['BTC', 'ETH'])
+
+
+
+class CandleTests(TestCase):
+    start = datetime(2024, 3, 1, tzinfo=dt_timezone.utc)
+
+    def test_ticks_make_ohlc_at_every_resolution(self):
+        ingest([
+            ('btc', self.start, 100),
+            ('BTC', self.start + timedelta(seconds=20), 105),
+            ('BTC', self.start + timedelta(seconds=40), 95),
+            ('BTC', self.start + timedelta(seconds=50), 98),
+            ('BTC', self.start + timedelta(minutes=30), 110),
+        ])
+        until = self.start + timedelta(hours=1)
+
+        minutes = candles.candles(candles.blocks_for('BTC', '1m', self.start, until), self.start, until)
+        self.assertEqual(minutes, [
+            [self.start.timestamp() * 1000, 100, 105, 95, 98],
+            [(self.start + timedelta(minutes=30)).timestamp() * 1000, 110, 110, 110, 110],
+        ])
+
+        hours = candles.candles(candles.blocks_for('BTC', '1h', self.start, until), self.start, until)
+        self.assertEqual(hours, [[self.start.timestamp() * 1000, 100, 110, 95, 110]])
+
+    def test_ingesting_in_batches_matches_one_pass(self):
+        ticks = list(synthetic_ticks('ETH', self.start, self.start + timedelta(hours=3), seed=1))
+        ingest(ticks[:300])
+        ingest(ticks[300:])
+        batched = {(b.resolution, b.start): candles.unpack(b.data) for b in CandleBlock.objects.all()}
+
+        CandleBlock.objects.all().delete()
+        ingest(ticks)
+        whole = {(b.resolution, b.start): candles.unpack(b.data) for b in CandleBlock.objects.all()}
+
+        self.assertEqual(len(whole), 3)
+        self.assertEqual(repr(batched), repr(whole))
+
+    def test_blocks_are_compact(self):
+        ingest(synthetic_ticks('BTC', self.start, self.start + timedelta(days=1), step=timedelta(minutes=1), seed=2))
+
+        block = CandleBlock.objects.get(resolution='1m')
+        self.assertLess(len(block.data), 1440 * 4 * 8)
+
+    @override_settings(CANDLE_RETENTION={'1m': 2, '1h': 120, '1d': None})
+    def test_prune_keeps_each_resolutions_retention(self):
+        ingest(synthetic_ticks('BTC', self.start, self.start + timedelta(days=10), step=timedelta(hours=1), seed=3))
+
+        prune(now=self.start + timedelta(days=10))
+
+        day_blocks = CandleBlock.objects.filter(resolution='1m').values_list('start', flat=True)
+        self.assertEqual(min(day_blocks), self.start + timedelta(days=7))
+        self.assertEqual(CandleBlock.objects.filter(resolution='1h').count(), 1)
+        self.assertEqual(CandleBlock.objects.filter(resolution='1d').count(), 1)
+
+    def test_candles_endpoint_uses_etags(self):
+        Config.objects.create(platform_name='Norvia')
+        user = User.objects.create_user(username='alice', password='pass', first_name='A', last_name='B')
+        self.client.force_login(user)
+        now = timezone.now()
+        start = now.replace(second=0, microsecond=0) - timedelta(hours=2)
+        ingest(synthetic_ticks('BTC', start, start + timedelta(hours=2), seed=4))
+
+        response = self.client.get(reverse('market_candles'), {'symbol': 'btc', 'days': 1})
+        self.assertEqual(response.json()['resolution'], '1m')
+        self.assertEqual(len(response.json()['candles']), 120)
+
+        response = self.client.get(reverse('market_candles'), {'symbol': 'btc', 'days': 1}, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+        etag = response['ETag']
+        ingest([('BTC', now, 1)])
+        response = self.client.get(reverse('market_candles'), {'symbol': 'btc', 'days': 1}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.get(reverse('market_candles'), {'symbol': 'btc', 'days': 365})
+        self.assertEqual(response.json()['resolution'], '1d')
+
+        response = self.client.get(reverse('market_candles'), {'symbol': 'btc', 'resolution': '5m'})
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(PRICING_PROVIDER='account.pricing.FixtureProvider', PRICING_FIXTURES={'BTC': 50000, 'ETH': 2500})
+    def test_ingest_command_records_provider_prices(self):
+        cache.clear()
+        call_command('ingest_candles', stdout=StringIO())
+
+        self.assertEqual(set(CandleBlock.objects.values_list('symbol', flat=True)), {'BTC', 'ETH'})
+        self.assertEqual(CandleBlock.objects.count(), 6)
+
+
+@override_settings(
+    PRICING_PROVIDER='account.pricing.FixtureProvider',
+    PRICING_FIXTURES={'BTC': 110, 'ETH': 2500},
+    STREAM_SYMBOLS=['ETH'],
+    STREAM_INTERVAL=0.05,
+)
+class MarketStreamTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Config.objects.create(platform_name='Norvia')
+        cls.alice = User.objects.create_user(username='alice', password='pass', first_name='A', last_name='B')
+        cls.alice.groups.add(Group.objects.create(name='trader'))
+        cls.bob = User.objects.create_user(username='bob', password='pass', first_name='B', last_name='C')
+        cls.trade = Trade.objects.create(user=cls.alice, trade_type='buy', symbol='btc', size=2, entry_price=100)
+        Trade.objects.create(user=cls.bob, trade_type='sell', symbol='btc', size=1, entry_price=100)
+        Trade.objects.create(user=cls.bob, trade_type='buy', symbol='btc', size=1, entry_price=100, status='closed')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_mark_to_market(self):
+        trades = [
+            {'id': 1, 'user_id': 1, 'symbol': 'btc', 'trade_type': 'buy', 'mode': 'spot', 'leverage': None, 'size': 2, 'entry_price': 100},
+            {'id': 2, 'user_id': 2, 'symbol': 'btc', 'trade_type': 'sell', 'mode': 'leverage', 'leverage': 5, 'size': 1, 'entry_price': 100},
+            {'id': 3, 'user_id': 2, 'symbol': 'doge', 'trade_type': 'buy', 'mode': 'spot', 'leverage': None, 'size': 1, 'entry_price': 1},
+        ]
+
+        updates = mark_to_market(trades, {'BTC': 110.0})
+
+        self.assertEqual(updates, {
+            1: [{'id': 1, 'symbol': 'btc', 'price': 110.0, 'pnl': 20.0, 'pnl_percent': 10.0}],
+            2: [{'id': 2, 'symbol': 'btc', 'price': 110.0, 'pnl': -50.0, 'pnl_percent': -50.0}],
+        })
+
+    async def test_one_publisher_serves_every_client(self):
+        publisher = Publisher(interval=0.05)
+        alice = publisher.subscribe(self.alice.pk)
+        bob = publisher.subscribe(self.bob.pk)
+        try:
+            events = [await asyncio.wait_for(s.get(), 5) for s in (alice, alice, bob, bob)]
+        finally:
+            publisher.unsubscribe(alice)
+            publisher.unsubscribe(bob)
+
+        self.assertEqual(events[0], sse('prices', {'BTC': 110.0, 'ETH': 2500.0}))
+        self.assertIs(events[0], events[2])  # encoded once for everyone
+        self.assertEqual(events[1], sse('pnl', [{'id': self.trade.pk, 'symbol': 'btc', 'price': 110.0, 'pnl': 20.0, 'pnl_percent': 10.0}]))
+        self.assertIn(b'"pnl": -10.0', events[3])
+
+    async def test_slow_clients_drop_old_events(self):
+        subscription = Subscription(self.alice.pk, size=2)
+        for event in (b'1', b'2', b'3'):
+            subscription.put(event)
+
+        self.assertEqual([await subscription.get(), await subscription.get()], [b'2', b'3'])
+
+    async def test_stream_under_asgi(self):
+        await self.async_client.aforce_login(self.alice)
+
+        response = await self.async_client.get(reverse('market_stream'))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        chunks = aiter(response.streaming_content)
+        self.assertEqual(await anext(chunks), b'retry: 50\n\n')
+        self.assertTrue((await asyncio.wait_for(anext(chunks), 5)).startswith(b'event: prices'))
+        self.assertTrue((await asyncio.wait_for(anext(chunks), 5)).startswith(b'event: pnl'))
+
+        # a client disconnecting cancels the task that is reading the stream
+        pending = asyncio.ensure_future(anext(chunks))
+        await asyncio.sleep(0)
+        pending.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await pending
+        self.assertEqual(get_publisher().subscriptions, set())
+
+    def test_snapshot_under_wsgi(self):
+        self.client.force_login(self.alice)
+
+        response = self.client.get(reverse('market_stream'))
+
+        body = b''.join(response.streaming_content)
+        # Come back when the page would have polled, not every STREAM_INTERVAL
+        self.assertTrue(body.startswith(b'retry: 60000\n\n'))
+        self.assertIn(b'event: prices', body)
+        self.assertIn(b'"pnl": 20.0', body)
+
+    def test_stream_requires_a_trader_role(self):
+        self.client.force_login(self.bob)
+
+        self.assertTemplateUsed(self.client.get(reverse('market_stream')), 'account/404.html')
+
+    async def test_pages_open_the_stream_under_asgi(self):
+        await self.async_client.aforce_login(self.alice)
+
+        response = await self.async_client.get(reverse('crypto_market'))
+        self.assertContains(response, f'"{reverse("market_stream")}"')
+
+    def test_pages_keep_polling_under_wsgi(self):
+        self.client.force_login(self.alice)
+
+        response = self.client.get(reverse('crypto_market'))
+        self.assertNotContains(response, f'"{reverse("market_stream")}"')
+
+
+class RevalueTradesTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice', password='pass', first_name='A', last_name='B')
+
+    def trade(self, **kwargs):
+        fields = {'user': self.user, 'trade_type': 'buy', 'symbol': 'btc', 'size': 2, 'entry_price': 100, 'current_price': 100}
+        fields.update(kwargs)
+        return Trade.objects.create(**fields)
+
+    def test_open_trades_are_marked_to_market(self):
+        long = self.trade()
+        short = self.trade(trade_type='sell', symbol='ETH', size=1)
+        leveraged = self.trade(mode='leverage', leverage=10)
+        unpriced = self.trade(symbol='DOGE')
+        closed = self.trade(status='closed', pnl=5)
+
+        self.assertEqual(revalue_open_trades({'BTC': 110, 'ETH': 90}, chunk_size=2), 3)
+
+        for trade, price, pnl, pnl_percent in (
+            (long, 110, 20, 10),
+            (short, 90, 10, 10),
+            (leveraged, 110, 200, 100),
+            (unpriced, 100, 0, 0),
+        ):
+            trade.refresh_from_db()
+            self.assertEqual(trade.current_price, price)
+            self.assertAlmostEqual(trade.pnl, pnl)
+            self.assertAlmostEqual(trade.pnl_percent, pnl_percent)
+        closed.refresh_from_db()
+        self.assertEqual((closed.current_price, closed.pnl), (100, 5))
+
+    def test_sql_and_python_pnl_agree(self):
+        trades = [
+            self.trade(trade_type=trade_type, mode=mode, leverage=leverage, size=size, entry_price=entry_price)
+            for trade_type in ('buy', 'sell')
+            for mode, leverage in (('spot', None), ('leverage', 3), ('leverage', None))
+            for size, entry_price in ((0.5, 80), (0, 100), (1, 0))
+        ]
+
+        revalue_open_trades({'BTC': 123.0})
+
+        for trade in trades:
+            trade.refresh_from_db()
+            pnl, pnl_percent = Trade.compute_pnl(trade.trade_type, trade.mode, trade.leverage, trade.size, trade.entry_price, 123.0)
+            self.assertAlmostEqual(trade.pnl, pnl)
+            self.assertAlmostEqual(trade.pnl_percent, pnl_percent)
+
+    @override_settings(PRICING_PROVIDER='account.pricing.FixtureProvider', PRICING_FIXTURES={'BTC': 150})
+    def test_command_uses_cached_prices(self):
+        cache.clear()
+        trade = self.trade()
+
+        call_command('revalue_trades', stdout=StringIO())
+
+        trade.refresh_from_db()
+        self.assertEqual((trade.current_price, trade.pnl), (150, 100))
+
+
+class DepositListTests(TestCase):
+    def setUp(self):
+        Config.objects.create(platform_name='Norvia')
+        admin = User.objects.create_user(username='admin', password='pass', first_name='A', last_name='B')
+        admin.groups.add(Group.objects.create(name='admin'))
+        self.client.force_login(admin)
+
+        self.alice = User.objects.create_user(username='alice', password='pass', first_name='Alice', last_name='B', email='alice@example.com')
+        self.bob = User.objects.create_user(username='bob', password='pass', first_name='Bob', last_name='C', email='bob@example.com')
+        self.gateway = PaymentGateway.objects.create(name='PayPal', email='pay@example.com')
+        now = timezone.now()
+        self.deposits = [
+            Deposit.objects.create(
+                user=self.alice if n % 2 else self.bob,
+                amount=10 * (n + 1),
+                grand_total=10 * (n + 1),
+                status=['pending', 'success', 'cancelled'][n % 3],
+                gateway=self.gateway if n % 2 else None,
+                # pairs share a timestamp, so ties are broken on id
+                date_created=now - timedelta(days=n // 2),
+            )
+            for n in range(7)
+        ]
+
+    def ids(self, response):
+        return [d.pk for d in response.context['deposits']]
+
+    def test_keyset_pages_walk_forward_and_back(self):
+        newest_first = [d.pk for d in sorted(self.deposits, key=lambda d: (d.date_created, d.pk), reverse=True)]
+
+        with mock.patch('manager.views.LIST_PAGE_SIZE', 3):
+            pages, response = [], self.client.get(reverse('admin_deposit_list'))
+            while True:
+                pages.append(self.ids(response))
+                page = response.context['deposits']
+                if not page.has_next:
+                    break
+                response = self.client.get(reverse('admin_deposit_list'), {'after': page.next_cursor})
+
+            self.assertEqual(pages, [newest_first[:3], newest_first[3:6], newest_first[6:]])
+
+            response = self.client.get(reverse('admin_deposit_list'), {'before': response.context['deposits'].previous_cursor})
+            self.assertEqual(self.ids(response), newest_first[3:6])
+
+    def test_query_count_does_not_grow_with_rows(self):
+        self.client.get(reverse('admin_deposit_list'))  # warm the config and role caches
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(reverse('admin_deposit_list'), {'status': 'pending'})
+        with CaptureQueriesContext(connection) as many:
+            self.client.get(reverse('admin_deposit_list'))
+
+        self.assertEqual(len(few), len(many))
+
+    def test_filters(self):
+        def ids(**params):
+            return set(self.ids(self.client.get(reverse('admin_deposit_list'), params)))
+
+        self.assertEqual(ids(status='failed'), {d.pk for d in self.deposits if d.status == 'cancelled'})
+        self.assertEqual(ids(method=self.gateway.pk), {d.pk for d in self.deposits if d.gateway})
+        self.assertEqual(ids(q='alice'), {d.pk for d in self.deposits if d.user == self.alice})
+        self.assertEqual(ids(q=self.deposits[4].transaction_no), {self.deposits[4].pk})
+        self.assertEqual(ids(period='today'), {d.pk for d in self.deposits[:2]})
+
+    def test_stats_are_one_aggregate(self):
+        response = self.client.get(reverse('admin_deposit_list'))
+
+        self.assertEqual(response.context['total_deposits'], 7)
+        self.assertEqual(response.context['total_amount_today'], 30)
+        self.assertEqual(response.context['pending_count'], 3)
+        self.assertEqual(response.context['completed_today'], 1)
+        self.assertEqual(response.context['failed_today'], 0)
+
+    def test_malformed_cursor_gives_first_page(self):
+        response = self.client.get(reverse('admin_deposit_list'), {'after': 'nonsense'})
+
+        self.assertEqual(len(self.ids(response)), 7)
+
+
+class WithdrawalListTests(TestCase):
+    def setUp(self):
+        Config.objects.create(platform_name='Norvia')
+        admin = User.objects.create_user(username='admin', password='pass', first_name='A', last_name='B')
+        admin.groups.add(Group.objects.create(name='admin'))
+        self.client.force_login(admin)
+
+        self.alice = User.objects.create_user(username='alice', password='pass', first_name='Alice', last_name='B')
+        now = timezone.now()
+        self.withdraws = [
+            Withdraw.objects.create(
+                user=self.alice if n % 2 else admin,
+                amount=5 * (n + 1),
+                currency='btc' if n % 2 else None,
+                gateway=None if n % 2 else 'paypal',
+                status=['pending', 'success', 'rejected'][n % 3],
+                date=now - timedelta(days=n // 2),
+            )
+            for n in range(7)
+        ]
+
+    def ids(self, **params):
+        return [w.pk for w in self.client.get(reverse('admin_withdrawal_list'), params).context['withdraws']]
+
+    def test_pages_filters_and_stats(self):
+        newest_first = [w.pk for w in sorted(self.withdraws, key=lambda w: (w.date, w.pk), reverse=True)]
+        with mock.patch('manager.views.LIST_PAGE_SIZE', 4):
+            response = self.client.get(reverse('admin_withdrawal_list'))
+            self.assertEqual(self.ids(), newest_first[:4])
+            self.assertEqual(self.ids(after=response.context['withdraws'].next_cursor), newest_first[4:])
+
+        self.assertEqual(set(self.ids(status='rejected')), {w.pk for w in self.withdraws if w.status == 'rejected'})
+        self.assertEqual(set(self.ids(method='btc')), {w.pk for w in self.withdraws if w.currency})
+        self.assertEqual(set(self.ids(method='paypal', status='pending')), {self.withdraws[0].pk, self.withdraws[6].pk})
+        self.assertEqual(set(self.ids(q='alice')), {w.pk for w in self.withdraws if w.user == self.alice})
+
+        context = response.context
+        self.assertEqual(context['total_withdrawals_count'], 7)
+        self.assertEqual(context['total_withdrawals_today'], 15)
+        self.assertEqual(context['pending_approval'], 3)
+        self.assertEqual(context['completed_today'], 1)
+        self.assertEqual(context['rejected_today'], 0)
+
+    def test_one_query_for_the_rows(self):
+        self.client.get(reverse('admin_withdrawal_list'))  # warm the config and role caches
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('admin_withdrawal_list'))
+
+        # session user, stats aggregate, page
+        self.assertEqual(len(queries), 3)
+
+
+class LedgerTests(TestCase):
+    def setUp(self):
+        Config.objects.create(platform_name='Norvia')
+        self.user = User.objects.create_user(username='alice', password='pass', first_name='A', last_name='B')
+        currency = Currency.objects.create(abbr='BTC', currency='Bitcoin', address='bc1q')
+        gateway = PaymentGateway.objects.create(name='PayPal', email='pay@example.com')
+        now = timezone.now()
+        self.rows = [
+            Deposit.objects.create(user=self.user, amount=100, currency=currency, network='BTC', date_created=now - timedelta(days=3)),
+            Withdraw.objects.create(user=self.user, amount=40, currency='btc', date=now - timedelta(days=2)),
+            Deposit.objects.create(user=self.user, amount=50, gateway=gateway, status='success', date_created=now - timedelta(days=1)),
+            Withdraw.objects.create(user=self.user, amount=10, gateway='paypal', date=now),
+        ]
+
+    def test_deposits_and_withdrawals_are_merged_newest_first(self):
+        rows = list(ledger(self.user))
+
+        self.assertEqual(
+            [(r['txn_type'], r['txn_pk'], r['txn_amount'], r['txn_method']) for r in rows],
+            [
+                ('Withdrawal', self.rows[3].pk, 10, 'paypal'),
+                ('Deposit', self.rows[2].pk, 50, 'PayPal'),
+                ('Withdrawal', self.rows[1].pk, 40, 'BTC'),
+                ('Deposit', self.rows[0].pk, 100, 'Bitcoin (BTC)'),
+            ],
+        )
+        self.assertEqual(ledger(self.user).count(), 4)
+        self.assertEqual([r['txn_pk'] for r in ledger(self.user)[1:3]], [self.rows[2].pk, self.rows[1].pk])
+        self.assertEqual([r['txn_type'] for r in ledger(self.user, kinds=('deposit',))], ['Deposit', 'Deposit'])
+
+    def test_user_detail_pages_the_ledger(self):
+        admin = User.objects.create_user(username='admin', password='pass', first_name='A', last_name='B')
+        admin.groups.add(Group.objects.create(name='admin'))
+        self.client.force_login(admin)
+        url = reverse('admin_user_detail', args=[self.user.username])
+        self.client.get(url)  # warm the config and role caches
+
+        with CaptureQueriesContext(connection) as few:
+            response = self.client.get(url)
+        self.assertEqual(len(response.context['transactions']), 4)
+
+        for n in range(30):
+            Withdraw.objects.create(user=self.user, amount=n)
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get(url, {'tx_page': 2})
+
+        self.assertEqual(len(few), len(many))
+        self.assertEqual(len(response.context['transactions']), 9)
+        self.assertEqual(response.context['transactions'][-1]['txn_method'], 'Bitcoin (BTC)')
+
+    def test_history_pages_page_the_ledger(self):
+        self.user.groups.add(Group.objects.create(name='trader'))
+        self.client.force_login(self.user)
+        for n in range(30):
+            Withdraw.objects.create(user=self.user, amount=n, currency='usdt')
+
+        response = self.client.get(reverse('deposit_history'))
+        self.assertEqual([d['txn_pk'] for d in response.context['deposits']], [self.rows[2].pk, self.rows[0].pk])
+        self.assertContains(response, 'PAYPAL')
+        self.assertContains(response, reverse('deposit_details', args=[self.rows[0].ref]))
+
+        response = self.client.get(reverse('withdrawal_history'), {'page': 2})
+        withdraws = response.context['withdraws']
+        self.assertEqual((withdraws.paginator.count, len(withdraws)), (32, 7))
+        self.assertEqual(withdraws[-1]['txn_pk'], self.rows[1].pk)
+        self.assertContains(response, '?page=1')
+
+
+class WalletTests(TestCase):
+    def setUp(self):
+        Config.objects.create(platform_name='Norvia')
+        self.user = User.objects.create_user(username='alice', password='pass', first_name='A', last_name='B')
+
+    def balance(self, name):
+        return Wallet.objects.get(user=self.user, name=name).balance
+
+    def test_postings_balance_and_update_wallets(self):
+        wallets.credit(self.user, 'deposit', 100.1)
+        wallets.transfer(self.user, 'deposit', 'profit', '40.05')
+
+        self.assertEqual(self.balance('deposit'), Decimal('60.05'))
+        self.assertEqual(self.balance('profit'), Decimal('40.05'))
+        self.assertEqual(self.user.deposit, Decimal('60.05'))
+        self.assertEqual(self.user.holding_profit, Decimal('0.00'))
+        self.assertEqual(LedgerEntry.objects.aggregate(total=Sum('amount'))['total'], 0)
+        for txn in LedgerEntry.objects.values_list('txn', flat=True).distinct():
+            self.assertEqual(LedgerEntry.objects.filter(txn=txn).aggregate(total=Sum('amount'))['total'], 0)
+
+        with self.assertRaises(ValueError):
+            wallets.post([(self.user, 'deposit', 5), (None, 'deposits', -4)])
+
+    def test_balances_refreshed_through_request_user(self):
+        user = SimpleLazyObject(lambda: self.user)
+        self.assertEqual(user.deposit, Decimal('0.00'))
+
+        wallets.credit(user, 'deposit', 25)
+
+        self.assertEqual(user.deposit, Decimal('25.00'))
+        self.assertEqual(
+            Wallet.objects.get(user=self.user, name='deposit').last_entry_id,
+            LedgerEntry.objects.get(user=self.user).pk,
+        )
+
+    def test_overdraft_applies_nothing(self):
+        wallets.credit(self.user, 'deposit', 10)
+
+        with self.assertRaises(wallets.InsufficientFunds):
+            wallets.post([(self.user, 'profit', 5), (self.user, 'deposit', -15), (None, 'trades', 10)])
+
+        self.assertEqual(self.user.deposit, Decimal('10.00'))
+        self.assertEqual(self.user.profit, Decimal('0.00'))
+        self.assertEqual(LedgerEntry.objects.count(), 2)
+
+    def test_set_balance_posts_the_difference(self):
+        wallets.credit(self.user, 'deposit', 100)
+
+        wallets.set_balance(self.user, 'deposit', '250.50')
+        self.assertIsNone(wallets.set_balance(self.user, 'deposit', 250.5))
+
+        self.assertEqual(self.balance('deposit'), Decimal('250.50'))
+        self.assertEqual(LedgerEntry.objects.get(account='adjustments').amount, Decimal('-150.50'))
+
+    def test_snapshots_replay_only_later_entries(self):
+        wallets.credit(self.user, 'deposit', 100)
+        self.assertEqual(wallets.take_snapshots(), 1)
+        self.assertEqual(wallets.take_snapshots(), 0)
+        middle = timezone.now()
+        wallets.debit(self.user, 'deposit', 30)
+
+        with self.assertNumQueries(2):
+            self.assertEqual(wallets.balance_at(self.user, 'deposit', timezone.now()), Decimal('70.00'))
+        self.assertEqual(wallets.balance_at(self.user, 'deposit', middle), Decimal('100.00'))
+        self.assertEqual(wallets.take_snapshots(), 1)
+        self.assertEqual(BalanceSnapshot.objects.order_by('pk').last().balance, Decimal('70.00'))
+
+    def test_place_trade_debits_the_trading_wallet(self):
+        wallets.credit(self.user, 'deposit', 100)
+        self.client.force_login(self.user)
+        trade = {'symbol': 'BTC', 'trade_type': 'buy', 'entry_price': 50000, 'amount': 60, 'asset': 'crypto'}
+
+        self.assertEqual(self.client.post(reverse('place_trade'), trade, content_type='application/json').status_code, 200)
+        response = self.client.post(reverse('place_trade'), trade, content_type='application/json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.balance('deposit'), Decimal('40.00'))
+        self.assertEqual(Trade.objects.count(), 1)
+
+    def test_deposit_is_credited_once(self):
+        admin = User.objects.create_user(username='admin', password='pass', first_name='A', last_name='B')
+        admin.groups.add(Group.objects.create(name='admin'))
+        self.client.force_login(admin)
+        deposit = Deposit.objects.create(user=self.user, amount=100)
+
+        for _ in range(2):
+            self.client.post(reverse('admin_deposit_list'), {'approve': '1', 'deposit_id': deposit.ref, 'credit_amount': '95.5'})
+
+        self.assertEqual(self.balance('deposit'), Decimal('95.50'))
+        self.assertEqual(Deposit.objects.get(pk=deposit.pk).status, 'success')
+
+
+class WalletConcurrencyTests(TransactionTestCase):
+    threads = 8
+    per_thread = 20
+
+    def churn(self, user, errors):
+        try:
+            user = User.objects.get(pk=user.pk)  # each thread with its own instance, as in separate requests
+            for _ in range(self.per_thread):
+                wallets.credit(user, 'deposit', '1.50')
+                wallets.transfer(user, 'deposit', 'profit', '0.50')
+                try:
+                    wallets.debit(user, 'profit', '0.25')
+                except wallets.InsufficientFunds:
+                    errors.append('overdraft')
+        except Exception as e:
+            errors.append(e)
+        finally:
+            connection.close()
+
+    def test_concurrent_postings_lose_no_updates(self):
+        user = User.objects.create_user(username='alice', password='pass', first_name='A', last_name='B')
+        errors = []
+        threads = [threading.Thread(target=self.churn, args=(user, errors)) for _ in range(self.threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        rounds = self.threads * self.per_thread
+        self.assertEqual(user.deposit, Decimal('1.00') * rounds)
+        self.assertEqual(user.profit, Decimal('0.25') * rounds)
+        self.assertEqual(LedgerEntry.objects.filter(user=None).aggregate(total=Sum('amount'))['total'], Decimal('-1.25') * rounds)
+        self.assertEqual(LedgerEntry.objects.count(), 6 * rounds)
+
+
+class NotificationFeedTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        Config.objects.create(platform_name='Norvia')
+        self.user = User.objects.create_user(username='alice', password='pass', first_name='A', last_name='B')
+        for n in range(25):
+            Notification.objects.create(user=self.user, title=f"N{n}", media_type='text', created_on=timezone.now() - timedelta(minutes=n))
+        self.request = RequestFactory().get('/')
+        self.request.user = self.user
+
+    def test_feed_and_count_are_cached_until_a_notification_is_added(self):
+        self.assertEqual([n.title for n in get_notification_feed(self.user)][:2], ['N0', 'N1'])
+        self.assertEqual(len(get_notification_feed(self.user)), 20)
+        self.assertEqual(get_unread_notification_count(self.user), 25)
+
+        with self.assertNumQueries(0):
+            get_notification_feed(self.user)
+            get_unread_notification_count(self.user)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            add_notification(self.user, 'Fresh', 'F', 'info')
+
+        self.assertEqual(get_notification_feed(self.user)[0].title, 'Fresh')
+        self.assertEqual(get_unread_notification_count(self.user), 26)
+
+    def test_marking_read_resets_the_count(self):
+        self.client.force_login(self.user)
+        get_unread_notification_count(self.user)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('read_notifications'))
+
+        self.assertEqual(response.json(), {'status': 'success'})
+        self.assertEqual(get_unread_notification_count(self.user), 0)
+
+    @shared_caches()
+    def test_read_in_another_worker_resets_the_badge_here(self):
+        self.assertEqual(get_unread_notification_count(self.user), 25)
+
+        Notification.objects.filter(user=self.user).update(read=True)
+        in_other_worker(f"from account.utils import invalidate_notifications\ninvalidate_notifications([{self.user.pk}])")
+
+        self.assertEqual(get_unread_notification_count(self.user), 0)
+
+    def test_processor_is_lazy(self):
+        with self.assertNumQueries(0):
+            context = notifications_processor(self.request)
+            Template("<p>{{ request.path }}</p>").render(Context(context))
+
+        with self.assertNumQueries(2):
+            Template("{{ notifications|length }} {{ notifications_unread }}").render(Context(context))
+
+
+class LazyContextTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        Config.objects.create(platform_name='Norvia')
+        self.request = RequestFactory().get('/')
+        self.request.user = User.objects.create_user(username='alice', password='pass', first_name='A', last_name='B')
+
+    def test_values_load_once_per_request_and_only_when_used(self):
+        loads = []
+        value = lazy_value(self.request, 'answer', lambda request: loads.append(1) or 42)
+        self.assertEqual(loads, [])
+
+        self.assertEqual(Template("{{ answer }}").render(Context({'answer': value})), '42')
+        again = lazy_value(self.request, 'answer', lambda request: loads.append(1) or 0)
+        self.assertEqual(again + 1, 43)
+        self.assertEqual(loads, [1])
+
+    def test_config_is_only_read_by_templates_that_use_it(self):
+        context = global_config(self.request)
+
+        with queries_per_template() as counts:
+            Template("<p>static</p>", name='static').render(Context(context))
+            Template("{{ config.platform_name }}", name='branded').render(Context(context))
+            Template("{{ config.platform_name }}", name='branded again').render(Context(global_config(self.request)))
+
+        self.assertEqual(counts, {'static': 0, 'branded': 1, 'branded again': 0})
+
+
+class TemplateFragmentTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        Config.objects.create(platform_name='Norvia')
+        self.user = User.objects.create_user(username='alice', password='pass', first_name='A', last_name='B')
+        self.user.groups.add(Group.objects.create(name='trader'))
+        self.client.force_login(self.user)
+        self.trader = Trader.objects.create(full_name='Tara Trader', username='tara', win=7, created_by=self.user)
+
+    def test_trader_cards_are_cached_until_a_trader_changes(self):
+        self.assertContains(self.client.get(reverse('copy_trader')), '7 Wins')
+
+        # .update() sends no signal, so the cached card is still served
+        Trader.objects.filter(pk=self.trader.pk).update(win=8)
+        self.assertContains(self.client.get(reverse('copy_trader')), '7 Wins')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.trader.win = 9
+            self.trader.save()
+        self.assertContains(self.client.get(reverse('copy_trader')), '9 Wins')
+
+    @shared_caches()
+    def test_trader_edit_in_another_worker_refreshes_cards_here(self):
+        self.assertContains(self.client.get(reverse('copy_trader')), '7 Wins')
+
+        Trader.objects.filter(pk=self.trader.pk).update(win=8)
+        in_other_worker("from account.utils import invalidate_fragments\ninvalidate_fragments('traders')")
+
+        self.assertContains(self.client.get(reverse('copy_trader')), '8 Wins')
+
+    def test_currency_options_are_cached_per_user(self):
+        currency = Currency.objects.create(abbr='BTC', currency='Bitcoin', address='bc1q')
+        UserPaymentMethod.objects.create(user=self.user, payment=currency, method_type='currency', active=True)
+        url = reverse('deposit')
+        self.client.get(url)
+
+        with CaptureQueriesContext(connection) as warm:
+            response = self.client.get(url)
+        self.assertContains(response, 'Bitcoin (BTC)')
+        self.assertFalse([q for q in warm if 'account_userpaymentmethod' in q['sql']])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            currency.currency = 'Bitcoin Core'
+            currency.save()
+        self.assertContains(self.client.get(url), 'Bitcoin Core (BTC)')
+
+        other = User.objects.create_user(username='bob', password='pass', first_name='B', last_name='C')
+        other.groups.add(Group.objects.get(name='trader'))
+        self.client.force_login(other)
+        self.assertNotContains(self.client.get(url), 'Bitcoin Core (BTC)')
+
+
+class StaticFilesTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.source, self.root = Path(self.tmp.name, 'src'), Path(self.tmp.name, 'root')
+        (self.source / 'css').mkdir(parents=True)
+        (self.source / 'css' / 'site.css').write_text(
+            "body { background: url('../img/bg.png'); }\n/*# sourceMappingURL=site.css.map */\n" + ".row { margin: 0; }\n" * 200
+        )
+        (self.source / 'img').mkdir()
+        (self.source / 'img' / 'bg.png').write_bytes(b'\x89PNG' + bytes(1024))
+
+        settings = override_settings(
+            STATIC_ROOT=str(self.root),
+            STATICFILES_DIRS=[str(self.source)],
+            STORAGES={'staticfiles': {'BACKEND': 'utils.staticfiles.CompressedManifestStaticFilesStorage'}},
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def collectstatic(self):
+        call_command('collectstatic', interactive=False, verbosity=0)
+        return json.loads((self.root / 'staticfiles.json').read_text())['paths']
+
+    def get(self, app, path, **environ):
+        calls = []
+        environ = {'REQUEST_METHOD': 'GET', 'PATH_INFO': path, **environ}
+        body = b''.join(app(environ, lambda status, headers: calls.append((status, dict(headers)))))
+        return calls[0][0], calls[0][1], body
+
+    def test_collectstatic_writes_hashed_and_compressed_files(self):
+        paths = self.collectstatic()
+        css = self.root / paths['css/site.css']
+
+        self.assertNotEqual(paths['css/site.css'], 'css/site.css')
+        self.assertIn(paths['img/bg.png'], css.read_text())
+        # The missing source map is left as it is instead of failing the build
+        self.assertIn('sourceMappingURL=site.css.map', css.read_text())
+        self.assertEqual(gzip.decompress(Path(f'{css}.gz').read_bytes()), css.read_bytes())
+        self.assertFalse(Path(self.root, f"{paths['img/bg.png']}.gz").exists())
+
+    def test_incremental_run_keeps_compressed_files(self):
+        paths = self.collectstatic()
+        compressed = Path(self.root, f"{paths['css/site.css']}.gz")
+        os.utime(compressed, (0, 0))
+
+        self.assertEqual(self.collectstatic(), paths)
+        self.assertEqual(compressed.stat().st_mtime, 0)
+
+    def test_serves_precompressed_variant_with_immutable_caching(self):
+        paths = self.collectstatic()
+        def django_app(environ, start_response):
+            start_response('200 OK', [])
+            return [b'django']
+
+        app = PrecompressedStaticFiles(django_app, self.root, '/static/')
+        css = self.root / paths['css/site.css']
+
+        status, headers, body = self.get(app, f"/static/{paths['css/site.css']}", HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(status, '200 OK')
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+        self.assertEqual(headers['Vary'], 'Accept-Encoding')
+        self.assertIn('immutable', headers['Cache-Control'])
+        self.assertEqual(gzip.decompress(body), css.read_bytes())
+
+        for refused in ('gzip;q=0, deflate', 'gzip; q=0.0', '*;q=0', 'x-gzip'):
+            self.assertNotIn('Content-Encoding', self.get(app, f"/static/{paths['css/site.css']}", HTTP_ACCEPT_ENCODING=refused)[1])
+        self.assertEqual(self.get(app, f"/static/{paths['css/site.css']}", HTTP_ACCEPT_ENCODING='*')[1]['Content-Encoding'], 'gzip')
+
+        status, plain_headers, body = self.get(app, f"/static/{paths['css/site.css']}")
+        self.assertNotIn('Content-Encoding', plain_headers)
+        self.assertEqual(plain_headers['Last-Modified'], headers['Last-Modified'])
+        self.assertEqual(body, css.read_bytes())
+
+        status, body = self.get(app, f"/static/{paths['css/site.css']}", HTTP_IF_MODIFIED_SINCE=headers['Last-Modified'])[::2]
+        self.assertEqual((status, body), ('304 Not Modified', b''))
+
+        self.assertNotIn('immutable', self.get(app, '/static/css/site.css')[1]['Cache-Control'])
+
+        for path in ('/static/../src/css/site.css', '/static/missing.css', '/account/'):
+            self.assertEqual(self.get(app, path)[2], b'django')
@@ -4,10 +4,15 @@ from account import views
 
 urlpatterns = [
     path('', views.home, name='home'),
+    path('notifications/<int:pk>/dismiss/', views.dismiss_notification, name='dismiss_notification'),
+    path('notifications/read/', views.read_notifications, name='read_notifications'),
     path("stop-copying/<uuid:pk>/", views.stop_copying, name="stop_copying"),
     path('crypto-market/', views.crypto_market, name='crypto_market'),
     path('stock-market/', views.stock_market, name='stock_market'),
     path('place-trade/', views.place_trade, name='place_trade'),
+    path('market/prices/', views.market_prices, name='market_prices'),
+    path('market/candles/', views.market_candles, name='market_candles'),
+    path('market/stream/', views.market_stream, name='market_stream'),
     path('copy-trader/', views.copy_trader, name='copy_trader'),
     path('become-trader/', views.become_trader, name='become_trader'),
     path('deposit/', views.deposit, name='deposit'),
@@ -1,18 +1,180 @@
+import copy
+import functools
+import hashlib
+import uuid
 import requests
-from account.models import Activity, AdminNotification, Notification, Trade, User
+from account.models import Activity, AdminNotification, Config, Notification, NotificationJob, PnlRollup, QueuedEmail, TelegramMessage, Trade, User
+from account.pricing import get_price, get_quotes
+from account.telegram import MAX_MESSAGE_LENGTH
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Case, F, FloatField, Max, Min, Q, Sum, Value, When
 from django.utils import timezone
 from datetime import timedelta
-from django.core.mail import EmailMultiAlternatives
+from pathlib import Path
 from django.template.loader import render_to_string
 from django.conf import settings
 
-def telegram(message):
-    TOKEN = "7659033307:AAHgJ-38RaKx5Xo1piwxAgjrvqBYh7qMbSY"
-    chat_id = ['1322959136']
+CONFIG_VERSION_KEY = 'config:version'
+
+# (version, Config) pair for this process, swapped as a whole on reload
+_config_local = (None, None)
+
+def get_config():
+    """
+    Return the platform Config row.
+
+    Every process keeps its own copy and only hits the database again when the
+    shared version key in the cache changes (see invalidate_config).
+    """
+    global _config_local
+
+    version = cache.get(CONFIG_VERSION_KEY)
+    if version is None:
+        cache.add(CONFIG_VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(CONFIG_VERSION_KEY)
+
+    local_version, config = _config_local
+    if version is None or local_version != version:
+        config = Config.objects.first()
+        _config_local = (version, config)
+
+    # Callers may edit and save what they get back, so never hand out the shared instance
+    return copy.copy(config) if config else None
+
+def invalidate_config():
+    cache.set(CONFIG_VERSION_KEY, uuid.uuid4().hex, None)
+
+PAGE_CACHE_VERSION_KEY = 'pages:version'
+
+@functools.cache
+def page_templates_hash():
+    """
+    Digest of the public page templates this process renders. The page content
+    lives in these files, so a deploy that edits them starts new cache keys
+    while workers still on the old files keep theirs.
+    """
+    digest = hashlib.md5()
+    for directory in settings.TEMPLATES[0]['DIRS']:
+        for path in sorted((Path(directory) / 'interface').rglob('*.html')):
+            digest.update(str(path.relative_to(directory)).encode())
+            digest.update(path.read_bytes())
+    return digest.hexdigest()[:12]
+
+def get_page_cache_version():
+    """
+    Part of every full-page cache key, so invalidate_page_cache() or a change to
+    the page templates drops all pages at once.
+    """
+    version = cache.get(PAGE_CACHE_VERSION_KEY)
+    if version is None:
+        cache.add(PAGE_CACHE_VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(PAGE_CACHE_VERSION_KEY)
+    return f"{version}.{page_templates_hash()}"
+
+def invalidate_page_cache():
+    cache.set(PAGE_CACHE_VERSION_KEY, uuid.uuid4().hex, None)
+
+FRAGMENT_VERSION_KEY = 'fragments:{}:version'
+FRAGMENTS = ('traders', 'plans', 'currencies')
+
+def get_fragment_versions():
+    """
+    {fragment group: version} for the {% cache %} blocks in the account
+    templates, which vary on their group's version so invalidate_fragments()
+    can drop a whole group (every trader card, say) at once.
+    """
+    keys = {name: FRAGMENT_VERSION_KEY.format(name) for name in FRAGMENTS}
+    versions = cache.get_many(keys.values())
+    missing = {key: uuid.uuid4().hex for key in keys.values() if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return {name: versions[key] for name, key in keys.items()}
+
+def invalidate_fragments(*names):
+    cache.set_many({FRAGMENT_VERSION_KEY.format(name): uuid.uuid4().hex for name in names}, None)
 
-    for i in chat_id:
-        url = f"https://api.telegram.org/bot{TOKEN}/sendMessage?chat_id={i}&text={message}"
-        requests.get(url)
+USER_ROLES_KEY = 'user:{}:roles'
+USER_ROLES_TIMEOUT = 60 * 60
+
+def get_user_roles(request):
+    """
+    Return the group names of request.user as a frozenset.
+
+    Resolved at most once per request, and shared between requests through the
+    default cache, which every worker uses, until the user's groups change (see
+    invalidate_user_roles). A revoked role is therefore dropped everywhere at once.
+    """
+    roles = getattr(request, '_user_roles', None)
+    if roles is None:
+        roles = _load_user_roles(request.user)
+        request._user_roles = roles
+    return roles
+
+def _load_user_roles(user):
+    if not user.is_authenticated:
+        return frozenset()
+
+    key = USER_ROLES_KEY.format(user.pk)
+    roles = cache.get(key)
+    if roles is None:
+        roles = frozenset(user.groups.values_list('name', flat=True))
+        cache.set(key, roles, USER_ROLES_TIMEOUT)
+    return roles
+
+def invalidate_user_roles(user_ids):
+    cache.delete_many([USER_ROLES_KEY.format(pk) for pk in user_ids])
+
+NOTIFICATION_FEED_KEY = 'user:{}:notifications'
+NOTIFICATION_UNREAD_KEY = 'user:{}:notifications:unread'
+NOTIFICATION_FEED_SIZE = 20
+NOTIFICATION_FEED_TIMEOUT = 60 * 60
+
+def get_notification_feed(user):
+    """
+    The latest NOTIFICATION_FEED_SIZE notifications of `user`, newest first.
+
+    Cached per user until one of theirs is created, changed or marked read
+    (see invalidate_notifications).
+    """
+    key = NOTIFICATION_FEED_KEY.format(user.pk)
+    feed = cache.get(key)
+    if feed is None:
+        feed = list(Notification.objects.filter(user=user).order_by('-created_on')[:NOTIFICATION_FEED_SIZE])
+        cache.set(key, feed, NOTIFICATION_FEED_TIMEOUT)
+    return feed
+
+def get_unread_notification_count(user):
+    key = NOTIFICATION_UNREAD_KEY.format(user.pk)
+    count = cache.get(key)
+    if count is None:
+        count = Notification.objects.filter(user=user, read=False).count()
+        cache.set(key, count, NOTIFICATION_FEED_TIMEOUT)
+    return count
+
+def mark_notifications_read(user):
+    """Mark all of `user`'s notifications read and return how many were unread."""
+    updated = Notification.objects.filter(user=user, read=False).update(read=True)
+    if updated:
+        # .update() sends no signals, so invalidate here
+        transaction.on_commit(lambda: invalidate_notifications([user.pk]))
+    return updated
+
+def invalidate_notifications(user_ids):
+    cache.delete_many([
+        key.format(pk) for pk in user_ids for key in (NOTIFICATION_FEED_KEY, NOTIFICATION_UNREAD_KEY)
+    ])
+
+def telegram(message):
+    """
+    Queue an alert for the admin chats. It is delivered by the send_telegram
+    worker, and dropped if the surrounding transaction rolls back.
+    """
+    TelegramMessage.objects.bulk_create(
+        TelegramMessage(chat_id=chat_id, text=message[:MAX_MESSAGE_LENGTH])
+        for chat_id in settings.TELEGRAM_CHAT_IDS
+    )
 
 def add_activity(user, title, description, icon, activity_type, amount, is_positive):
     """
@@ -60,46 +222,182 @@ def add_addmin_notification(user,title,message):
 #     return amount_usd / btc_price
 
 def usd_to_btc(amount_usd):
-    url = "https://api.coingecko.com/api/v3/simple/price?ids=bitcoin&vs_currencies=usd"
+    return amount_usd / get_price('BTC')
 
-    response = requests.get(url)
-    response.raise_for_status()
+def trade_pnl_expressions(price=F('current_price')):
+    """SQL expressions for the pnl and pnl_percent of a trade at `price` (Trade.compute_pnl in SQL)."""
+    leverage = Case(
+        When(mode='leverage', leverage__gt=0, then=F('leverage')),
+        default=Value(1),
+        output_field=FloatField(),
+    )
+    pnl = Case(
+        When(trade_type='buy', then=(price - F('entry_price')) * F('size') * leverage),
+        default=(F('entry_price') - price) * F('size') * leverage,
+        output_field=FloatField(),
+    )
+    pnl_percent = Case(
+        When(Q(entry_price=0) | Q(size=0), then=Value(0.0)),
+        default=pnl * 100 / (F('entry_price') * F('size')),
+        output_field=FloatField(),
+    )
+    return pnl, pnl_percent
 
-    data = response.json()
-    btc_price = float(data["bitcoin"]["usd"])  # BTC price in USD
+def revalue_open_trades(prices=None, chunk_size=50000):
+    """
+    Mark every open trade to market: set current_price, pnl and pnl_percent
+    from `prices` ({symbol: price}), by default the shared price cache's
+    quotes for the symbols with open trades. Trades without a price are left
+    alone.
+
+    The arithmetic runs inside the database, one UPDATE per chunk_size range
+    of ids with the price picked per row by symbol, so no trade rows are
+    loaded into Python. A trade closed meanwhile is skipped by the status
+    filter. Returns the number of trades revalued.
+    """
+    open_trades = Trade.objects.filter(status='open')
+    if prices is None:
+        symbols = {s.upper() for s in open_trades.values_list('symbol', flat=True).distinct()}
+        prices = {symbol: quote['price'] for symbol, quote in get_quotes(symbols).items()}
+    if not prices:
+        return 0
 
-    return amount_usd / btc_price
+    priced = Q()
+    for symbol in prices:
+        priced |= Q(symbol__iexact=symbol)
+    open_trades = open_trades.filter(priced)
+    price = Case(
+        *[When(symbol__iexact=symbol, then=Value(float(p))) for symbol, p in prices.items()],
+        output_field=FloatField(),
+    )
+    pnl, pnl_percent = trade_pnl_expressions(price)
+
+    bounds = open_trades.aggregate(first=Min('pk'), last=Max('pk'))
+    if bounds['first'] is None:
+        return 0
 
-def check_expired_trades(user:User):
-    trades = Trade.objects.filter(user=user, status='open')
+    revalued = 0
+    for start in range(bounds['first'], bounds['last'] + 1, chunk_size):
+        # One short write transaction per range, so closing and placing trades aren't held up for the whole pass
+        with transaction.atomic():
+            revalued += open_trades.filter(pk__gte=start, pk__lt=start + chunk_size).update(
+                current_price=price,
+                pnl=pnl,
+                pnl_percent=pnl_percent,
+            )
+    return revalued
 
-    for trade in trades:
-        if trade.is_expired():
-            trade.close_trade()
+def close_expired_trades(batch_size=1000):
+    """
+    Close every open trade whose duration has elapsed, across all users.
 
-def get_24hr_pnl_and_percentage(user):
+    The due trades are found through the (status, expires_at) index and then
+    claimed and closed one batch per transaction, so several sweepers can run
+    at once: rows are claimed with SKIP LOCKED where the database supports it,
+    and SQLite serialises the batches through its IMMEDIATE transactions.
+    Each batch is added to PnlRollup in the same transaction. Returns the
+    number of trades closed.
+    """
     now = timezone.now()
-    last_24hrs = now - timedelta(hours=24)
-    previous_24hrs = last_24hrs - timedelta(hours=24)
+    pnl, pnl_percent = trade_pnl_expressions()
 
-    # Current 24 hrs trades
-    trades_today = Trade.objects.filter(
-        user=user,
-        closed_at__gte=last_24hrs,
-        closed_at__lte=now,
-        status='closed'
+    due_ids = list(
+        Trade.objects
+        .filter(status='open', expires_at__lte=now)
+        .order_by('pk')
+        .values_list('pk', flat=True)
     )
 
-    # Previous 24 hrs trades
-    trades_yesterday = Trade.objects.filter(
+    closed = 0
+    for i in range(0, len(due_ids), batch_size):
+        with transaction.atomic():
+            claimed = Trade.objects.filter(pk__in=due_ids[i:i + batch_size], status='open')
+            if connection.features.has_select_for_update_skip_locked:
+                claimed = claimed.select_for_update(skip_locked=True)
+
+            ids = list(claimed.values_list('pk', flat=True))
+            if not ids:
+                continue
+
+            Trade.objects.filter(pk__in=ids).update(
+                status='closed',
+                closed_at=now,
+                pnl=pnl,
+                pnl_percent=pnl_percent,
+            )
+            PnlRollup.record_trades(ids)
+
+        closed += len(ids)
+
+    return closed
+
+NOTIFICATION_JOB_STALE_AFTER = timedelta(minutes=5)
+
+def run_notification_jobs(chunk_size=1000):
+    """
+    Run pending NotificationJobs, and resume running ones whose worker has
+    not saved progress for NOTIFICATION_JOB_STALE_AFTER. A job is claimed by
+    a conditional UPDATE, so concurrent workers never run the same job.
+    Returns the number of jobs finished.
+    """
+    stale = timezone.now() - NOTIFICATION_JOB_STALE_AFTER
+    finished = 0
+
+    jobs = NotificationJob.objects.filter(Q(status='pending') | Q(status='running', updated_on__lt=stale)).order_by('pk')
+    for job in jobs:
+        claimed = NotificationJob.objects.filter(pk=job.pk, status=job.status, updated_on=job.updated_on).update(
+            status='running',
+            updated_on=timezone.now(),
+        )
+        if claimed:
+            job.refresh_from_db()
+            job.run(chunk_size=chunk_size)
+            finished += 1
+
+    return finished
+
+PNL_24H_KEY = 'user:{}:pnl24h:{}'
+PNL_24H_TIMEOUT = 60
+
+def get_24hr_pnl_and_percentage(user, use_cache=True):
+    """
+    PnL of trades closed in the last 24h and its change against the 24h before.
+
+    With use_cache the result is cached per user, keyed on their latest closed
+    trade, so it is recomputed as soon as another trade closes. The short
+    timeout bounds how long trades take to drop out of the sliding window.
+    """
+    key = None
+    if use_cache:
+        latest_closed = (
+            Trade.objects
+            .filter(user=user, status='closed')
+            .order_by('-closed_at', '-pk')
+            .values_list('pk', flat=True)
+            .first()
+        )
+        key = PNL_24H_KEY.format(user.pk, latest_closed)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
+    now = timezone.now()
+    last_24hrs = now - timedelta(hours=24)
+    previous_24hrs = last_24hrs - timedelta(hours=24)
+
+    # Both windows in one round trip
+    totals = Trade.objects.filter(
         user=user,
+        status='closed',
         closed_at__gte=previous_24hrs,
-        closed_at__lt=last_24hrs,
-        status='closed'
+        closed_at__lte=now,
+    ).aggregate(
+        today=Sum('pnl', filter=Q(closed_at__gte=last_24hrs), default=0.0),
+        yesterday=Sum('pnl', filter=Q(closed_at__lt=last_24hrs), default=0.0),
     )
 
-    today_pnl = sum(t.pnl for t in trades_today)
-    yesterday_pnl = sum(t.pnl for t in trades_yesterday)
+    today_pnl = totals['today']
+    yesterday_pnl = totals['yesterday']
 
     # Percentage change calculation
     if yesterday_pnl == 0:
@@ -107,7 +405,53 @@ def get_24hr_pnl_and_percentage(user):
     else:
         percentage_change = ((today_pnl - yesterday_pnl) / abs(yesterday_pnl)) * 100
 
-    return today_pnl, percentage_change
+    result = (today_pnl, percentage_change)
+    if key:
+        cache.set(key, result, PNL_24H_TIMEOUT)
+
+    return result
+
+def get_pnl_summary(user=None):
+    """
+    Realised PnL over the last 7 and 30 days and all time, in total and per
+    asset, read from PnlRollup instead of Trade. user=None gives platform totals.
+    """
+    now = timezone.now()
+    rollups = PnlRollup.objects.all() if user is None else PnlRollup.objects.filter(user=user)
+
+    assets = list(
+        rollups
+        .values('asset')
+        .annotate(
+            pnl_7d=Sum('pnl', filter=Q(resolution='hour', bucket__gte=now - timedelta(days=7)), default=0.0),
+            pnl_30d=Sum('pnl', filter=Q(resolution='hour', bucket__gte=now - timedelta(days=30)), default=0.0),
+            pnl_all=Sum('pnl', filter=Q(resolution='day'), default=0.0),
+        )
+        .order_by('asset')
+    )
+
+    return {
+        'pnl_7d': sum(a['pnl_7d'] for a in assets),
+        'pnl_30d': sum(a['pnl_30d'] for a in assets),
+        'pnl_all': sum(a['pnl_all'] for a in assets),
+        'assets': assets,
+    }
+
+def queue_mail(subject, message, from_email, recipient_list, html_message=None):
+    """
+    Same arguments as django.core.mail.send_mail, but only stores one
+    QueuedEmail per recipient; the send_queued_mail worker delivers them.
+    """
+    QueuedEmail.objects.bulk_create(
+        QueuedEmail(
+            subject=subject,
+            body=message,
+            html_body=html_message,
+            from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+            to=recipient,
+        )
+        for recipient in recipient_list
+    )
 
 def send_verification_email(user, verification_url):
     subject = "Verify Your Email Address"
@@ -117,12 +461,10 @@ def send_verification_email(user, verification_url):
         "verification_url": verification_url,
     })
 
-    email = EmailMultiAlternatives(
-        subject=subject,
-        body="Please verify your email.",
-        from_email=settings.DEFAULT_FROM_EMAIL,
-        to=[user.email],
+    queue_mail(
+        subject,
+        "Please verify your email.",
+        settings.DEFAULT_FROM_EMAIL,
+        [user.email],
+        html_message=html_content,
     )
-
-    email.attach_alternative(html_content, "text/html")
-    email.send()
@@ -1,11 +1,14 @@
+import asyncio
 import base64
+import hashlib
 from decimal import Decimal, InvalidOperation
 import io
 import json
 import random
 import string
 from django.conf import settings
-from django.http import JsonResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import login, authenticate, logout, update_session_auth_hash
@@ -19,17 +22,21 @@ from django.contrib.auth.hashers import check_password
 from django.contrib.auth.views import PasswordResetView
 from django.core.paginator import Paginator
 from django.contrib.auth.tokens import default_token_generator
+from django.utils.cache import get_conditional_response, patch_cache_control
 from django.utils.http import urlsafe_base64_decode
 from django.contrib.auth.tokens import default_token_generator
 from django.utils.http import urlsafe_base64_encode
 from django.utils.encoding import force_bytes
-from django.core.mail import send_mail
 from django.db import transaction
+from asgiref.sync import sync_to_async
 import pyotp
 import qrcode
 
-from account.models import AddressVerification, AdminNotification, Config, CopiedTrader, CopyRequest, Currency, Deposit, KYCVerification, PaymentGateway, Plan, PlanCategory, Trade, Trader, TraderApplication, TraderBenefit, User, UserPaymentMethod, Withdraw, PasswordHistory
-from account.utils import add_activity, add_notification, check_expired_trades, get_24hr_pnl_and_percentage, send_verification_email, telegram, usd_to_btc
+from account import candles, streaming, wallets
+from account.ledger import ledger
+from account.models import AddressVerification, AdminNotification, AdminNotificationRead, CopiedTrader, CopyRequest, Currency, Deposit, KYCVerification, PaymentGateway, Plan, PlanCategory, Trade, Trader, TraderApplication, TraderBenefit, User, UserPaymentMethod, Withdraw, PasswordHistory
+from account.pricing import PricingError, get_markets, get_quotes
+from account.utils import add_activity, add_notification, get_24hr_pnl_and_percentage, get_config, get_pnl_summary, mark_notifications_read, queue_mail, send_verification_email, telegram, usd_to_btc
 from utils.decorators import allowed_users
 
 # Create your views here.
@@ -38,7 +45,7 @@ from utils.decorators import allowed_users
 @allowed_users(allowed_roles=['admin','trader'])
 def home(request):
     user = request.user
-    config = Config.objects.first()
+    config = get_config()
 
     now = timezone.now()
 
@@ -50,9 +57,6 @@ def home(request):
 
     pnl_24h, percentage_24h = get_24hr_pnl_and_percentage(user)
 
-    # 🔥 Run expiration checker
-    check_expired_trades(user)
-
     # mandatory_2fa
     if config.mandatory_2fa and not user.two_factor_authentication_enabled:
         messages.info(request, "Two factor authentication is required")
@@ -64,7 +68,7 @@ def home(request):
     open_trades = trades.filter(status='open')
     closed_trades = trades.filter(status='closed')
 
-    notifications = AdminNotification.objects.filter(is_active=True).order_by('-created_at')
+    notifications = AdminNotification.for_user(user)
 
     context = {
         'class_value': 'page-dashboard',
@@ -76,6 +80,8 @@ def home(request):
         "show_trading_circle": show_trading_circle,
         "pnl_24h": pnl_24h,
         "percentage_24h": percentage_24h,
+        "pnl_summary": get_pnl_summary(user),
+        "stream_url": streaming.stream_url(request),
         # 'trading_deposit_btc': usd_to_btc(user.deposit),
         # 'holding_deposit_btc': usd_to_btc(user.holding_deposit),
         # 'trading_profit_btc': usd_to_btc(user.profit),
@@ -83,6 +89,123 @@ def home(request):
     }
     return render(request, 'account/dashboard.html', context)
 
+@login_required(login_url='sign_in')
+@allowed_users(allowed_roles=['admin','trader'])
+def dismiss_notification(request, pk):
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': 'Invalid request method.'})
+
+    notification = get_object_or_404(AdminNotification.for_user(request.user), pk=pk)
+    AdminNotificationRead.objects.bulk_create(
+        [AdminNotificationRead(notification=notification, user=request.user)],
+        ignore_conflicts=True,
+    )
+    return JsonResponse({'status': 'success'})
+
+@login_required(login_url='sign_in')
+def read_notifications(request):
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': 'Invalid request method.'})
+
+    mark_notifications_read(request.user)
+    return JsonResponse({'status': 'success'})
+
+@login_required(login_url='sign_in')
+def market_prices(request):
+    """
+    Quotes for the market pages, from the shared price cache instead of each
+    browser polling CoinGecko. ?symbols=BTC,ETH for specific tickers,
+    otherwise the top coins by market cap.
+    """
+    symbols = [s for s in request.GET.get('symbols', '').split(',') if s]
+    try:
+        limit = min(int(request.GET.get('limit', 100)), 250)
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'Invalid limit.'}, status=400)
+
+    try:
+        quotes = list(get_quotes(symbols[:50]).values()) if symbols else get_markets(limit)
+    except PricingError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=503)
+
+    return JsonResponse({'status': 'success', 'quotes': quotes})
+
+@login_required(login_url='sign_in')
+def market_candles(request):
+    """
+    Chart candles from the local candle store: ?symbol=BTC&days=30, with an
+    optional resolution (1m, 1h or 1d) instead of the one picked for the span.
+    The ETag only changes when the ingest worker writes one of the blocks, so
+    dashboards polling the same chart mostly get 304s.
+    """
+    symbol = request.GET.get('symbol', '').upper()
+    resolution = request.GET.get('resolution')
+    try:
+        days = float(request.GET.get('days', 1))
+    except ValueError:
+        days = 0
+    if not symbol or not 0 < days <= 3650 or (resolution and resolution not in candles.RESOLUTIONS):
+        return JsonResponse({'status': 'error', 'message': 'Invalid symbol, days or resolution.'}, status=400)
+
+    resolution = resolution or candles.resolution_for(days)
+    step = candles.RESOLUTIONS[resolution][0]
+    # Align the window to the candle size so the URL's response is stable until the next candle
+    until = timezone.now()
+    since = candles.to_datetime((until.timestamp() - days * 86400) // step * step)
+
+    blocks = candles.blocks_for(symbol, resolution, since, until)
+    versions = list(blocks.values_list('start', 'updated_on'))
+    etag = '"%s"' % hashlib.md5(repr((symbol, resolution, since, versions)).encode()).hexdigest()
+
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = JsonResponse({
+            'status': 'success',
+            'symbol': symbol,
+            'resolution': resolution,
+            'candles': candles.candles(blocks, since, until),
+        })
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, max_age=min(step, 60))
+    return response
+
+@login_required(login_url='sign_in')
+@allowed_users(allowed_roles=['admin','trader'])
+async def market_stream(request):
+    """
+    Server-sent events with live prices and the user's open-trade PnL, fed by
+    the process-wide publisher in account.streaming. Pages only open it under
+    ASGI (see streaming.stream_url); a WSGI client gets one snapshot and is
+    told to come back after WSGI_RETRY, no more often than the pages poll.
+    """
+    user = await request.auser()
+
+    if not isinstance(request, ASGIRequest):
+        trades, prices = await sync_to_async(streaming.load_snapshot)([user.pk])
+        updates = streaming.mark_to_market(trades, prices).get(user.pk, [])
+        events = [streaming.retry(streaming.WSGI_RETRY), streaming.sse('prices', prices), streaming.sse('pnl', updates)]
+        response = StreamingHttpResponse(events, content_type='text/event-stream')
+    else:
+        publisher = streaming.get_publisher()
+        subscription = publisher.subscribe(user.pk)
+
+        async def events():
+            try:
+                yield streaming.retry()
+                while True:
+                    try:
+                        yield await asyncio.wait_for(subscription.get(), streaming.KEEPALIVE)
+                    except asyncio.TimeoutError:
+                        yield b': keepalive\n\n'
+            finally:
+                publisher.unsubscribe(subscription)
+
+        response = StreamingHttpResponse(events(), content_type='text/event-stream')
+
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # nginx would otherwise buffer the stream
+    return response
+
 @login_required
 def transfer_wallet(request):
     if request.method == 'POST':
@@ -90,31 +213,21 @@ def transfer_wallet(request):
             data = json.loads(request.body)
             from_wallet = data.get('from_wallet')
             to_wallet = data.get('to_wallet')
-            amount = float(data.get('amount', 0))
-            
-            user = request.user
+            amount = wallets.to_amount(data.get('amount', 0))
 
             if amount <= 0:
                 return JsonResponse({'status': 'error', 'message': 'Invalid amount.'})
 
             # Simple logic assuming deposit is trading wallet, profit is holding wallet
-            if from_wallet == 'trading' and user.deposit < amount:
-                return JsonResponse({'status': 'error', 'message': 'Insufficient balance in Trading Wallet.'})
-            if from_wallet == 'holding' and user.profit < amount:
-                return JsonResponse({'status': 'error', 'message': 'Insufficient balance in Holding Wallet.'})
-
-            # Perform transfer
-            if from_wallet == 'trading':
-                user.deposit -= amount
-            else:
-                user.profit -= amount
+            wallet_names = {'trading': 'deposit', 'holding': 'profit'}
+            if from_wallet not in wallet_names or to_wallet not in wallet_names or from_wallet == to_wallet:
+                return JsonResponse({'status': 'error', 'message': 'Invalid wallet.'})
 
-            if to_wallet == 'trading':
-                user.deposit += amount
-            else:
-                user.profit += amount
-
-            user.save()
+            try:
+                wallets.transfer(request.user, wallet_names[from_wallet], wallet_names[to_wallet], amount, memo='Wallet transfer')
+            except wallets.InsufficientFunds:
+                label = 'Trading' if from_wallet == 'trading' else 'Holding'
+                return JsonResponse({'status': 'error', 'message': f'Insufficient balance in {label} Wallet.'})
 
             return JsonResponse({'status': 'success'})
 
@@ -145,35 +258,7 @@ def stop_copying(request, pk):
 @login_required(login_url='sign_in')
 @allowed_users(allowed_roles=['admin','trader'])
 def crypto_market(request):
-    # Fetch open trades
-    open_trades = Trade.objects.filter(user=request.user, status='open', asset='crypto')
-
-    # Check if any open trade's duration has elapsed
-    for trade in open_trades:
-        elapsed_time = timezone.now() - trade.opened_at
-        if elapsed_time >= timedelta(minutes=trade.duration):
-            trade.status = 'closed'
-            trade.closed_at = timezone.now()
-
-            # Ensure numeric types
-            entry_price = float(trade.entry_price)
-            current_price = float(trade.current_price)
-            size = float(trade.size)
-
-            if trade.trade_type == 'buy':  # Long
-                trade.pnl = (current_price - entry_price) * size
-            else:  # Short
-                trade.pnl = (entry_price - current_price) * size
-
-            # Safe percent calculation
-            if entry_price * size != 0:
-                trade.pnl_percent = (trade.pnl / (entry_price * size)) * 100
-            else:
-                trade.pnl_percent = 0.0
-
-            trade.save()
-
-    # Fetch updated open and closed trades
+    # Expired trades are closed by the close_expired_trades worker
     open_trades = Trade.objects.filter(user=request.user, status='open', asset='crypto').order_by('-opened_at')
     closed_trades = Trade.objects.filter(user=request.user, status='closed', asset='crypto').order_by('-opened_at')
 
@@ -182,6 +267,7 @@ def crypto_market(request):
         'closed_trades': closed_trades,
         'header_title': 'Crypto Market',
         'body_class': 'page-cryptomarket',
+        'stream_url': streaming.stream_url(request),
     }
     return render(request, 'account/crypto_market.html', context)
 
@@ -206,44 +292,39 @@ def place_trade(request):
             if not symbol or not trade_type or amount <= 0 or entry_price <= 0:
                 return JsonResponse({'success': False, 'message': 'Invalid trade data provided.'}, status=400)
 
-            # Check user balance
-            if amount > request.user.deposit:
-                return JsonResponse({'success': False, 'message': 'Insufficient balance.'}, status=400)
-
             # Calculate size
             size = amount / entry_price
 
             # Calculate initial PnL (usually 0 at entry)
-            if trade_type == 'buy':  # Long
-                pnl = (current_price - entry_price) * size
-            else:  # Short
-                pnl = (entry_price - current_price) * size
-
-            pnl_percent = (pnl / (entry_price * size)) * 100 if size > 0 else 0
+            pnl, pnl_percent = Trade.compute_pnl(trade_type, mode, leverage, size, entry_price, current_price)
 
             print(symbol, trade_type, mode, leverage, size, entry_price, current_price, duration, pnl, pnl_percent)
 
-            # Create trade
-            trade = Trade.objects.create(
-                user=request.user,
-                symbol=symbol,
-                trade_type=trade_type,
-                mode=mode,
-                leverage=leverage,
-                size=size,
-                entry_price=entry_price,
-                current_price=current_price,
-                duration=duration,
-                pnl=pnl,
-                pnl_percent=pnl_percent,
-                asset=asset,
-                status='open',
-                opened_at=timezone.now(),
-            )
-
-            # Deduct amount from user's balance
-            request.user.deposit -= amount
-            request.user.save()
+            opened_at = timezone.now()
+
+            # Create the trade and take its amount from the user's balance together
+            try:
+                with transaction.atomic():
+                    wallets.debit(request.user, 'deposit', amount, sink='trades', memo=f'{trade_type} {symbol}')
+                    trade = Trade.objects.create(
+                        user=request.user,
+                        symbol=symbol,
+                        trade_type=trade_type,
+                        mode=mode,
+                        leverage=leverage,
+                        size=size,
+                        entry_price=entry_price,
+                        current_price=current_price,
+                        duration=duration,
+                        pnl=pnl,
+                        pnl_percent=pnl_percent,
+                        asset=asset,
+                        status='open',
+                        opened_at=opened_at,
+                        expires_at=opened_at + timedelta(minutes=duration),
+                    )
+            except wallets.InsufficientFunds:
+                return JsonResponse({'success': False, 'message': 'Insufficient balance.'}, status=400)
 
             return JsonResponse({
                 'success': True,
@@ -261,35 +342,7 @@ def place_trade(request):
 @login_required(login_url='sign_in')
 @allowed_users(allowed_roles=['admin','trader'])
 def stock_market(request):
-    # Fetch open trades
-    open_trades = Trade.objects.filter(user=request.user, status='open', asset='stock')
-
-    # Check if any open trade's duration has elapsed
-    for trade in open_trades:
-        elapsed_time = timezone.now() - trade.opened_at
-        if elapsed_time >= timedelta(minutes=trade.duration):
-            trade.status = 'closed'
-            trade.closed_at = timezone.now()
-
-            # Ensure numeric types
-            entry_price = float(trade.entry_price)
-            current_price = float(trade.current_price)
-            size = float(trade.size)
-
-            if trade.trade_type == 'buy':  # Long
-                trade.pnl = (current_price - entry_price) * size
-            else:  # Short
-                trade.pnl = (entry_price - current_price) * size
-
-            # Safe percent calculation
-            if entry_price * size != 0:
-                trade.pnl_percent = (trade.pnl / (entry_price * size)) * 100
-            else:
-                trade.pnl_percent = 0.0
-
-            trade.save()
-
-    # Fetch updated open and closed trades
+    # Expired trades are closed by the close_expired_trades worker
     open_trades = Trade.objects.filter(user=request.user, status='open', asset='stock').order_by('-opened_at')
     closed_trades = Trade.objects.filter(user=request.user, status='closed', asset='stock').order_by('-opened_at')
     context = {
@@ -733,7 +786,7 @@ def deposit_gateway_success(request, ref):
 @login_required(login_url='sign_in')
 @allowed_users(allowed_roles=['admin','trader'])
 def deposit_history(request):
-    deposits = Deposit.objects.filter(user=request.user)
+    deposits = Paginator(ledger(request.user, kinds=('deposit',)), 25).get_page(request.GET.get('page'))
     context = {
         'class_value':'page-deposithistory',
         'deposits':deposits,
@@ -777,7 +830,7 @@ def withdraw(request):
 @login_required(login_url='sign_in')
 @allowed_users(allowed_roles=['admin','trader'])
 def withdrawal_history(request):
-    withdraws = Withdraw.objects.filter(user=request.user)
+    withdraws = Paginator(ledger(request.user, kinds=('withdrawal',)), 25).get_page(request.GET.get('page'))
     context = {
         'class_value':'page-withdrawhist',
         'withdraws':withdraws,
@@ -787,7 +840,7 @@ def withdrawal_history(request):
 @login_required(login_url='sign_in')
 @allowed_users(allowed_roles=['admin', 'trader'])
 def planning(request):
-    categories = PlanCategory.objects.all()
+    categories = PlanCategory.objects.prefetch_related('plans')
     currency_list = UserPaymentMethod.objects.filter(
         method_type='currency',
         user=request.user,
@@ -1088,20 +1141,18 @@ def account_settings(request):
         user.save()
 
         # 7️⃣ Send Email
-        send_mail(
+        queue_mail(
             subject="Your Current Email Verification Code",
             message=f"Your verification code is: {code1}\n\nEnter this code to verify your email.",
             from_email=settings.DEFAULT_FROM_EMAIL,
             recipient_list=[user.email],
-            fail_silently=False,
         )
 
-        send_mail(
+        queue_mail(
             subject="Your New Email Verification Code",
             message=f"Your verification code is: {code2}\n\nEnter this code to verify your email.",
             from_email=settings.DEFAULT_FROM_EMAIL,
             recipient_list=[email1],
-            fail_silently=False,
         )
 
         messages.success(request, "Email updated. A verification code has been sent to your new email.")
@@ -1301,7 +1352,7 @@ def change_password(request):
 
         errors = []
 
-        config = Config.objects.first()
+        config = get_config()
 
         # Verify current password
         if not check_password(current_password, user.password):
@@ -1389,7 +1440,7 @@ def sign_in(request):
     if 'login_fail_count' not in request.session:
         request.session['login_fail_count'] = 0
 
-    config = Config.objects.first()
+    config = get_config()
 
     if request.method == 'POST':
         username = request.POST.get('username')
@@ -1452,12 +1503,11 @@ def sign_in(request):
                 Stay secure,
                 Your {config.platform_name if hasattr(config, 'platform_name') else 'Support'} Team
                 """
-                send_mail(
+                queue_mail(
                     subject,
                     message,
                     settings.DEFAULT_FROM_EMAIL,
                     [user.email],
-                    fail_silently=False,
                 )
 
             return redirect('home')
@@ -1489,7 +1539,7 @@ def logout_view(request):
 def sign_up_step_1(request):
     if request.method == 'POST':
         
-        config = Config.objects.first()
+        config = get_config()
         
         first_name = request.POST.get('firstName')
         last_name = request.POST.get('lastName')
@@ -1743,12 +1793,11 @@ def resend_verification_email(request):
                 If you didn’t request this, you can ignore it.
                 """
 
-    send_mail(
+    queue_mail(
         subject,
         message,
         settings.DEFAULT_FROM_EMAIL,
         [user.email],
-        fail_silently=False,
     )
 
     messages.success(request, "A new verification link has been sent to your email.")
@@ -0,0 +1,176 @@
+"""
+User balances as a double-entry ledger.
+
+Every change to a balance is a posting: LedgerEntry rows sharing a txn that
+sum to zero, with each user leg applied to its Wallet row by an F() update in
+the same transaction. Balances are never read, changed in Python and saved,
+so concurrent postings cannot overwrite each other, and a debit is a
+conditional update (balance >= amount), so two debits racing for the same
+funds cannot both succeed.
+
+    credit(user, 'deposit', 100, source='deposits', memo="Deposit #...")
+    debit(user, 'deposit', 25, sink='trades')
+    transfer(user, 'deposit', 'profit', 10)
+    set_balance(user, 'deposit', 500)     # admin edit, posted as an adjustment
+
+Reading a balance is one Wallet row (User.balances). BalanceSnapshot rows,
+taken by the snapshot_balances worker, bound how much of the ledger has to be
+replayed to rebuild a past balance (balance_at).
+"""
+import uuid
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import BalanceSnapshot, LedgerEntry, Wallet
+
+CENT = Decimal('0.01')
+
+
+class InsufficientFunds(Exception):
+    pass
+
+
+def to_amount(value):
+    """`value` as Decimal cents. Floats go through str, so 0.1 stays 0.10 rather than 0.1000000000000000055."""
+    try:
+        amount = Decimal(str(value)).quantize(CENT)
+    except InvalidOperation:
+        raise ValueError(f"Invalid amount: {value!r}")
+    return amount
+
+
+def post(legs, memo=''):
+    """
+    Apply one balanced posting and return its txn id.
+
+    `legs` are (user, account, amount): a Wallet name for a user, or one of
+    LedgerEntry.PLATFORM_ACCOUNTS with user None. Amounts must sum to zero.
+    If a user leg would take its wallet below zero, InsufficientFunds is
+    raised and nothing is applied.
+    """
+    legs = [(user, account, to_amount(amount)) for user, account, amount in legs]
+    for user, account, _ in legs:
+        if account not in (LedgerEntry.PLATFORM_ACCOUNTS if user is None else Wallet.NAMES):
+            raise ValueError(f"Unknown account: {account!r}")
+    if sum(amount for _, _, amount in legs) != 0:
+        raise ValueError("A posting's legs must sum to zero.")
+
+    txn = uuid.uuid4()
+    now = timezone.now()
+    with transaction.atomic():
+        # Wallets are locked in a fixed order so postings that share them cannot deadlock
+        for user, account, amount in sorted((leg for leg in legs if leg[0] is not None), key=lambda leg: (leg[0].pk, leg[1])):
+            apply_leg(user, account, amount, now)
+
+        # Numbered while their wallets are locked, so a wallet's entry ids grow in commit order.
+        # One create() per leg: bulk_create() does not set pks on every backend (MySQL).
+        for user, account, amount in legs:
+            entry = LedgerEntry.objects.create(txn=txn, user=user, account=account, amount=amount, memo=memo, created_on=now)
+            if user is not None:
+                Wallet.objects.filter(user=user, name=account).update(last_entry_id=entry.pk)
+
+    for user, _, _ in legs:
+        if user is not None:
+            user.refresh_balances()
+    return txn
+
+
+def apply_leg(user, account, amount, now):
+    wallets = Wallet.objects.filter(user=user, name=account)
+    if amount < 0:
+        wallets = wallets.filter(balance__gte=-amount)
+    changes = {'balance': F('balance') + amount, 'updated_on': now}
+
+    if wallets.update(**changes):
+        return
+    if amount < 0:
+        raise InsufficientFunds(f"Insufficient balance in {account}.")
+
+    # First credit to this wallet
+    Wallet.objects.bulk_create([Wallet(user=user, name=account)], ignore_conflicts=True)
+    wallets.update(**changes)
+
+
+def positive(amount):
+    amount = to_amount(amount)
+    if amount <= 0:
+        raise ValueError("Amount must be positive.")
+    return amount
+
+
+def credit(user, wallet, amount, source='deposits', memo=''):
+    amount = positive(amount)
+    return post([(user, wallet, amount), (None, source, -amount)], memo)
+
+
+def debit(user, wallet, amount, sink='trades', memo=''):
+    amount = positive(amount)
+    return post([(user, wallet, -amount), (None, sink, amount)], memo)
+
+
+def transfer(user, from_wallet, to_wallet, amount, memo=''):
+    amount = positive(amount)
+    return post([(user, from_wallet, -amount), (user, to_wallet, amount)], memo)
+
+
+def set_balance(user, wallet, balance, memo=''):
+    """Post the adjustment that brings `wallet` to `balance`, or return None if it is already there."""
+    balance = to_amount(balance)
+    with transaction.atomic():
+        current = (
+            Wallet.objects.select_for_update()
+            .filter(user=user, name=wallet)
+            .values_list('balance', flat=True)
+            .first()
+        ) or Decimal('0.00')
+        if balance == current:
+            return None
+        return post([(user, wallet, balance - current), (None, 'adjustments', current - balance)], memo)
+
+
+def take_snapshots(batch_size=1000):
+    """
+    Snapshot every wallet with entries since its last snapshot and return the
+    number taken. Balance and last_entry_id come from the same row, written
+    by the same UPDATE, so a snapshot is consistent without locking.
+    """
+    latest = BalanceSnapshot.objects.filter(wallet=OuterRef('pk')).order_by('-last_entry_id')
+    changed = (
+        Wallet.objects
+        .annotate(snapshot_entry_id=Coalesce(Subquery(latest.values('last_entry_id')[:1]), 0))
+        .filter(last_entry_id__gt=F('snapshot_entry_id'))
+        .order_by('pk')
+    )
+
+    taken, after = 0, 0
+    while True:
+        wallets = list(changed.filter(pk__gt=after).values_list('pk', 'balance', 'last_entry_id')[:batch_size])
+        if not wallets:
+            return taken
+        now = timezone.now()
+        BalanceSnapshot.objects.bulk_create([
+            BalanceSnapshot(wallet_id=pk, balance=balance, last_entry_id=last_entry_id, taken_on=now)
+            for pk, balance, last_entry_id in wallets
+        ])
+        taken += len(wallets)
+        after = wallets[-1][0]
+
+
+def balance_at(user, wallet, when):
+    """`user`'s balance in `wallet` at `when`: the last snapshot before it plus the entries since."""
+    snapshot = (
+        BalanceSnapshot.objects
+        .filter(wallet__user=user, wallet__name=wallet, taken_on__lte=when)
+        .order_by('-last_entry_id')
+        .first()
+    )
+    entries = LedgerEntry.objects.filter(user=user, account=wallet, created_on__lte=when)
+    balance = Decimal('0.00')
+    if snapshot:
+        entries = entries.filter(pk__gt=snapshot.last_entry_id)
+        balance = snapshot.balance
+    return balance + (entries.aggregate(total=Sum('amount'))['total'] or 0)
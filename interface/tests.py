@@ -1,3 +1,97 @@
-from django.test import TestCase
+import shutil
+import tempfile
+from pathlib import Path
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.template import engines
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from account.models import Config, User
+from account.utils import page_templates_hash
+from utils.testing import in_other_worker, queries_per_template, shared_caches
+
+PAGES = [
+    'interface_home', 'interface_about', 'interface_copy_expert_trading', 'interface_options_trading',
+    'interface_crypto_trading', 'interface_stocks_trading', 'interface_forex_trading', 'interface_contact',
+    'interface_privacy_policy', 'interface_cookie_policy', 'interface_terms_of_service',
+    'interface_general_risk_disclosure', 'interface_responsible_trading', 'interface_what_is_leverage',
+]
+
+
+class StaticPageTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        Config.objects.create(platform_name='Norvia')
+
+    def test_static_pages_render_without_queries(self):
+        for name in PAGES:
+            with self.subTest(name), queries_per_template() as counts, self.assertNumQueries(0):
+                response = self.client.get(reverse(name))
+
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(counts)
+            self.assertEqual(sum(counts.values()), 0, counts)
+
+
+class PageCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.config = Config.objects.create(platform_name='Norvia')
+        self.url = reverse('interface_about')
+
+    def renders(self):
+        with queries_per_template() as counts:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return len(counts)
+
+    def test_anonymous_pages_are_cached_with_validators(self):
+        self.assertTrue(self.renders())
+        self.assertFalse(self.renders())
+
+        response = self.client.get(self.url, query_params={'utm_source': 'ad'})
+        self.assertEqual(response['Cache-Control'], 'max-age=0, must-revalidate')
+        self.assertEqual(self.client.get(self.url, headers={'If-None-Match': response['ETag']}).status_code, 304)
+        self.assertEqual(self.client.get(self.url, headers={'If-Modified-Since': response['Last-Modified']}).status_code, 304)
+
+    def test_config_edits_invalidate(self):
+        self.renders()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.config.save()
+        self.assertTrue(self.renders())
+
+    def test_deploying_new_page_templates_invalidates(self):
+        directory = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, directory)
+        shutil.copytree(settings.BASE_DIR / 'templates', directory, dirs_exist_ok=True)
+        about = directory / 'interface' / 'about.html'
+        templates = [{**settings.TEMPLATES[0], 'DIRS': [directory]}]
+
+        with override_settings(TEMPLATES=templates):
+            page_templates_hash.cache_clear()
+            self.addCleanup(page_templates_hash.cache_clear)
+            self.renders()
+            self.assertFalse(self.renders())
+
+            about.write_text(about.read_text().replace('{% block content %}', '{% block content %}<p>Edited</p>', 1))
+            # A new worker after the deploy
+            page_templates_hash.cache_clear()
+            engines['django'].engine.template_loaders[0].reset()
+            self.assertTrue(self.renders())
+            self.assertContains(self.client.get(self.url), 'Edited')
+
+    @shared_caches()
+    def test_invalidation_reaches_other_workers(self):
+        self.renders()
+        in_other_worker("from account.utils import invalidate_page_cache\ninvalidate_page_cache()")
+        self.assertTrue(self.renders())
+
+    def test_visitors_with_a_session_skip_the_cache(self):
+        self.renders()
+        user = User.objects.create_user(username='alice', password='pass', first_name='A', last_name='B')
+        self.client.force_login(user)
+
+        self.assertTrue(self.renders())
+        self.assertTrue(self.renders())
@@ -1,45 +1,61 @@
 from django.shortcuts import render
 
+from utils.decorators import cache_public_page
+
 # Create your views here.
 
+@cache_public_page
 def home(request):
     return render(request, 'interface/index.html')
 
+@cache_public_page
 def about(request):
     return render(request, 'interface/about.html')
 
+@cache_public_page
 def copy_expert_trading(request):
     return render(request, 'interface/copy_expert_trading.html')
 
+@cache_public_page
 def options_trading(request):
     return render(request, 'interface/options_trading.html')
 
+@cache_public_page
 def crypto_trading(request):
     return render(request, 'interface/crypto_trading.html')
 
+@cache_public_page
 def stocks_trading(request):
     return render(request, 'interface/stocks_trading.html')
 
+@cache_public_page
 def forex_trading(request):
     return render(request, 'interface/forex_trading.html')
 
+@cache_public_page
 def contact(request):
     return render(request, 'interface/contact.html')
 
+@cache_public_page
 def privacy_policy(request):
     return render(request, 'interface/privacy_policy.html')
 
+@cache_public_page
 def cookie_policy(request):
     return render(request, 'interface/cookie_policy.html')
 
+@cache_public_page
 def terms_of_service(request):
     return render(request, 'interface/terms_of_service.html')
 
+@cache_public_page
 def general_risk_disclosure(request):
     return render(request, 'interface/general_risk_disclosure.html')
 
+@cache_public_page
 def responsible_trading(request):
     return render(request, 'interface/responsible_trading.html')
 
+@cache_public_page
 def what_is_leverage(request):
     return render(request, 'interface/what_is_leverage.html')
\ No newline at end of file
@@ -5,19 +5,25 @@ from django.shortcuts import get_object_or_404, render, redirect
 from django.contrib.auth import login, authenticate, logout, update_session_auth_hash
 from django.core.files.base import ContentFile
 from django.contrib import messages
+from django.db import transaction
 from django.db.models import Q
 import qrcode
 from django.contrib.auth.decorators import login_required
-from django.core.mail import send_mail
+from django.core.paginator import Paginator
 from django.conf import settings
-from django.db.models import Sum
+from django.db.models import Count, Sum
+from django.db.models.functions import Coalesce
 from django.utils import timezone
-import requests
 from datetime import timedelta
 
-from account.models import Activity, AddressVerification, AdminNotification, BannedIp, Config, CopiedTrader, CopyRequest, Currency, Deposit, EmailTemplate, KYCVerification, Notification, PaymentGateway, Plan, PlanCategory, Trade, Trader, TraderApplication, TraderBenefit, User, UserPaymentMethod, UserPlan, Withdraw
+from account.models import Activity, AddressVerification, AdminNotification, BannedIp, CopiedTrader, CopyRequest, Currency, Deposit, EmailTemplate, KYCVerification, Notification, NotificationJob, PaymentGateway, Plan, PlanCategory, Trade, Trader, TraderApplication, TraderBenefit, User, UserPaymentMethod, UserPlan, Withdraw
+from account import wallets
+from account.ledger import ledger
+from account.pricing import PricingError, get_price
+from account.utils import get_config, get_pnl_summary, queue_mail
 from manager.forms import TraderForm
 from utils.decorators import allowed_users
+from utils.pagination import keyset_page
 
 # Create your views here.
 
@@ -85,9 +91,6 @@ def user_detail(request, username):
     kyc = KYCVerification.objects.get_or_create(user=user)
     address = AddressVerification.objects.get_or_create(user=user)
 
-    deposits = Deposit.objects.filter(user=user)
-    withdraws = Withdraw.objects.filter(user=user)
-
     total_deposit = 0
     total_withdraw = 0
     total_trade = 0
@@ -95,33 +98,8 @@ def user_detail(request, username):
     active_plan = 0
     referral = 0
 
-    # Normalizing field names for template
-    transactions = []
-
-    for d in deposits:
-        transactions.append({
-            "date": d.date_created,
-            "txn_id": d.transaction_no,
-            "type": "Deposit",
-            "amount": d.amount,
-            "status": d.status,
-            "method": f"{d.currency.currency if d.currency else ''} ({d.network})",
-            "ref": d.ref,
-        })
-
-    for w in withdraws:
-        transactions.append({
-            "date": w.date,
-            "txn_id": w.transaction_no,
-            "type": "Withdrawal",
-            "amount": w.amount,
-            "status": w.status,
-            "method": w.gateway or "Bank Transfer",
-            "ref": w.ref,
-        })
-
-    # Sort by date (newest first)
-    transactions = sorted(transactions, key=lambda x: x["date"], reverse=True)
+    # Deposits and withdrawals merged, sorted and paged by the database
+    transactions = Paginator(ledger(user), 25).get_page(request.GET.get('tx_page'))
 
     active_trade = Trade.objects.filter(user=user,status='open').count()
     manual_trade = CopiedTrader.objects.filter(user=user).count()
@@ -182,12 +160,11 @@ def user_detail(request, username):
         )
 
         # Send the email
-        send_mail(
+        queue_mail(
             subject,
             message,
             settings.DEFAULT_FROM_EMAIL,
             [user.email],
-            fail_silently=True
         )
 
         print("Password changed")
@@ -200,12 +177,11 @@ def user_detail(request, username):
         message = request.POST.get('emailBody')
 
         # Send the email
-        send_mail(
+        queue_mail(
             subject,
             message,
             settings.DEFAULT_FROM_EMAIL,
             [user.email],
-            fail_silently=True
         )
         
         messages.success(request, "Email sent to user")
@@ -257,10 +233,9 @@ def user_detail(request, username):
         trading_balance = request.POST.get('trading_balance')
         holding_balance = request.POST.get('holding_balance')
 
-        user.deposit = trading_balance
-        user.holding_deposit = holding_balance
-
-        user.save()
+        with transaction.atomic():
+            wallets.set_balance(user, 'deposit', trading_balance, memo=f"Edited by {request.user.username}")
+            wallets.set_balance(user, 'holding_deposit', holding_balance, memo=f"Edited by {request.user.username}")
 
         messages.success(request, "Successful")
         return redirect('admin_user_detail', username=username)
@@ -300,29 +275,18 @@ def user_detail(request, username):
         direction = request.POST.get('direction')
         amount = float(request.POST.get('tradeAmount'))
         leverage = int(request.POST.get('tradeLeverage'))
-        duration = request.POST.get('tradeDuration')
+        duration = int(request.POST.get('tradeDuration'))
         outcome = request.POST.get('outcome')
         outcome_amount = request.POST.get('outcomeAmount')
 
-        # Clean asset for Binance (e.g. 'BTC/USDT' → 'BTCUSDT')
-        api_symbol = asset.replace("/", "")
-        api_url = f"https://api.binance.com/api/v3/ticker/price?symbol={api_symbol}"
-
         entry_price = None
 
         # ====== FETCH MARKET PRICE FOR CRYPTO ======
         if market_type == 'crypto':
             try:
-                response = requests.get(api_url, timeout=5)
-                response.raise_for_status()
-                data = response.json()
-
-                if "price" not in data:
-                    raise Exception("Invalid price response")
-
-                entry_price = float(data["price"])
-
-            except Exception as e:
+                # e.g. 'BTC/USDT' → 'BTC'
+                entry_price = get_price(asset.split("/")[0])
+            except PricingError as e:
                 messages.error(request, f"Failed to fetch price: {e}")
                 return redirect("admin_user_detail", username=username)
 
@@ -346,6 +310,7 @@ def user_detail(request, username):
         mode = 'leverage' if leverage > 1 else 'spot'
 
         # ====== CREATE TRADE ======
+        opened_at = timezone.now()
         trade = Trade.objects.create(
             user=user,
             symbol=asset,
@@ -360,7 +325,8 @@ def user_detail(request, username):
             pnl_percent=pnl_percent,
             asset=asset,
             status='open',
-            opened_at=timezone.now(),
+            opened_at=opened_at,
+            expires_at=opened_at + timedelta(minutes=duration),
             trader=trader
         )
 
@@ -537,12 +503,11 @@ def kyc(request):
                 "Best regards,\n"
                 "The Support Team"
             )
-            send_mail(
+            queue_mail(
                 subject,
                 message,
                 settings.DEFAULT_FROM_EMAIL,
                 [kyc.user.email],
-                fail_silently=True
             )
 
         # --- Send In-App Notification ---
@@ -590,12 +555,11 @@ def kyc(request):
                 "Best regards,\n"
                 "The Support Team"
             )
-            send_mail(
+            queue_mail(
                 subject,
                 message,
                 settings.DEFAULT_FROM_EMAIL,
                 [kyc.user.email],
-                fail_silently=True
             )
 
         # --- Send In-App Notification ---
@@ -630,20 +594,26 @@ def activity_log(request):
     }
     return render(request, 'manager/activity_log.html', context)
 
-@login_required(login_url='admin_login')
-@allowed_users(allowed_roles=['admin'])
-def deposit_list(request):
-    deposits = Deposit.objects.all()
+LIST_PAGE_SIZE = 50
 
-    today = timezone.now().date()
+DEPOSIT_STATUS_FILTERS = {
+    'pending': ('pending',),
+    'completed': ('success',),
+    'failed': Deposit.FAILED_STATUSES,
+}
 
-    # --- Stats ---
-    total_deposits = deposits.count()
-    total_amount_today = deposits.filter(date_created__date=today).aggregate(total=Sum('grand_total'))['total'] or 0
-    pending_count = deposits.filter(status='pending').count()
-    completed_today = deposits.filter(status='completed', date_created__date=today).count()
-    failed_today = deposits.filter(status='failed', date_created__date=today).count()
+def list_period_start(period):
+    """Start of a list page's date filter ('today', '7d' or '30d'), or None for all dates."""
+    now = timezone.localtime()
+    if period == 'today':
+        return now.replace(hour=0, minute=0, second=0, microsecond=0)
+    if period in ('7d', '30d'):
+        return now - timedelta(days=int(period[:-1]))
+    return None
 
+@login_required(login_url='admin_login')
+@allowed_users(allowed_roles=['admin'])
+def deposit_list(request):
     if 'approve' in request.POST:
         print('pahss')
         print(request.POST)
@@ -669,20 +639,23 @@ def deposit_list(request):
         # --- Credit the user's wallet ---
         try:
             wallet = User.objects.get(id=deposit.user.id)
-            wallet.deposit += float(credit_amount)
 
-            if deposit.from_plan:
-                wallet.current_plan = deposit.plan
-                if deposit.plan.category.name == 'Signals':
-                    wallet.signal_plan_active = True
-                    
-            wallet.save()
+            with transaction.atomic():
+                # Claim the deposit first so a second approval of it credits nothing
+                claimed = Deposit.objects.filter(pk=deposit.pk).exclude(status='success').update(
+                    status='success', approved_amount=float(credit_amount), approved_on=timezone.now(),
+                )
+                if not claimed:
+                    messages.warning(request, f"Deposit #{deposit.transaction_no} has already been processed.")
+                    return redirect('admin_deposit_list')
+
+                wallets.credit(wallet, 'deposit', credit_amount, source='deposits', memo=f"Deposit #{deposit.transaction_no}")
 
-            # --- Update deposit record ---
-            deposit.status = 'success'
-            deposit.approved_amount = float(credit_amount)
-            deposit.approved_on = timezone.now()
-            deposit.save()
+                if deposit.from_plan:
+                    wallet.current_plan = deposit.plan
+                    if deposit.plan.category.name == 'Signals':
+                        wallet.signal_plan_active = True
+                    wallet.save(update_fields=['current_plan', 'signal_plan_active'])
 
             # # --- Send in-app notification ---
             # Notification.objects.create(
@@ -694,12 +667,11 @@ def deposit_list(request):
             # )
 
             # # --- Send email notification ---
-            # send_mail(
+            # queue_mail(
             #     subject="✅ Deposit Approved",
             #     message=f"Dear {deposit.user.first_name},\n\nYour deposit of ${credit_amount} has been approved and credited to your wallet.\n\nThank you for using our platform.\n\nBest regards,\nSupport Team",
             #     from_email=settings.DEFAULT_FROM_EMAIL,
             #     recipient_list=[deposit.user.email],
-            #     fail_silently=True
             # )
 
             messages.success(request, f"Deposit #{deposit.transaction_no} successfully approved and credited.")
@@ -737,7 +709,7 @@ def deposit_list(request):
         )
 
         # --- Email Notification ---
-        send_mail(
+        queue_mail(
             subject="❌ Deposit Rejected",
             message=(
                 f"Dear {deposit.user.first_name},\n\n"
@@ -748,44 +720,73 @@ def deposit_list(request):
             ),
             from_email=settings.DEFAULT_FROM_EMAIL,
             recipient_list=[deposit.user.email],
-            fail_silently=True
         )
 
         messages.success(request, f"Deposit #{deposit.transaction_no} has been rejected.")
         return redirect('admin_deposit_list')
 
+    today = list_period_start('today')
+    stats = Deposit.objects.aggregate(
+        total_deposits=Count('pk'),
+        total_amount_today=Coalesce(Sum('grand_total', filter=Q(date_created__gte=today)), 0.0),
+        pending_count=Count('pk', filter=Q(status='pending')),
+        completed_today=Count('pk', filter=Q(status='success', date_created__gte=today)),
+        failed_today=Count('pk', filter=Q(status__in=Deposit.FAILED_STATUSES, date_created__gte=today)),
+    )
+
+    filters = {
+        'q': request.GET.get('q', '').strip(),
+        'status': request.GET.get('status', ''),
+        'method': request.GET.get('method', ''),
+        'period': request.GET.get('period', ''),
+    }
+    deposits = Deposit.objects.select_related('user', 'currency', 'gateway')
+    if filters['status'] in DEPOSIT_STATUS_FILTERS:
+        deposits = deposits.filter(status__in=DEPOSIT_STATUS_FILTERS[filters['status']])
+    if filters['method'] == 'crypto':
+        deposits = deposits.filter(currency__isnull=False)
+    elif filters['method'].isdigit():
+        deposits = deposits.filter(gateway_id=filters['method'])
+    if list_period_start(filters['period']):
+        deposits = deposits.filter(date_created__gte=list_period_start(filters['period']))
+    if filters['q']:
+        deposits = deposits.filter(
+            Q(transaction_no__istartswith=filters['q'].removeprefix('#TXN'))
+            | Q(user__username__icontains=filters['q'])
+            | Q(user__email__icontains=filters['q'])
+            | Q(user__first_name__icontains=filters['q'])
+            | Q(user__last_name__icontains=filters['q'])
+        )
+
+    page = keyset_page(
+        deposits, 'date_created',
+        after=request.GET.get('after'), before=request.GET.get('before'), per_page=LIST_PAGE_SIZE,
+    )
+
     context = {
         'header_title': 'Deposits Management',
         'body_class': 'page-admin-deposits',
-        'deposits': deposits,
-        'total_deposits': total_deposits,
-        'total_amount_today': total_amount_today,
-        'pending_count': pending_count,
-        'completed_today': completed_today,
-        'failed_today': failed_today,
+        'deposits': page,
+        'filters': filters,
+        'gateways': PaymentGateway.objects.order_by('name'),
+        **stats,
     }
 
     return render(request, 'manager/deposit_list.html', context)
 
+WITHDRAW_STATUS_FILTERS = {
+    'pending': ('pending',),
+    'completed': ('success',),
+    'rejected': Withdraw.REJECTED_STATUSES,
+}
+
+# The values the account withdraw form submits
+WITHDRAW_CURRENCIES = (('btc', 'Bitcoin (BTC)'), ('eth', 'Ethereum (ETH)'), ('usdt', 'Tether (USDT)'), ('bnb', 'Binance Coin (BNB)'), ('sol', 'Solana (SOL)'))
+WITHDRAW_GATEWAYS = (('paypal', 'PayPal'), ('zelle', 'Zelle'), ('cashapp', 'Cash App'), ('venmo', 'Venmo'), ('bank', 'Bank Transfer'))
+
 @login_required(login_url='admin_login')
 @allowed_users(allowed_roles=['admin'])
 def withdrawal_list(request):
-    # Get all withdrawals
-    withdraws = Withdraw.objects.all()
-
-    # Get today's date
-    today = timezone.now().date()
-
-    # Filter today's withdrawals
-    todays_withdrawals = withdraws.filter(date__date=today)
-
-    # Compute dynamic stats
-    total_withdrawals_count = withdraws.count()
-    total_withdrawals_today = todays_withdrawals.aggregate(total=Sum('amount'))['total'] or 0
-    pending_approval = withdraws.filter(status='pending').count()
-    completed_today = todays_withdrawals.filter(status='completed').count()
-    rejected_today = todays_withdrawals.filter(status='rejected').count()
-
     if 'approve' in request.POST:
         ref = request.POST.get('action')
 
@@ -815,7 +816,7 @@ def withdrawal_list(request):
         )
 
         # --- Send email notification ---
-        send_mail(
+        queue_mail(
             subject="✅ Withdrawal Approved",
             message=(
                 f"Dear {user.first_name},\n\n"
@@ -825,7 +826,6 @@ def withdrawal_list(request):
             ),
             from_email=settings.DEFAULT_FROM_EMAIL,
             recipient_list=[user.email],
-            fail_silently=True
         )
 
         # --- Success message ---
@@ -857,7 +857,7 @@ def withdrawal_list(request):
         )
 
         # --- Send email notification ---
-        send_mail(
+        queue_mail(
             subject="❌ Withdrawal Rejected",
             message=(
                 f"Dear {user.first_name},\n\n"
@@ -867,21 +867,57 @@ def withdrawal_list(request):
             ),
             from_email=settings.DEFAULT_FROM_EMAIL,
             recipient_list=[user.email],
-            fail_silently=True
         )
 
         messages.warning(request, f"Withdrawal #{withdrawal.ref} has been rejected.")
         return redirect('admin_withdrawal_list')
 
+    today = list_period_start('today')
+    stats = Withdraw.objects.aggregate(
+        total_withdrawals_count=Count('pk'),
+        total_withdrawals_today=Coalesce(Sum('amount', filter=Q(date__gte=today)), 0.0),
+        pending_approval=Count('pk', filter=Q(status='pending')),
+        completed_today=Count('pk', filter=Q(status='success', date__gte=today)),
+        rejected_today=Count('pk', filter=Q(status__in=Withdraw.REJECTED_STATUSES, date__gte=today)),
+    )
+
+    filters = {
+        'q': request.GET.get('q', '').strip(),
+        'status': request.GET.get('status', ''),
+        'method': request.GET.get('method', ''),
+        'period': request.GET.get('period', ''),
+    }
+    withdraws = Withdraw.objects.select_related('user')
+    if filters['status'] in WITHDRAW_STATUS_FILTERS:
+        withdraws = withdraws.filter(status__in=WITHDRAW_STATUS_FILTERS[filters['status']])
+    if filters['method'] in dict(WITHDRAW_CURRENCIES):
+        withdraws = withdraws.filter(currency=filters['method'])
+    elif filters['method'] in dict(WITHDRAW_GATEWAYS):
+        withdraws = withdraws.filter(gateway=filters['method'])
+    if list_period_start(filters['period']):
+        withdraws = withdraws.filter(date__gte=list_period_start(filters['period']))
+    if filters['q']:
+        withdraws = withdraws.filter(
+            Q(transaction_no__istartswith=filters['q'].lstrip('#'))
+            | Q(user__username__icontains=filters['q'])
+            | Q(user__email__icontains=filters['q'])
+            | Q(user__first_name__icontains=filters['q'])
+            | Q(user__last_name__icontains=filters['q'])
+        )
+
+    page = keyset_page(
+        withdraws, 'date',
+        after=request.GET.get('after'), before=request.GET.get('before'), per_page=LIST_PAGE_SIZE,
+    )
+
     context = {
         'header_title': 'Withdrawals Management',
         'body_class': 'page-admin-withdrawals',
-        'withdraws': withdraws,
-        'total_withdrawals_count': total_withdrawals_count,
-        'total_withdrawals_today': total_withdrawals_today,
-        'pending_approval': pending_approval,
-        'completed_today': completed_today,
-        'rejected_today': rejected_today,
+        'withdraws': page,
+        'filters': filters,
+        'currencies': WITHDRAW_CURRENCIES,
+        'gateways': WITHDRAW_GATEWAYS,
+        **stats,
     }
     return render(request, 'manager/withdrawal_list.html', context)
 
@@ -1418,6 +1454,9 @@ def become_trader(request):
     }
     return render(request, 'manager/become_trader.html', context)
 
+# Segments up to this size are fanned out inside the request
+NOTIFICATION_INLINE_LIMIT = 500
+
 @login_required(login_url='admin_login')
 @allowed_users(allowed_roles=['admin'])
 def send_notification(request):
@@ -1438,51 +1477,40 @@ def send_notification(request):
         # ------------------------------
         # SEND TO ALL TRADERS
         # ------------------------------
+        # One broadcast row (no user); read state is kept per user
         if target_group == 'all':
-            traders = User.objects.filter(groups__name='trader')
-            for user in traders:
-                AdminNotification.objects.create(
-                    user=user,
-                    title=title,
-                    message=message,
-                    icon=icon,
-                    notif_type=color,
-                )
-                sent_count += 1
-
-        # ------------------------------
-        # SEND TO USERS WITH PENDING KYC
-        # ------------------------------
-        elif target_group == 'kyc_pending':
-            pending_kyc_users = KYCVerification.objects.filter(
-                status='pending'
+            AdminNotification.objects.create(
+                user=None,
+                title=title,
+                message=message,
+                icon=icon,
+                notif_type=color,
             )
-            for user in pending_kyc_users:
-                AdminNotification.objects.create(
-                    user=user.user,
-                    title=title,
-                    message=message,
-                    icon=icon,
-                    notif_type=color,
-                )
-                sent_count += 1
+            sent_count = users
 
         # ------------------------------
-        # SEND TO USERS WITH APPROVED KYC
+        # SEND TO USERS WITH PENDING / APPROVED KYC
         # ------------------------------
-        elif target_group == 'kyc_completed':
-            approved_kyc_users = KYCVerification.objects.filter(
-                status='approved'
+        elif target_group in ('kyc_pending', 'kyc_completed'):
+            total = kyc_pending if target_group == 'kyc_pending' else kyc_completed
+            inline = total <= NOTIFICATION_INLINE_LIMIT
+
+            # Large segments are left pending for the send_notification_jobs worker
+            job = NotificationJob.objects.create(
+                audience=target_group,
+                title=title,
+                message=message,
+                icon=icon,
+                notif_type=color,
+                total=total,
+                status='running' if inline else 'pending',
             )
-            for user in approved_kyc_users:
-                AdminNotification.objects.create(
-                    user=user.user,
-                    title=title,
-                    message=message,
-                    icon=icon,
-                    notif_type=color,
-                )
-                sent_count += 1
+            if not inline:
+                messages.success(request, f"Notification queued for {total} users.")
+                return redirect('admin_notifications')
+
+            job.run()
+            sent_count = job.sent
 
         # ------------------------------
         # SEND TO A SPECIFIC USER
@@ -1510,6 +1538,7 @@ def send_notification(request):
         'users_count': users,
         'kyc_pending': kyc_pending,
         'kyc_completed': kyc_completed,
+        'jobs': NotificationJob.objects.order_by('-created_on')[:10],
     }
     return render(request, 'manager/notifications.html', context)
 
@@ -1575,7 +1604,7 @@ def frontpage_pages(request):
 @allowed_users(allowed_roles=['admin'])
 def platform_setting(request):
 
-    config = Config.objects.first()
+    config = get_config()
 
     if request.method == "POST" and "general_setting" in request.POST:
         platform_name = request.POST.get("platform_name")
@@ -1729,7 +1758,7 @@ def verification_setting(request):
 
     if request.method == "POST":
 
-        config = Config.objects.first()
+        config = get_config()
 
         # --------------------------
         # CHECKBOX FIELDS
@@ -1828,7 +1857,8 @@ def admin_profile(request):
 def reports(request):
     context = {
         'header_title': 'Reports & Analytics',
-        'body_class': 'page-admin-reports'
+        'body_class': 'page-admin-reports',
+        'pnl_summary': get_pnl_summary(),
     }
     return render(request, 'manager/report.html', context)
 
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -62,8 +63,15 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Parse each template once per process. runserver's autoreloader
+            # clears this cache when a template changes.
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
@@ -71,6 +79,7 @@ TEMPLATES = [
 
                 'account.context_processors.notifications_processor',
                 'account.context_processors.global_config',
+                'account.context_processors.fragment_cache',
             ],
         },
     },
@@ -86,6 +95,16 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Take the write lock at BEGIN so concurrent workers (e.g. the
+            # close_expired_trades sweeper) queue up instead of failing mid-transaction
+            'transaction_mode': 'IMMEDIATE',
+        },
+        'TEST': {
+            # In-memory test databases use shared-cache locking, which fails
+            # instead of waiting, so the concurrency tests need a file
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
     }
 }
 
@@ -138,6 +157,19 @@ STATIC_URL = 'static/'
 STATICFILES_DIRS = [BASE_DIR / 'static']
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
+# In production collectstatic writes content-hashed names, a manifest and
+# .gz/.br siblings (utils.staticfiles); norvia.wsgi serves them with
+# far-future caching. Development serves static/ as-is.
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage' if DEBUG
+        else 'utils.staticfiles.CompressedManifestStaticFilesStorage',
+    },
+}
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
@@ -148,6 +180,76 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'account.User'
 
+# Deposit/Withdraw transaction numbers reserved per database round trip.
+# 1 keeps them gap-free; larger blocks cut writes but lose unused numbers on restart.
+TRANSACTION_NO_BLOCK_SIZE = 1
+
+# Admin alerts are queued by account.utils.telegram and delivered by the
+# send_telegram worker through TELEGRAM_TRANSPORT
+TELEGRAM_BOT_TOKEN = "7659033307:AAHgJ-38RaKx5Xo1piwxAgjrvqBYh7qMbSY"
+TELEGRAM_CHAT_IDS = ['1322959136']
+TELEGRAM_TRANSPORT = 'account.telegram.BotApiTransport'
+
+# DynamicSessionTimeoutMiddleware only extends a session (one django_session
+# write) once less than this fraction of its timeout is left
+SESSION_REFRESH_THRESHOLD = 0.5
+
+# Sessions live in the 'sessions' cache and are written back to django_session
+# at most every SESSION_DB_WRITE_INTERVAL seconds. 'default' holds the version
+# keys that invalidate Config, roles, notification feeds, pages and template
+# fragments. In production both must be shared by every worker on every host:
+# set CACHE_URL to a Redis URL (redis://host:6379/0) or memcached://host:11211.
+# Without it each process gets its own LocMemCache, which is only right for
+# development (one runserver process); the test runner always uses LocMem.
+CACHE_URL = os.environ.get('CACHE_URL')
+if CACHE_URL:
+    CACHE_BACKEND = (
+        'django.core.cache.backends.memcached.PyMemcacheCache' if CACHE_URL.startswith('memcached://')
+        else 'django.core.cache.backends.redis.RedisCache'
+    )
+    CACHE_LOCATION = CACHE_URL.removeprefix('memcached://')
+    CACHES = {
+        'default': {'BACKEND': CACHE_BACKEND, 'LOCATION': CACHE_LOCATION, 'KEY_PREFIX': 'norvia'},
+        'sessions': {'BACKEND': CACHE_BACKEND, 'LOCATION': CACHE_LOCATION, 'KEY_PREFIX': 'norvia:sessions'},
+    }
+else:
+    CACHES = {
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        'sessions': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'sessions'},
+    }
+TEST_RUNNER = 'utils.testing.TestRunner'
+SESSION_ENGINE = 'account.session_backend'
+SESSION_CACHE_ALIAS = 'sessions'
+SESSION_DB_WRITE_INTERVAL = 300
+
+# Market prices (account.pricing): quotes are fresh for PRICING_TTL seconds and
+# served stale while being refreshed for up to PRICING_STALE_TTL seconds
+PRICING_PROVIDER = 'account.pricing.CoinGeckoProvider'
+PRICING_TTL = 15
+PRICING_STALE_TTL = 300
+
+# Chart candles (account.candles): days of history kept per resolution, None
+# for forever. CANDLE_SYMBOLS are ingested by the ingest_candles worker; empty
+# means the top CANDLE_MARKETS coins by market cap.
+CANDLE_RETENTION = {'1m': 2, '1h': 120, '1d': None}
+CANDLE_SYMBOLS = []
+CANDLE_MARKETS = 25
+
+# Live prices and PnL over server-sent events (account.streaming). The stream
+# needs the ASGI entry point (norvia.asgi); under WSGI pages don't open it and
+# keep polling every 60 seconds
+STREAM_SYMBOLS = ['BTC', 'ETH', 'BNB', 'SOL', 'XRP']
+STREAM_INTERVAL = 5
+
+# Anonymous pages wrapped in utils.decorators.cache_public_page are served from
+# the cache for up to PAGE_CACHE_TIMEOUT seconds, or until Config is saved or
+# a deploy changes templates/interface.
+PAGE_CACHE_TIMEOUT = 60 * 60
+
+# {% cache %} blocks in the account templates (trader cards, plans, currency
+# lists) are kept this long, or until account.signals invalidates their group
+FRAGMENT_CACHE_TIMEOUT = 60 * 10
+
 #Email validation
 # EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 # EMAIL_HOST = 'mail.norvia.io'
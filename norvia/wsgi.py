@@ -14,3 +14,11 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'norvia.settings')
 
 application = get_wsgi_application()
+
+from django.conf import settings  # noqa: E402
+
+from utils.staticfiles import PrecompressedStaticFiles  # noqa: E402
+
+if not settings.DEBUG:
+    # Serve collectstatic's output, precompressed and cached, before Django sees the request
+    application = PrecompressedStaticFiles(application, settings.STATIC_ROOT, settings.STATIC_URL)
@@ -5,7 +5,7 @@
  */
 
 // Dismiss notification banner
-function dismissNotification(type) {
+function dismissNotification(type, button) {
 	if (type === 'kyc') {
 		const kycNotification = document.getElementById('kycNotification');
 		if (kycNotification) {
@@ -20,6 +20,14 @@ function dismissNotification(type) {
 			// Save dismissal to localStorage
 			localStorage.setItem('admin_notification_dismissed', 'true');
 		}
+	} else if (button) {
+		// Admin notification from the backend: hide it and record the dismissal
+		const banner = button.closest('.alert-banner');
+		banner.style.display = 'none';
+		fetch(banner.dataset.dismissUrl, {
+			method: 'POST',
+			headers: { 'X-CSRFToken': getCookie('csrftoken') }
+		});
 	}
 }
 
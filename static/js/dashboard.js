@@ -105,9 +105,10 @@ async function fetchMarketData(cryptoId) {
 		document.getElementById('btc-change').textContent = 'Loading...';
 		document.getElementById('btc-volume').textContent = 'Loading...';
 
-		const response = await fetch(`https://api.coingecko.com/api/v3/coins/${cryptoId}?localization=false&tickers=false&community_data=false&developer_data=false`, {
+		// Quotes come from the server's shared price cache (account/market/prices/)
+		const pricesUrl = document.getElementById('crypto-selector')?.dataset.pricesUrl || '/account/market/prices/';
+		const response = await fetch(`${pricesUrl}?limit=100`, {
 			method: 'GET',
-			mode: 'cors',
 			headers: {
 				'Accept': 'application/json'
 			}
@@ -117,34 +118,34 @@ async function fetchMarketData(cryptoId) {
 			throw new Error(`HTTP error! status: ${response.status}`);
 		}
 
-		const data = await response.json();
+		const data = ((await response.json()).quotes || []).find(c => c.id === cryptoId);
 
 		// Validate that we have the required data
-		if (!data.market_data || !data.market_data.market_cap || !data.market_data.current_price) {
+		if (!data) {
 			throw new Error('Invalid data structure received from API');
 		}
 
 		// Update Market Cap
-		const marketCap = data.market_data.market_cap.usd;
+		const marketCap = data.market_cap || 0;
 		document.getElementById('market-cap').textContent = '$' + (marketCap / 1e9).toFixed(2) + 'B';
 
 		// Update Price
-		const price = data.market_data.current_price.usd;
+		const price = data.price;
 		document.getElementById('btc-price').textContent = '$' + price.toLocaleString('en-US', {minimumFractionDigits: 2, maximumFractionDigits: 2});
 
 		// Update 24h Change
-		const change24h = data.market_data.price_change_percentage_24h;
+		const change24h = data.change_24h;
 		const changeEl = document.getElementById('btc-change');
 		const changeSign = change24h >= 0 ? '+' : '';
 		changeEl.innerHTML = `${changeSign}${change24h.toFixed(2)}%`;
 		changeEl.style.color = change24h >= 0 ? '#16a34a' : '#ef4444';
 
 		// Update 24h Volume
-		const volume = data.market_data.total_volume.usd;
+		const volume = data.volume_24h || 0;
 		document.getElementById('btc-volume').textContent = '$' + (volume / 1e9).toFixed(2) + 'B';
 
 		// Update labels based on selected crypto
-		const symbol = data.symbol.toUpperCase();
+		const symbol = data.symbol;
 		document.getElementById('btc-price').previousElementSibling.textContent = `${symbol} Price`;
 
 		// Fetch and update chart
@@ -171,10 +172,12 @@ async function fetchMarketData(cryptoId) {
 
 async function updateMarketChart(cryptoId, cryptoName, days = 30) {
 	try {
-		// Fetch price data for selected period
-		const response = await fetch(`https://api.coingecko.com/api/v3/coins/${cryptoId}/market_chart?vs_currency=usd&days=${days}`, {
+		// Candles recorded by the server (account/market/candles/) for the selected period
+		const selector = document.getElementById('crypto-selector');
+		const candlesUrl = selector?.dataset.candlesUrl || '/account/market/candles/';
+		const symbol = selector?.querySelector(`option[value="${cryptoId}"]`)?.dataset.symbol || cryptoId;
+		const response = await fetch(`${candlesUrl}?symbol=${encodeURIComponent(symbol)}&days=${days}`, {
 			method: 'GET',
-			mode: 'cors',
 			headers: {
 				'Accept': 'application/json'
 			}
@@ -187,12 +190,12 @@ async function updateMarketChart(cryptoId, cryptoName, days = 30) {
 		const data = await response.json();
 
 		// Validate data
-		if (!data.prices || !Array.isArray(data.prices)) {
+		if (!data.candles || !Array.isArray(data.candles)) {
 			throw new Error('Invalid chart data received');
 		}
 
-		// Format data for ApexCharts [timestamp, price]
-		const chartData = data.prices.map(item => [item[0], item[1].toFixed(2)]);
+		// Format data for ApexCharts [timestamp, close price]
+		const chartData = data.candles.map(item => [item[0], item[4].toFixed(2)]);
 
 		if (marketChart) {
 			// Update existing chart with new data and options
@@ -292,10 +295,26 @@ async function updateMarketChart(cryptoId, cryptoName, days = 30) {
 	}
 }
 
-// Update market data every 60 seconds
+// Load market data, then follow the price over the server's event stream
+// (account/market/stream/), falling back to a refresh every 60 seconds
 function startMarketDataUpdates() {
 	fetchMarketData(currentCrypto);
-	setInterval(() => fetchMarketData(currentCrypto), 60000); // Update every 60 seconds
+
+	const selector = document.getElementById('crypto-selector');
+	const streamUrl = selector?.dataset.streamUrl;
+	if (!window.EventSource || !streamUrl) {
+		setInterval(() => fetchMarketData(currentCrypto), 60000); // Update every 60 seconds
+		return;
+	}
+
+	const stream = new EventSource(streamUrl);
+	stream.addEventListener('prices', function(e) {
+		const symbol = selector.querySelector(`option[value="${currentCrypto}"]`)?.dataset.symbol;
+		const price = JSON.parse(e.data)[symbol];
+		if (price !== undefined) {
+			document.getElementById('btc-price').textContent = '$' + price.toLocaleString('en-US', {minimumFractionDigits: 2, maximumFractionDigits: 2});
+		}
+	});
 }
 
 // Helper function to get crypto display name
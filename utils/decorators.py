@@ -1,5 +1,16 @@
+import hashlib
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
 from django.http import HttpResponse
 from django.shortcuts import redirect, render
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+from account.utils import get_page_cache_version, get_user_roles
 
 def unauthenticated_user(view_func):
     def wrapper_func(request, *args, **kwargs):
@@ -11,16 +22,62 @@ def unauthenticated_user(view_func):
     return wrapper_func
 
 def allowed_users(allowed_roles=[]):
+    allowed_roles = frozenset(allowed_roles)
+
     def decorator(view_func):
+        if iscoroutinefunction(view_func):
+            async def wrapper_func(request, *args, **kwargs):
+                await request.auser()
+                roles = await sync_to_async(get_user_roles)(request)
+                if roles & allowed_roles:
+                    return await view_func(request, *args, **kwargs)
+                return await sync_to_async(render)(request, 'account/404.html')
+            return wrapper_func
+
         def wrapper_func(request, *args, **kwargs):
-            # print('Working:', allowed_roles)
-            group = None
-            if request.user.groups.exists():
-                group = request.user.groups.all()[0].name
-            if group in allowed_roles:
+            if get_user_roles(request) & allowed_roles:
                 return view_func(request, *args, **kwargs)
             else:
                 # return HttpResponse('You are not authorized to view this page')
                 return render(request,'account/404.html')
         return wrapper_func
-    return decorator
\ No newline at end of file
+    return decorator
+
+def cache_public_page(view_func):
+    """
+    Serve anonymous GETs of a page that is the same for every visitor from
+    the cache, with an ETag and Last-Modified so browsers revalidate with a
+    304. Keys are per path and drop out together on invalidate_page_cache(),
+    which runs when Config is saved, or when the page templates change.
+
+    Visitors with a session (logged in, or with pending messages) and
+    responses that are not a plain 200 or that set cookies skip the cache.
+    """
+    @wraps(view_func)
+    def wrapper_func(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD') or settings.SESSION_COOKIE_NAME in request.COOKIES:
+            return view_func(request, *args, **kwargs)
+
+        key = f"page:{get_page_cache_version()}:{request.path}"
+        page = cache.get(key)
+        if page is None:
+            response = view_func(request, *args, **kwargs)
+            if response.status_code != 200 or response.streaming or response.cookies:
+                return response
+            page = {
+                'content': response.content,
+                'content_type': response['Content-Type'],
+                'etag': f'"{hashlib.md5(response.content).hexdigest()}"',
+                'last_modified': int(time.time()),
+            }
+            cache.set(key, page, settings.PAGE_CACHE_TIMEOUT)
+
+        response = get_conditional_response(request, etag=page['etag'], last_modified=page['last_modified'])
+        if response is None:
+            response = HttpResponse(page['content'], content_type=page['content_type'])
+        response['ETag'] = page['etag']
+        response['Last-Modified'] = http_date(page['last_modified'])
+        patch_cache_control(response, max_age=0, must_revalidate=True)
+        return response
+
+    return wrapper_func
@@ -0,0 +1,78 @@
+from dataclasses import dataclass
+from datetime import datetime
+
+from django.db.models import Q
+
+
+@dataclass
+class KeysetPage:
+    object_list: list
+    next_cursor: str = None      # pass as ?after= for older rows
+    previous_cursor: str = None  # pass as ?before= for newer rows
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+def encode_cursor(obj, field):
+    return f"{getattr(obj, field).isoformat()}_{obj.pk}"
+
+
+def decode_cursor(cursor):
+    """(datetime, pk) from a cursor, or None if it is malformed."""
+    try:
+        value, pk = cursor.rsplit('_', 1)
+        return datetime.fromisoformat(value), int(pk)
+    except (AttributeError, ValueError):
+        return None
+
+
+def keyset_page(queryset, field, after=None, before=None, per_page=50):
+    """
+    A newest-first page of `queryset` ordered on (field, pk), where field is a
+    non-null datetime. `after` and `before` are cursors from a previous
+    page's next_cursor and previous_cursor; a malformed cursor gives the
+    first page.
+
+    Unlike OFFSET pagination, every page costs the same: the cursor becomes
+    a range condition that an index on (field, id) can seek to, and there is
+    no COUNT.
+    """
+    after, before = decode_cursor(after), decode_cursor(before)
+
+    if before:
+        value, pk = before
+        # field >= value narrows the index range; the OR breaks ties on pk
+        rows = list(
+            queryset
+            .filter(Q(**{f'{field}__gte': value}) & (Q(**{f'{field}__gt': value}) | Q(pk__gt=pk)))
+            .order_by(field, 'pk')[:per_page + 1]
+        )
+        has_previous = len(rows) > per_page
+        rows = rows[:per_page][::-1]
+        has_next = True
+    else:
+        if after:
+            value, pk = after
+            queryset = queryset.filter(Q(**{f'{field}__lte': value}) & (Q(**{f'{field}__lt': value}) | Q(pk__lt=pk)))
+        rows = list(queryset.order_by(f'-{field}', '-pk')[:per_page + 1])
+        has_next = len(rows) > per_page
+        rows = rows[:per_page]
+        has_previous = after is not None
+
+    return KeysetPage(
+        rows,
+        next_cursor=encode_cursor(rows[-1], field) if rows and has_next else None,
+        previous_cursor=encode_cursor(rows[0], field) if rows and has_previous else None,
+    )
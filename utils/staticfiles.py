@@ -0,0 +1,202 @@
+"""
+Static files for production.
+
+CompressedManifestStaticFilesStorage is the collectstatic backend: it writes
+content-hashed copies and staticfiles.json like ManifestStaticFilesStorage,
+plus a .gz sibling (and .br, when the brotli package is installed) of every
+hashed text asset. A hashed name only ever holds one content, so siblings
+that already exist are left alone and incremental runs only compress what
+changed.
+
+PrecompressedStaticFiles is a WSGI wrapper (see norvia.wsgi) that serves
+STATIC_ROOT itself: it picks the smallest encoding the client accepts and
+marks hashed names immutable for a year.
+"""
+import gzip
+import json
+import mimetypes
+import os
+import posixpath
+from email.utils import formatdate, parsedate_to_datetime
+from urllib.parse import unquote
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE = ('.css', '.js', '.map', '.svg', '.json', '.txt', '.xml', '.html', '.ico', '.ttf', '.eot', '.otf')
+MIN_SIZE = 512  # below this the headers outweigh the saving
+IMMUTABLE_MAX_AGE = 60 * 60 * 24 * 365
+MAX_AGE = 60  # unhashed names can change under the same URL
+
+
+def encodings():
+    """(Content-Encoding, file suffix, compress function), best first."""
+    available = []
+    if brotli is not None:
+        available.append(('br', '.br', lambda data: brotli.compress(data, quality=11)))
+    available.append(('gzip', '.gz', lambda data: gzip.compress(data, compresslevel=9, mtime=0)))
+    return available
+
+
+def accepted_encodings(header):
+    """{content-coding: q} from an Accept-Encoding header; a missing q is 1."""
+    accepted = {}
+    for part in header.split(','):
+        coding, *params = part.split(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding] = q
+    return accepted
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    def url_converter(self, name, hashed_files, template=None):
+        converter = super().url_converter(name, hashed_files, template)
+
+        def tolerant_converter(matchobj):
+            try:
+                return converter(matchobj)
+            except ValueError:
+                # Vendor bundles refer to source maps and fonts they were shipped without
+                return matchobj[0]
+
+        return tolerant_converter
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            # Some templates link files that were never shipped: keep the
+            # plain URL (a 404, as before) rather than fail the whole page
+            return name
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+
+        for name in set(self.hashed_files.values()):
+            for compressed in self.compress(name):
+                yield name, compressed, True
+
+    def compress(self, name):
+        """Write the missing compressed siblings of `name` and return their names."""
+        if not name.endswith(COMPRESSIBLE):
+            return []
+
+        path = self.path(name)
+        written = []
+        data = None
+        for _, suffix, compress in encodings():
+            if os.path.exists(path + suffix):
+                continue
+            if data is None:
+                with open(path, 'rb') as f:
+                    data = f.read()
+                if len(data) < MIN_SIZE:
+                    return written
+            compressed = compress(data)
+            # Keep it only if it is worth a Content-Encoding
+            if len(compressed) < len(data) * 0.95:
+                with open(path + suffix, 'wb') as f:
+                    f.write(compressed)
+                written.append(name + suffix)
+        return written
+
+
+class PrecompressedStaticFiles:
+    """
+    WSGI middleware serving GET/HEAD under `prefix` from `root`, using the
+    .br/.gz siblings written by CompressedManifestStaticFilesStorage. Other
+    requests go to `application`.
+    """
+    def __init__(self, application, root, prefix, manifest='staticfiles.json'):
+        self.application = application
+        self.root = os.path.realpath(root)
+        self.prefix = '/' + prefix.strip('/') + '/'
+        self.immutable = self.load_hashed_names(os.path.join(self.root, manifest))
+
+    @staticmethod
+    def load_hashed_names(path):
+        try:
+            with open(path) as f:
+                return set(json.load(f).get('paths', {}).values())
+        except (OSError, ValueError):
+            return set()
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '')
+        if environ.get('REQUEST_METHOD') not in ('GET', 'HEAD') or not path.startswith(self.prefix):
+            return self.application(environ, start_response)
+
+        name = posixpath.normpath(unquote(path[len(self.prefix):])).lstrip('/')
+        filename = os.path.realpath(os.path.join(self.root, name))
+        if not filename.startswith(self.root + os.sep) or not os.path.isfile(filename):
+            return self.application(environ, start_response)
+
+        return self.serve(environ, start_response, name, filename)
+
+    def serve(self, environ, start_response, name, filename):
+        accepted = accepted_encodings(environ.get('HTTP_ACCEPT_ENCODING', ''))
+        served, encoding = filename, None
+        for candidate, suffix, _ in encodings():
+            # q=0 refuses a coding; '*' covers the ones not listed
+            if accepted.get(candidate, accepted.get('*', 0)) > 0 and os.path.isfile(filename + suffix):
+                served, encoding = filename + suffix, candidate
+                break
+
+        # Every variant carries the original's Last-Modified, so validators match whatever was served
+        mtime = os.stat(filename).st_mtime
+        content_type, _ = mimetypes.guess_type(filename)
+        headers = [
+            ('Content-Type', content_type or 'application/octet-stream'),
+            ('Content-Length', str(os.path.getsize(served))),
+            ('Last-Modified', formatdate(mtime, usegmt=True)),
+            ('Vary', 'Accept-Encoding'),
+        ]
+        if encoding:
+            headers.append(('Content-Encoding', encoding))
+        if name in self.immutable:
+            headers.append(('Cache-Control', f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'))
+        else:
+            headers.append(('Cache-Control', f'public, max-age={MAX_AGE}'))
+
+        if self.not_modified(environ, mtime):
+            start_response('304 Not Modified', [h for h in headers if h[0] not in ('Content-Length', 'Content-Type')])
+            return []
+
+        start_response('200 OK', headers)
+        if environ['REQUEST_METHOD'] == 'HEAD':
+            return []
+        file_wrapper = environ.get('wsgi.file_wrapper')
+        if file_wrapper:
+            return file_wrapper(open(served, 'rb'))
+        return self.read_chunks(served)
+
+    @staticmethod
+    def read_chunks(filename, size=64 * 1024):
+        with open(filename, 'rb') as f:
+            yield from iter(lambda: f.read(size), b'')
+
+    @staticmethod
+    def not_modified(environ, mtime):
+        since = environ.get('HTTP_IF_MODIFIED_SINCE')
+        if not since:
+            return False
+        try:
+            return int(mtime) <= parsedate_to_datetime(since).timestamp()
+        except (TypeError, ValueError):
+            return False
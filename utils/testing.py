@@ -0,0 +1,87 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from collections import Counter
+from contextlib import contextmanager
+from unittest import mock
+
+from django.conf import settings
+from django.db import connections
+from django.template.base import Template
+from django.test.runner import DiscoverRunner
+from django.test.utils import CaptureQueriesContext, override_settings
+
+LOCMEM_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'sessions': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'sessions'},
+}
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Runs the tests on per-process LocMem caches whatever CACHE_URL says, so
+    cache.clear() in a test can never wipe a deployment's shared cache.
+    """
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._caches = override_settings(CACHES=LOCMEM_CACHES)
+        self._caches.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._caches.disable()
+        super().teardown_test_environment(**kwargs)
+
+
+@contextmanager
+def queries_per_template(using='default'):
+    """
+    Count the queries issued while rendering each template, as a Counter of
+    {template name: queries}. A template's count includes the templates it
+    extends or includes, and lazy context values it evaluates.
+    """
+    counts = Counter()
+    render = Template._render
+
+    def counted_render(self, context):
+        with CaptureQueriesContext(connections[using]) as queries:
+            result = render(self, context)
+        counts[self.name] += len(queries)
+        return result
+
+    with mock.patch.object(Template, '_render', counted_render):
+        yield counts
+
+
+@contextmanager
+def shared_caches():
+    """
+    Point the default cache at a throwaway file cache that other processes can
+    open too, standing in for the shared Redis/Memcached of a deployment; use
+    with in_other_worker(). Sessions stay where they are, so logged-in test
+    clients keep working. Works as a decorator as well.
+    """
+    with tempfile.TemporaryDirectory() as location, override_settings(CACHES={
+        **settings.CACHES,
+        'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location},
+    }):
+        yield
+
+
+def in_other_worker(code):
+    """
+    Run `code` in a separate process, as another worker would, with the
+    caches this process is using (see shared_caches).
+    """
+    script = (
+        "import json\n"
+        "import django\n"
+        "from django.conf import settings\n"
+        f"settings.CACHES = json.loads({json.dumps(settings.CACHES, default=str)!r})\n"
+        "django.setup()\n"
+    ) + code
+    subprocess.run(
+        [sys.executable, '-c', script], cwd=settings.BASE_DIR, check=True, capture_output=True,
+        env={**os.environ, 'DJANGO_SETTINGS_MODULE': 'norvia.settings'},
+    )